@@ -0,0 +1,174 @@
+"""Benchmark point lookups in the binary lookup file against tabix-indexed TSV files.
+
+Usage::
+
+    python benchmarks/bench_lookup.py [--records 1000000] [--queries 1000000] [--seed 42]
+
+Writes a synthetic merged small variant table with ``--records`` sorted records to a temporary
+directory, builds the lookup file from it with ``build_lookup()``, and bgzip-compresses and
+indexes it.  Then the same ``--queries`` random lookups (half of them hits) are run against
+``LookupFile`` and the indexed TSV file.  The indexed TSV file is queried with ``pysam`` if it
+is installed, otherwise with the CSI index of ``clinvar_tsv.index`` and ``BgzfReader``, which
+reads the same blocks as ``tabix`` does.  The number of hits is compared after timing.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from clinvar_tsv.bgzf import BgzfReader, BgzfWriter
+from clinvar_tsv.common import as_pg_list
+from clinvar_tsv.index import BinningIndex
+from clinvar_tsv.lookup import LookupFile, build_lookup
+from clinvar_tsv.merge_tsvs import HEADER_OUT
+
+#: Chromosomes of the synthetic records and their relative number of records.
+CHROMOSOMES = tuple(str(i) for i in range(1, 23)) + ("X", "Y", "MT")
+
+#: Pathogenicities and review statuses of the synthetic summaries.
+SUMMARIES = (
+    (["uncertain significance"], "criteria provided, single submitter", 1),
+    (["benign", "likely benign"], "criteria provided, multiple submitters, no conflicts", 2),
+    (["pathogenic"], "reviewed by expert panel", 3),
+    (["uncertain significance"], "criteria provided, conflicting interpretations", 1),
+)
+
+#: Configuration of ``tabix`` for the merged tables.
+TABIX_TSV = (0, 2, 3, 4, ord("#"), 1)
+
+
+def make_records(num_records: int, seed: int):
+    """Return sorted synthetic records ``(chrom, pos, ref, alt, vcv)``."""
+    rng = random.Random(seed)
+    result = []
+    for i in range(num_records):
+        chrom = rng.choice(CHROMOSOMES)
+        ref = rng.choice("ACGT")
+        alt = rng.choice([base for base in "ACGT" if base != ref] + [ref + "T", ref + "GC"])
+        result.append((chrom, rng.randrange(1, 200_000_000), ref, alt, "VCV%09d" % (i + 1)))
+    result.sort(key=lambda record: (CHROMOSOMES.index(record[0]), record[1]))
+    return result
+
+
+def write_table(records, path: str, rng: random.Random) -> BinningIndex:
+    """Write merged table with ``records`` to BGZF file at ``path``, return its index."""
+    binning = BinningIndex(tabix_conf=TABIX_TSV)
+    with BgzfWriter.open(path) as writer:
+        writer.write("\t".join(HEADER_OUT) + "\n")
+        offset = writer.tell()
+        for chrom, pos, ref, alt, vcv in records:
+            pathogenicities, review_status, gold_stars = rng.choice(SUMMARIES)
+            end = pos + len(ref) - 1
+            row = ["GRCh37", chrom, str(pos), str(end), "0", ref, alt, "VER", "variant", "snv"]
+            summary = [
+                review_status,
+                ", ".join(pathogenicities),
+                as_pg_list(pathogenicities),
+                str(gold_stars),
+            ]
+            row += ['{"GENE"}', '{"HGNC:1"}', vcv] + summary + summary + ["[]"]
+            writer.write("\t".join(row) + "\n")
+            next_offset = writer.tell()
+            binning.add(chrom, pos - 1, end, offset, next_offset)
+            offset = next_offset
+    return binning
+
+
+def make_queries(records, num_queries: int, rng: random.Random):
+    """Return queries ``(chrom, pos, ref, alt)``, half of them of ``records``."""
+    result = []
+    for _ in range(num_queries):
+        chrom, pos, ref, alt, _ = rng.choice(records)
+        if rng.random() < 0.5:
+            pos += rng.randrange(1, 1000)
+        result.append((chrom, pos, ref, alt))
+    return result
+
+
+def query_lookup(path: str, queries) -> int:
+    hits = 0
+    with LookupFile(path) as lookup:
+        for query in queries:
+            hits += len(lookup.lookup(*query))
+    return hits
+
+
+def query_csi(path: str, binning: BinningIndex, queries) -> int:
+    hits = 0
+    with BgzfReader.open(path) as reader:
+        for chrom, pos, ref, alt in queries:
+            for chunk_beg, chunk_end in binning.chunks(chrom, pos - 1, pos):
+                reader.seek(chunk_beg)
+                while reader.tell() < chunk_end:
+                    row = reader.readline().decode("utf-8").split("\t")
+                    if row[1] == chrom and int(row[2]) == pos and (row[5], row[6]) == (ref, alt):
+                        hits += 1
+    return hits
+
+
+def query_pysam(path: str, queries) -> int:
+    import pysam
+
+    pysam.tabix_index(path, seq_col=1, start_col=2, end_col=3, line_skip=1, force=True, csi=True)
+    hits = 0
+    with pysam.TabixFile(path, index=path + ".csi") as tabix:
+        for chrom, pos, ref, alt in queries:
+            for line in tabix.fetch(chrom, pos - 1, pos):
+                row = line.split("\t")
+                if int(row[2]) == pos and (row[5], row[6]) == (ref, alt):
+                    hits += 1
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", default=1_000_000, type=int, help="Number of records")
+    parser.add_argument("--queries", default=1_000_000, type=int, help="Number of lookups")
+    parser.add_argument("--seed", default=42, type=int)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    records = make_records(args.records, args.seed)
+    queries = make_queries(records, args.queries, rng)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tsv_path = os.path.join(tmp_dir, "clinvar_small.tsv.gz")
+        lookup_path = os.path.join(tmp_dir, "clinvar_small.lookup")
+        binning = write_table(records, tsv_path, rng)
+        binning.write_csi(tsv_path + ".csi")
+        t_start = time.perf_counter()
+        build_lookup(tsv_path, lookup_path)
+        print(
+            "%d records, lookup file of %d bytes built in %.2fs"
+            % (len(records), os.path.getsize(lookup_path), time.perf_counter() - t_start)
+        )
+
+        try:
+            import pysam  # noqa: F401
+
+            tabix_name, tabix_func = "pysam", lambda: query_pysam(tsv_path, queries)
+        except ImportError:
+            tabix_name, tabix_func = "csi", lambda: query_csi(tsv_path, binning, queries)
+
+        results = {}
+        for name, func in (
+            ("lookup", lambda: query_lookup(lookup_path, queries)),
+            (tabix_name, tabix_func),
+        ):
+            t_start = time.perf_counter()
+            results[name] = func()
+            elapsed = time.perf_counter() - t_start
+            print(
+                "%-8s %.2fs (%.0f lookups/s, %.2fus per lookup)"
+                % (name + ":", elapsed, len(queries) / elapsed, elapsed / len(queries) * 1e6)
+            )
+
+    if len(set(results.values())) == 1:
+        print("hits are identical (%d)" % results["lookup"])
+    else:
+        print("hits differ: %s" % results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark reference backends on the REF lookups performed by ``normalize_tsv``.
+
+Usage::
+
+    python benchmarks/bench_reference.py \
+        --reference hs37d5.fa \
+        --input-tsv parsed/clinvar_table_raw.b37.tsv \
+        [--twobit hs37d5.2bit] [--mmseq hs37d5.mmseq]
+
+If ``--mmseq`` is not given then the sequence store is built into a temporary directory first.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from clinvar_tsv.reference import build_mmap_reference, open_reference
+
+
+def load_queries(path, ref_chr_prefix):
+    """Load ``(chrom, start, end)`` of the REF fetch for each record in the TSV file."""
+    result = []
+    with open(path, "rt") as inputf:
+        header = inputf.readline().rstrip("\n").split("\t")
+        idx_chrom, idx_start, idx_ref = map(header.index, ("chromosome", "start", "reference"))
+        for line in inputf:
+            arr = line.rstrip("\n").split("\t")
+            if len(arr) <= idx_ref:
+                continue
+            chrom = arr[idx_chrom]
+            if ref_chr_prefix and not chrom.startswith("chr"):
+                chrom = "chrM" if chrom == "MT" else "chr" + chrom
+            ref = "" if arr[idx_ref] in ("-", ".") else arr[idx_ref]
+            start = int(arr[idx_start]) - 1
+            result.append((chrom, start, start + len(ref)))
+    return result
+
+
+def run_backend(path, queries):
+    """Return wall-clock seconds and number of fetches for ``queries`` against ``path``."""
+    reference = open_reference(path)
+    contigs = set(reference.references)
+    count = 0
+    t_start = time.perf_counter()
+    for chrom, start, end in queries:
+        if chrom in contigs:
+            reference.fetch(chrom, start, end)
+            count += 1
+    return time.perf_counter() - t_start, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reference", required=True, help="FAI-indexed FASTA file")
+    parser.add_argument("--input-tsv", required=True, help="raw TSV file from parse_xml")
+    parser.add_argument("--twobit", help="optional 2bit file of the same reference")
+    parser.add_argument("--mmseq", help="optional sequence store from build_reference")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        mmseq = args.mmseq
+        if not mmseq:
+            mmseq = os.path.join(tmpdir, "reference.mmseq")
+            t_start = time.perf_counter()
+            build_mmap_reference(args.reference, mmseq)
+            print("building %s took %.1fs" % (mmseq, time.perf_counter() - t_start))
+        fasta = open_reference(args.reference)
+        queries = load_queries(args.input_tsv, any(r.startswith("chr") for r in fasta.references))
+        backends = [("FastaFile", args.reference), ("mmseq", mmseq)]
+        if args.twobit:
+            backends.append(("2bit", args.twobit))
+        for name, path in backends:
+            elapsed, count = run_backend(path, queries)
+            print(
+                "%-10s %8d fetches %8.2fs %12.0f fetches/s"
+                % (name, count, elapsed, count / elapsed)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark ``clinvar_tsv sort_tsv`` against the former shell sort pipeline.
+
+Usage::
+
+    python benchmarks/bench_sort.py \
+        --input-tsv normalized/clinvar_table_normalized.b37.tsv.gz \
+        [--memory-mb 1024] [--threads 4] [--tmp-dir /tmp]
+
+Requires ``sort`` and ``bgzip`` on the ``PATH``.  Both outputs are decompressed and compared
+after timing.
+"""
+
+import argparse
+import gzip
+import os
+import subprocess
+import tempfile
+import time
+
+from clinvar_tsv.sort_tsv import DEFAULT_MEMORY_MB, sort_tsv
+
+SHELL_PIPELINE = r"""
+set -euo pipefail
+cat \
+    <(zcat {input} | head -n 1) \
+    <(zcat {input} | tail -n +2 | sort -k2,2V -k3,3n -k4,4n -k11,11) \
+| bgzip -c \
+> {output}
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input-tsv", required=True, help="gzip-compressed TSV file to sort")
+    parser.add_argument("--memory-mb", default=DEFAULT_MEMORY_MB, type=int)
+    parser.add_argument("--threads", default=1, type=int)
+    parser.add_argument("--tmp-dir", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.tmp_dir) as tmpdir:
+        out_shell = os.path.join(tmpdir, "shell.tsv.gz")
+        out_python = os.path.join(tmpdir, "python.tsv.gz")
+
+        t_start = time.perf_counter()
+        subprocess.run(
+            ["bash", "-c", SHELL_PIPELINE.format(input=args.input_tsv, output=out_shell)],
+            check=True,
+            env={**os.environ, "LC_ALL": "C"},
+        )
+        print("shell pipeline: %.1fs" % (time.perf_counter() - t_start))
+
+        t_start = time.perf_counter()
+        sort_tsv(
+            args.input_tsv,
+            out_python,
+            memory_mb=args.memory_mb,
+            tmp_dir=tmpdir,
+            threads=args.threads,
+        )
+        print("sort_tsv:       %.1fs" % (time.perf_counter() - t_start))
+
+        with gzip.open(out_shell, "rt") as f_shell, gzip.open(out_python, "rt") as f_python:
+            for lineno, (a, b) in enumerate(zip(f_shell, f_python), 1):
+                if a != b:
+                    print("outputs differ in line %d" % lineno)
+                    break
+            else:
+                print("outputs are identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Benchmark the summaries of ``merge_tsvs`` on a synthetic VCV population.
+
+Usage::
+
+    python benchmarks/bench_summary.py [--vcvs 100000] [--seed 42]
+
+Compares ``summary_fields()`` on ``CompactReviewedPathogenicity`` (review statuses as bitmask,
+pathogenicities as counts) with the former implementation on tuples of enums that is kept
+below for reference.  The ``SummaryCache`` is not used, so each VCV is summarized.  Both
+outputs are compared after timing.
+"""
+
+import argparse
+import itertools
+import random
+import re
+import time
+import typing
+
+import attr
+
+from clinvar_tsv.common import Pathogenicity, ReviewStatus, as_pg_list
+from clinvar_tsv.details import (
+    PartialClinVarAssertion,
+    PartialClinVarSet,
+    PartialGenotypeSet,
+    PartialReferenceClinVarAssertion,
+)
+from clinvar_tsv.merge_tsvs import summary_fields
+
+#: Review status labels of single assertions and their weights.
+REVIEW_STATUSES = (
+    ("criteria provided, single submitter", 60),
+    ("no assertion criteria provided", 30),
+    ("reviewed by expert panel", 5),
+    ("practice guideline", 1),
+    ("no assertion provided", 4),
+)
+
+#: Pathogenicity labels of single assertions and their weights.
+PATHOGENICITIES = (
+    ("uncertain significance", 40),
+    ("likely benign", 20),
+    ("benign", 15),
+    ("pathogenic", 12),
+    ("likely pathogenic", 8),
+    ("pathogenic/likely pathogenic", 2),
+    ("risk factor", 1),
+    ("other", 2),
+)
+
+
+def _choices(rng, weighted, k):
+    labels, weights = zip(*weighted)
+    return rng.choices(labels, weights, k=k)
+
+
+def make_population(num_vcvs: int, seed: int) -> typing.List[typing.List[PartialClinVarSet]]:
+    """Return ``num_vcvs`` chunks, mostly with few sets and assertions."""
+    rng = random.Random(seed)
+    ref_cv_assertion = PartialReferenceClinVarAssertion((PartialGenotypeSet("Variant"),))
+    result = []
+    for vcv in range(num_vcvs):
+        num_sets = min(1 + int(rng.expovariate(1.0)), 20)
+        chunk = []
+        for id_no in range(num_sets):
+            num_assertions = min(1 + int(rng.expovariate(0.7)), 30)
+            assertions = tuple(
+                PartialClinVarAssertion(review_status, pathogenicity)
+                for review_status, pathogenicity in zip(
+                    _choices(rng, REVIEW_STATUSES, num_assertions),
+                    _choices(rng, PATHOGENICITIES, num_assertions),
+                )
+            )
+            chunk.append(PartialClinVarSet(vcv * 100 + id_no, ref_cv_assertion, assertions))
+        result.append(chunk)
+    return result
+
+
+@attr.s(frozen=True, auto_attribs=True)
+class LegacyReviewedPathogenicity:
+    """The former ``ReviewedPathogenicity`` on tuples of enums, for comparison."""
+
+    review_statuses: typing.Tuple[ReviewStatus, ...]
+    pathogenicities: typing.Tuple[Pathogenicity, ...]
+
+    def review_status_label(self):
+        return ", ".join([s.label() for s in self.review_statuses])
+
+    def pathogenicity_label(self) -> str:
+        if ReviewStatus.CONFLICTING_INTERPRETATIONS in self.review_statuses:
+            result = "conflicting interpretations of pathogenicity - "
+            counts = {}
+            for pathogenicity in sorted(self.pathogenicities):
+                counts.setdefault(pathogenicity, 0)
+                counts[pathogenicity] += 1
+            result += "; ".join("%s (%d)" % (k.label(), v) for k, v in counts.items())
+            return result
+        else:
+            pathogenicities = list(sorted(set(self.pathogenicities)))
+            return " / ".join(a.label() for a in pathogenicities)
+
+    def pathogenicity_list(self, *, all_on_conflicts: bool) -> typing.List[str]:
+        if (
+            ReviewStatus.CONFLICTING_INTERPRETATIONS in self.review_statuses
+            and not all_on_conflicts
+        ):
+            return [Pathogenicity.UNCERTAIN.label()]
+        else:
+            return [pathogenicity.label() for pathogenicity in sorted(set(self.pathogenicities))]
+
+    def gold_stars(self):
+        if ReviewStatus.PRACTICE_GUIDELINE in self.review_statuses:
+            return 4
+        elif ReviewStatus.EXPERT_PANEL in self.review_statuses:
+            return 3
+        elif (
+            ReviewStatus.CRITERIA_PROVIDED in self.review_statuses
+            and ReviewStatus.MULTIPLE_SUBMITTERS in self.review_statuses
+            and ReviewStatus.NO_CONFLICTS in self.review_statuses
+        ):
+            return 2
+        elif ReviewStatus.CRITERIA_PROVIDED in self.review_statuses and (
+            ReviewStatus.CONFLICTING_INTERPRETATIONS in self.review_statuses
+            or ReviewStatus.SINGLE_SUBMITTER in self.review_statuses
+        ):
+            return 1
+        else:
+            return 0
+
+    def stratum(self):
+        if ReviewStatus.PRACTICE_GUIDELINE in self.review_statuses:
+            return 4
+        elif ReviewStatus.EXPERT_PANEL in self.review_statuses:
+            return 3
+        elif ReviewStatus.CRITERIA_PROVIDED in self.review_statuses:
+            return 2
+        else:
+            return 1
+
+    @classmethod
+    def from_labels(cls, review_status, pathogenicity, variant_id):
+        return cls(
+            review_statuses=tuple(
+                ReviewStatus.from_label(label, variant_id)
+                for label in re.split(r", ?|/", review_status)
+            ),
+            pathogenicities=tuple(
+                Pathogenicity.from_label(label, variant_id)
+                for label in re.split(r", ?|/", pathogenicity)
+            ),
+        )
+
+    @classmethod
+    def combine(cls, elems):
+        def sign(x):
+            return (x > 0) - (x < 0)
+
+        all_pathogenicities = sorted(itertools.chain(*(elem.pathogenicities for elem in elems)))
+        all_statuses = sorted(itertools.chain(*(elem.review_statuses for elem in elems)))
+        multiple_submitters = len(elems) > 1
+
+        if all_statuses == [ReviewStatus.PRACTICE_GUIDELINE]:
+            review_statuses = [ReviewStatus.PRACTICE_GUIDELINE]
+        elif all_statuses == [ReviewStatus.EXPERT_PANEL]:
+            review_statuses = [ReviewStatus.EXPERT_PANEL]
+        else:
+            if multiple_submitters:
+                review_statuses = [ReviewStatus.MULTIPLE_SUBMITTERS]
+            else:
+                review_statuses = [ReviewStatus.SINGLE_SUBMITTER]
+            if ReviewStatus.CRITERIA_PROVIDED in all_statuses:
+                review_statuses.append(ReviewStatus.CRITERIA_PROVIDED)
+            else:
+                review_statuses.append(ReviewStatus.NO_ASSERTION_CRITERIA_PROVIDED)
+
+        signs = {sign(assertion.value) for assertion in set(all_pathogenicities)}
+        if multiple_submitters:
+            if len(signs) == 1:
+                review_statuses.append(ReviewStatus.NO_CONFLICTS)
+            else:
+                review_statuses.append(ReviewStatus.CONFLICTING_INTERPRETATIONS)
+
+        if 1 in signs and 0 in signs:
+            assertions = [assertion for assertion in all_pathogenicities if assertion.value >= 0]
+        elif 1 in signs and -1 in signs:
+            assertions = [assertion for assertion in all_pathogenicities if assertion.value != 0]
+        elif 0 in signs and -1 in signs:
+            assertions = [assertion for assertion in all_pathogenicities if assertion.value <= 0]
+        else:
+            assertions = []
+            for assertion in all_pathogenicities:
+                if assertion not in assertions:
+                    assertions.append(assertion)
+
+        return cls(
+            review_statuses=tuple(review_statuses), pathogenicities=tuple(sorted(assertions))
+        )
+
+
+def legacy_summary_fields(chunk) -> typing.Tuple[str, ...]:
+    rps = [
+        LegacyReviewedPathogenicity.from_labels(
+            cv_assertion.review_status, cv_assertion.pathogenicity, clinvar_set.id_no
+        )
+        for clinvar_set in chunk
+        for cv_assertion in clinvar_set.cv_assertions
+    ]
+
+    def summarize(stratify_by_review_status):
+        stratified = {}
+        for rp in rps:
+            stratified.setdefault(rp.stratum() if stratify_by_review_status else 0, []).append(rp)
+        return LegacyReviewedPathogenicity.combine(stratified[max(stratified.keys())])
+
+    clinvar_summary, paranoid_summary = summarize(True), summarize(False)
+    return (
+        clinvar_summary.review_status_label(),
+        clinvar_summary.pathogenicity_label(),
+        as_pg_list(clinvar_summary.pathogenicity_list(all_on_conflicts=False)),
+        str(clinvar_summary.gold_stars()),
+        paranoid_summary.review_status_label(),
+        paranoid_summary.pathogenicity_label(),
+        as_pg_list(paranoid_summary.pathogenicity_list(all_on_conflicts=True)),
+        str(paranoid_summary.gold_stars()),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vcvs", default=100_000, type=int, help="Number of VCVs to summarize")
+    parser.add_argument("--seed", default=42, type=int)
+    args = parser.parse_args()
+
+    population = make_population(args.vcvs, args.seed)
+    print(
+        "%d VCVs with %d assertions"
+        % (
+            len(population),
+            sum(len(clinvar_set.cv_assertions) for chunk in population for clinvar_set in chunk),
+        )
+    )
+
+    results = {}
+    for name, func in (("legacy", legacy_summary_fields), ("compact", summary_fields)):
+        t_start = time.perf_counter()
+        results[name] = list(map(func, population))
+        elapsed = time.perf_counter() - t_start
+        print("%-8s %.2fs (%.0f VCVs/s)" % (name + ":", elapsed, len(population) / elapsed))
+
+    if results["legacy"] == results["compact"]:
+        print("outputs are identical")
+    else:
+        print("outputs differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,47 @@
 """Command line interface for clinvar-tsv"""
 
 import argparse
-import gzip
+import contextlib
+import json
 import logging
 import os
 import os.path
 import sys
 
+from logzero import logger
 import snakemake
 
 from clinvar_tsv import __version__
 
-from . import merge_tsvs, normalize, parse_clinvar_xml
+from . import (
+    annotate,
+    details,
+    export_parquet,
+    export_pgcopy,
+    export_sqlite,
+    export_vcf,
+    lookup,
+    memprofile,
+    merge_tsvs,
+    normalize,
+    parse_clinvar_xml,
+    reference,
+    serve,
+    sort_tsv,
+    sv_index,
+)
+from .common import open_maybe_gzip
+
+#: Buffer size for the rejected variants sidecar file.
+REJECTED_BUFFER_SIZE = 1024 * 1024
+
+
+def positive_int(value: str) -> int:
+    """Argument type of integers of at least 1."""
+    result = int(value)
+    if result < 1:
+        raise argparse.ArgumentTypeError("must be at least 1: %s" % value)
+    return result
 
 
 def run_inspect(args):
@@ -35,6 +65,7 @@ def run_main(args):
             "b38_path": args.b38_path,
             "debug": args.debug,
             "clinvar_version": args.clinvar_version,
+            "merge_partitions": args.merge_partitions,
         },
         "printshellcmds": True,
         "verbose": args.verbose,
@@ -45,13 +76,6 @@ def run_main(args):
     return not snakemake.snakemake(**kwargs)
 
 
-def open_maybe_gzip(path, mode):
-    if path.endswith(".gz"):
-        return gzip.open(path, mode)
-    else:
-        return open(path, mode)
-
-
 def run_parse_xml(args):
     """Parse XML file."""
     with (
@@ -67,26 +91,208 @@ def run_parse_xml(args):
             out_b38_small=output_b38_small,
             out_b38_sv=output_b38_sv,
             max_rcvs=args.max_rcvs,
+            mem_profiler=args.mem_profiler,
         )
         parser.run()
 
 
+def write_metrics(path, metrics):
+    """Write ``metrics`` as JSON to ``path`` (if any)."""
+    if path:
+        with open(path, "wt") as outputf:
+            json.dump(metrics, outputf, indent=2)
+            outputf.write("\n")
+
+
+def _run_normalize(args, normalize_func):
+    with contextlib.ExitStack() as stack:
+        input_tsv = stack.enter_context(open(args.input_tsv, "rt"))
+        output_tsv = stack.enter_context(open(args.output_tsv, "wt"))
+        if args.output_rejected:
+            rejected = stack.enter_context(
+                open(args.output_rejected, "wt", buffering=REJECTED_BUFFER_SIZE)
+            )
+        else:
+            rejected = None
+        metrics = normalize_func(
+            input_tsv,
+            output_tsv,
+            args.reference,
+            verbose=not args.quiet,
+            rejected=rejected,
+            mem_profiler=args.mem_profiler,
+        )
+    write_metrics(args.output_metrics, metrics)
+
+
 def run_normalize_tsv(args):
-    with open(args.input_tsv, "rt") as input_tsv:
-        with open(args.output_tsv, "wt") as output_tsv:
-            normalize.normalize_tab_delimited_file(input_tsv, output_tsv, args.reference)
+    _run_normalize(args, normalize.normalize_tab_delimited_file)
+
+
+def run_normalize_sv_tsv(args):
+    _run_normalize(args, normalize.normalize_sv_tab_delimited_file)
+
+
+def run_build_reference(args):
+    reference.build_mmap_reference(args.reference, args.output)
+
+
+def run_sort_tsv(args):
+    sort_tsv.sort_tsv(
+        args.input_tsv,
+        args.output_tsv,
+        memory_mb=args.memory_mb,
+        tmp_dir=args.tmp_dir,
+        threads=args.threads,
+        presorted=args.presorted,
+        mem_profiler=args.mem_profiler,
+    )
+
+
+def run_check_sorted(args):
+    result = 0
+    for path in args.input_tsv:
+        checker = sort_tsv.check_sorted(path)
+        if checker.is_sorted:
+            logger.info("%s", checker.message())
+        else:
+            logger.error("%s", checker.message())
+            result = 1
+    return result
 
 
 def run_merge_tsvs(args):
+    if args.partitions:
+        metrics = merge_tsvs.merge_tsvs_partitioned(
+            args.clinvar_version,
+            args.input_tsv,
+            args.output_tsv,
+            args.partitions,
+            mem_profiler=args.mem_profiler,
+            details_decoding=args.details_decoding,
+            verify=args.verify_details,
+            workers=args.workers,
+            max_group_mb=args.max_group_mb,
+            tmp_dir=args.tmp_dir,
+            details_store=args.details_store,
+            gene_index=args.output_gene_index,
+        )
+        write_metrics(args.output_metrics, metrics)
+        return
     with open(args.input_tsv, "rt") as input_tsv:
-        with open(args.output_tsv, "wt") as output_tsv:
-            merge_tsvs.merge_tsvs(args.clinvar_version, input_tsv, output_tsv)
+        with sort_tsv.open_output(args.output_tsv, args.workers) as output_tsv:
+            metrics = merge_tsvs.merge_tsvs(
+                args.clinvar_version,
+                input_tsv,
+                output_tsv,
+                mem_profiler=args.mem_profiler,
+                on_unsorted=args.on_unsorted,
+                details_decoding=args.details_decoding,
+                verify=args.verify_details,
+                workers=args.workers,
+                max_inflight_mb=args.max_inflight_mb,
+                max_group_mb=args.max_group_mb,
+                tmp_dir=args.tmp_dir,
+                details_store=args.details_store,
+                gene_index=args.output_gene_index,
+            )
+    write_metrics(args.output_metrics, metrics)
+
+
+def run_export_parquet(args):
+    metrics = export_parquet.export_parquet(
+        args.input_tsv,
+        args.output_dir,
+        with_details=not args.without_details,
+        batch_rows=args.batch_rows,
+        mem_profiler=args.mem_profiler,
+    )
+    write_metrics(args.output_metrics, metrics)
+
+
+def run_export_pgcopy(args):
+    metrics = export_pgcopy.export_pgcopy(
+        args.input_tsv,
+        args.output_copy,
+        sql_path=args.output_sql,
+        table=args.table,
+        mem_profiler=args.mem_profiler,
+    )
+    write_metrics(args.output_metrics, metrics)
+
+
+def run_export_sqlite(args):
+    metrics = export_sqlite.export_sqlite(
+        args.input_tsv, args.output_db, batch_rows=args.batch_rows, mem_profiler=args.mem_profiler
+    )
+    write_metrics(args.output_metrics, metrics)
+
+
+def run_export_vcf(args):
+    metrics = export_vcf.export_vcf(
+        args.input_tsv, args.output_vcf, index=not args.no_index, mem_profiler=args.mem_profiler
+    )
+    write_metrics(args.output_metrics, metrics)
+
+
+def run_export_lookup(args):
+    metrics = lookup.build_lookup(
+        args.input_tsv, args.output_lookup, mem_profiler=args.mem_profiler
+    )
+    write_metrics(args.output_metrics, metrics)
+
+
+def run_build_sv_index(args):
+    metrics = sv_index.build_sv_index(
+        args.input_tsv, args.output_index, mem_profiler=args.mem_profiler
+    )
+    write_metrics(args.output_metrics, metrics)
+
+
+def run_query_sv_index(args):
+    metrics = sv_index.query_sv_index(
+        args.sv_index,
+        args.input_bed,
+        args.output_tsv,
+        min_overlap=args.min_overlap,
+        min_size=args.min_size,
+        max_size=args.max_size,
+    )
+    write_metrics(args.output_metrics, metrics)
+
+
+def run_annotate(args):
+    metrics = annotate.annotate(
+        args.clinvar_tsv,
+        args.input_vcf,
+        args.output_vcf,
+        prefix=args.info_prefix,
+        seek_distance=args.seek_distance,
+        workers=args.workers,
+        batch_lines=args.batch_lines,
+        mem_profiler=args.mem_profiler,
+    )
+    write_metrics(args.output_metrics, metrics)
+
+
+def run_serve(args):
+    serve.serve(
+        args.input_tsv,
+        host=args.host,
+        port=args.port,
+        cache_size=args.cache_size,
+        reload_interval=args.reload_interval,
+    )
 
 
 def run(args):
     """Entry point after parsing command line arguments"""
     logging.basicConfig(level=logging.INFO)
-    return args.func(args)
+    with memprofile.MemoryProfiler(
+        args.mem_profile, args.mem_profile_interval, args.mem_profile_top
+    ) as mem_profiler:
+        args.mem_profiler = mem_profiler
+        return args.func(args)
 
 
 def main(argv=None):
@@ -97,6 +303,22 @@ def main(argv=None):
         "--version", action="version", version="%(prog)s {version}".format(version=__version__)
     )
 
+    parser.add_argument(
+        "--mem-profile", help="Write memory usage timeline of the subcommand to this TSV file"
+    )
+    parser.add_argument(
+        "--mem-profile-interval",
+        default=memprofile.DEFAULT_INTERVAL,
+        type=int,
+        help="Number of records between two memory samples",
+    )
+    parser.add_argument(
+        "--mem-profile-top",
+        default=0,
+        type=int,
+        help="Number of top allocation sites to record with each sample (uses tracemalloc)",
+    )
+
     subparsers = parser.add_subparsers()
     subparsers.required = True
     subparsers.dest = "command"
@@ -131,6 +353,12 @@ def main(argv=None):
     parser_main.add_argument(
         "--clinvar-version", required=True, help="String to put as clinvar version"
     )
+    parser_main.add_argument(
+        "--merge-partitions",
+        default=0,
+        type=int,
+        help="Merge the unsorted tables with this many partitions instead of sorting them first",
+    )
     parser_main.set_defaults(func=run_main)
 
     # -----------------------------------------------------------------------
@@ -161,14 +389,103 @@ def main(argv=None):
     # -----------------------------------------------------------------------
 
     parser_normalize_tsv = subparsers.add_parser("normalize_tsv", help="Parse the Clinvar XML")
-    parser_normalize_tsv.add_argument(
+    parser_normalize_tsv.set_defaults(func=run_normalize_tsv)
+
+    # -----------------------------------------------------------------------
+    # Command: normalize_sv_tsv
+    # -----------------------------------------------------------------------
+
+    parser_normalize_sv_tsv = subparsers.add_parser(
+        "normalize_sv_tsv", help="Canonicalize coordinates of the SV TSV file"
+    )
+    parser_normalize_sv_tsv.set_defaults(func=run_normalize_sv_tsv)
+
+    for parser_normalize in (parser_normalize_tsv, parser_normalize_sv_tsv):
+        parser_normalize.add_argument(
+            "--reference",
+            required=True,
+            help="Path to reference FASTA file, *.2bit file, or *.mmseq file from build_reference",
+        )
+        parser_normalize.add_argument("--input-tsv", required=True, help="Path to input TSV file.")
+        parser_normalize.add_argument(
+            "--output-tsv", required=True, help="Path to output TSV file."
+        )
+        parser_normalize.add_argument(
+            "--output-rejected",
+            help="Path to TSV file for rejected records with reason code and original row.",
+        )
+        parser_normalize.add_argument(
+            "--output-metrics", help="Path to JSON file with record and rejection counts."
+        )
+        parser_normalize.add_argument(
+            "--quiet", default=False, action="store_true", help="Disable progress display"
+        )
+
+    # -----------------------------------------------------------------------
+    # Command: build_reference
+    # -----------------------------------------------------------------------
+
+    parser_build_reference = subparsers.add_parser(
+        "build_reference", help="Build memory-mapped sequence store for normalize_tsv"
+    )
+    parser_build_reference.add_argument(
         "--reference", required=True, help="Path to reference FASTA file"
     )
-    parser_normalize_tsv.add_argument("--input-tsv", required=True, help="Path to input TSV file.")
-    parser_normalize_tsv.add_argument(
-        "--output-tsv", required=True, help="Path to output TSV file."
+    parser_build_reference.add_argument(
+        "--output", required=True, help="Path to output file, should end in .mmseq"
     )
-    parser_normalize_tsv.set_defaults(func=run_normalize_tsv)
+    parser_build_reference.set_defaults(func=run_build_reference)
+
+    # -----------------------------------------------------------------------
+    # Command: sort_tsv
+    # -----------------------------------------------------------------------
+
+    parser_sort_tsv = subparsers.add_parser(
+        "sort_tsv", help="Sort TSV file by chromosome, start, end, and VCV"
+    )
+    parser_sort_tsv.add_argument(
+        "--input-tsv",
+        required=True,
+        action="append",
+        help="Path to input TSV file, may be gzip-compressed; give more than once to concatenate",
+    )
+    parser_sort_tsv.add_argument(
+        "--output-tsv", required=True, help="Path to output TSV file, BGZF if ending in .gz."
+    )
+    parser_sort_tsv.add_argument(
+        "--memory-mb",
+        default=sort_tsv.DEFAULT_MEMORY_MB,
+        type=positive_int,
+        help="Memory budget in MB for sorting before spilling to disk (estimated)",
+    )
+    parser_sort_tsv.add_argument(
+        "--tmp-dir", help="Directory for spilling sorted runs, defaults to system temp dir"
+    )
+    parser_sort_tsv.add_argument(
+        "--threads", default=1, type=int, help="Number of sorting and compression threads"
+    )
+    parser_sort_tsv.add_argument(
+        "--presorted",
+        default=False,
+        action="store_true",
+        help="Each input is sorted already, merge them and fail on rows out of order",
+    )
+    parser_sort_tsv.set_defaults(func=run_sort_tsv)
+
+    # -----------------------------------------------------------------------
+    # Command: check_sorted
+    # -----------------------------------------------------------------------
+
+    parser_check_sorted = subparsers.add_parser(
+        "check_sorted", help="Check that TSV files are sorted as by sort_tsv"
+    )
+    parser_check_sorted.add_argument(
+        "--input-tsv",
+        required=True,
+        action="append",
+        help="Path to input TSV file, may be gzip-compressed; can be given more than once",
+    )
+    parser_check_sorted.set_defaults(func=run_check_sorted)
 
     # -----------------------------------------------------------------------
     # Command: merge_tsvs
@@ -178,12 +495,329 @@ def main(argv=None):
         "merge_tsvs", help="Merge TSV file (result: one per VCV)"
     )
     parser_merge_tsvs.add_argument("--input-tsv", required=True, help="Path to input TSV file.")
-    parser_merge_tsvs.add_argument("--output-tsv", required=True, help="Path to output TSV file.")
+    parser_merge_tsvs.add_argument(
+        "--output-tsv", required=True, help="Path to output TSV file (BGZF if it ends in .gz)."
+    )
     parser_merge_tsvs.add_argument(
         "--clinvar-version", required=True, help="String to put as clinvar version"
     )
+    parser_merge_tsvs.add_argument(
+        "--on-unsorted",
+        default="error",
+        choices=merge_tsvs.ON_UNSORTED_CHOICES,
+        help="What to do if the input is not sorted, i.e., records may be split",
+    )
+    parser_merge_tsvs.add_argument(
+        "--details-decoding",
+        default="full",
+        choices=details.DETAILS_DECODING_CHOICES,
+        help="Decode full details or only the fields needed for the summaries",
+    )
+    parser_merge_tsvs.add_argument(
+        "--verify-details",
+        default=False,
+        action="store_true",
+        help="Check that the details passed through equal the decoded and encoded details",
+    )
+    parser_merge_tsvs.add_argument(
+        "--workers", default=1, type=int, help="Number of worker processes for merging"
+    )
+    parser_merge_tsvs.add_argument(
+        "--max-inflight-mb",
+        default=merge_tsvs.DEFAULT_MAX_INFLIGHT_MB,
+        type=int,
+        help="Bound in MB of the input rows handed to the workers but not yet written",
+    )
+    parser_merge_tsvs.add_argument(
+        "--max-group-mb",
+        default=merge_tsvs.DEFAULT_MAX_GROUP_MB,
+        type=int,
+        help="Size in MB of a VCV group above which its details are streamed via a temp file",
+    )
+    parser_merge_tsvs.add_argument(
+        "--partitions",
+        default=0,
+        type=int,
+        help=(
+            "Merge unsorted input by splitting it into this many partitions by VCV and merging "
+            "those; the output is sorted (BGZF if it ends in .gz)"
+        ),
+    )
+    parser_merge_tsvs.add_argument(
+        "--tmp-dir",
+        help="Directory for streamed groups and partitions, defaults to system temp dir",
+    )
+    parser_merge_tsvs.add_argument(
+        "--details-store",
+        help=(
+            "Write the details to this BGZF file (with .idx index) and only the summaries with "
+            "the details offset to the output TSV"
+        ),
+    )
+    parser_merge_tsvs.add_argument(
+        "--output-gene-index",
+        help=(
+            "Write index of the output rows by gene symbol and HGNC ID to this file, requires "
+            "BGZF output; name it as the output plus .genes to be used by queries"
+        ),
+    )
+    parser_merge_tsvs.add_argument(
+        "--output-metrics", help="Path to JSON file with record counts and summary cache stats."
+    )
     parser_merge_tsvs.set_defaults(func=run_merge_tsvs)
 
+    # -----------------------------------------------------------------------
+    # Command: export_parquet
+    # -----------------------------------------------------------------------
+
+    parser_export_parquet = subparsers.add_parser(
+        "export_parquet", help="Export merged TSV files to Parquet (requires pyarrow)"
+    )
+    parser_export_parquet.add_argument(
+        "--input-tsv",
+        required=True,
+        action="append",
+        help="Path to merged TSV file, may be gzip-compressed; can be given more than once",
+    )
+    parser_export_parquet.add_argument(
+        "--output-dir",
+        required=True,
+        help="Directory to write the dataset partitioned by release and chromosome to",
+    )
+    parser_export_parquet.add_argument(
+        "--without-details", default=False, action="store_true", help="Leave out details column"
+    )
+    parser_export_parquet.add_argument(
+        "--batch-rows",
+        default=export_parquet.DEFAULT_BATCH_ROWS,
+        type=int,
+        help="Number of rows to convert at a time",
+    )
+    parser_export_parquet.add_argument(
+        "--output-metrics", help="Path to JSON file with the number of rows written."
+    )
+    parser_export_parquet.set_defaults(func=run_export_parquet)
+
+    # -----------------------------------------------------------------------
+    # Command: export_pgcopy
+    # -----------------------------------------------------------------------
+
+    parser_export_pgcopy = subparsers.add_parser(
+        "export_pgcopy", help="Export merged TSV file as PostgreSQL binary COPY file"
+    )
+    parser_export_pgcopy.add_argument(
+        "--input-tsv", required=True, help="Path to merged TSV file, may be gzip-compressed"
+    )
+    parser_export_pgcopy.add_argument(
+        "--output-copy",
+        required=True,
+        help="Path to binary COPY file, gzip-compressed if ending in .gz",
+    )
+    parser_export_pgcopy.add_argument(
+        "--output-sql", help="Path to write CREATE TABLE statement for the COPY file to"
+    )
+    parser_export_pgcopy.add_argument(
+        "--table", default="clinvar", help="Table name for the CREATE TABLE statement"
+    )
+    parser_export_pgcopy.add_argument(
+        "--output-metrics", help="Path to JSON file with the number of rows written."
+    )
+    parser_export_pgcopy.set_defaults(func=run_export_pgcopy)
+
+    # -----------------------------------------------------------------------
+    # Command: export_sqlite
+    # -----------------------------------------------------------------------
+
+    parser_export_sqlite = subparsers.add_parser(
+        "export_sqlite", help="Export merged TSV files to indexed SQLite database"
+    )
+    parser_export_sqlite.add_argument(
+        "--input-tsv",
+        required=True,
+        action="append",
+        help="Path to merged TSV file, may be gzip-compressed; can be given more than once",
+    )
+    parser_export_sqlite.add_argument(
+        "--output-db", required=True, help="Path to SQLite database, replaced if it exists"
+    )
+    parser_export_sqlite.add_argument(
+        "--batch-rows",
+        default=export_sqlite.DEFAULT_BATCH_ROWS,
+        type=int,
+        help="Number of rows to insert per transaction",
+    )
+    parser_export_sqlite.add_argument(
+        "--output-metrics", help="Path to JSON file with the number of rows written."
+    )
+    parser_export_sqlite.set_defaults(func=run_export_sqlite)
+
+    # -----------------------------------------------------------------------
+    # Command: export_vcf
+    # -----------------------------------------------------------------------
+
+    parser_export_vcf = subparsers.add_parser(
+        "export_vcf", help="Export merged small variant table as bgzip-compressed VCF file"
+    )
+    parser_export_vcf.add_argument(
+        "--input-tsv",
+        required=True,
+        help="Path to merged and sorted TSV file, may be gzip-compressed",
+    )
+    parser_export_vcf.add_argument(
+        "--output-vcf", required=True, help="Path to bgzip-compressed VCF file (.vcf.gz)"
+    )
+    parser_export_vcf.add_argument(
+        "--no-index",
+        default=False,
+        action="store_true",
+        help="Do not write the CSI index to the output path plus .csi",
+    )
+    parser_export_vcf.add_argument(
+        "--output-metrics", help="Path to JSON file with the number of records written and skipped."
+    )
+    parser_export_vcf.set_defaults(func=run_export_vcf)
+
+    # -----------------------------------------------------------------------
+    # Command: export_lookup
+    # -----------------------------------------------------------------------
+
+    parser_export_lookup = subparsers.add_parser(
+        "export_lookup", help="Export merged small variant table as binary lookup file"
+    )
+    parser_export_lookup.add_argument(
+        "--input-tsv", required=True, help="Path to merged TSV file, may be gzip-compressed"
+    )
+    parser_export_lookup.add_argument(
+        "--output-lookup", required=True, help="Path to binary lookup file"
+    )
+    parser_export_lookup.add_argument(
+        "--output-metrics", help="Path to JSON file with the number of records written."
+    )
+    parser_export_lookup.set_defaults(func=run_export_lookup)
+
+    # -----------------------------------------------------------------------
+    # Command: build_sv_index
+    # -----------------------------------------------------------------------
+
+    parser_build_sv_index = subparsers.add_parser(
+        "build_sv_index", help="Build index of merged SV table for overlap queries"
+    )
+    parser_build_sv_index.add_argument(
+        "--input-tsv", required=True, help="Path to merged SV table, bgzip-compressed"
+    )
+    parser_build_sv_index.add_argument(
+        "--output-index", required=True, help="Path to SV index file"
+    )
+    parser_build_sv_index.add_argument(
+        "--output-metrics", help="Path to JSON file with the number of records written."
+    )
+    parser_build_sv_index.set_defaults(func=run_build_sv_index)
+
+    # -----------------------------------------------------------------------
+    # Command: query_sv_index
+    # -----------------------------------------------------------------------
+
+    parser_query_sv_index = subparsers.add_parser(
+        "query_sv_index", help="Query SV index with the intervals of a BED file"
+    )
+    parser_query_sv_index.add_argument(
+        "--sv-index", required=True, help="Path to SV index file, next to the indexed table"
+    )
+    parser_query_sv_index.add_argument(
+        "--input-bed", required=True, help="Path to BED file with query intervals"
+    )
+    parser_query_sv_index.add_argument(
+        "--output-tsv", required=True, help="Path to TSV file with the overlapping records"
+    )
+    parser_query_sv_index.add_argument(
+        "--min-overlap",
+        default=0.0,
+        type=float,
+        help="Smallest reciprocal overlap as a fraction, e.g., 0.5; default is any overlap",
+    )
+    parser_query_sv_index.add_argument("--min-size", type=int, help="Smallest SV size in bp")
+    parser_query_sv_index.add_argument("--max-size", type=int, help="Largest SV size in bp")
+    parser_query_sv_index.add_argument(
+        "--output-metrics", help="Path to JSON file with the number of queries and hits."
+    )
+    parser_query_sv_index.set_defaults(func=run_query_sv_index)
+
+    # -----------------------------------------------------------------------
+    # Command: annotate
+    # -----------------------------------------------------------------------
+
+    parser_annotate = subparsers.add_parser(
+        "annotate", help="Annotate VCF file with the merged small variant table"
+    )
+    parser_annotate.add_argument(
+        "--clinvar-tsv",
+        required=True,
+        help="Path to merged small variant table, bgzip-compressed and indexed with tabix",
+    )
+    parser_annotate.add_argument(
+        "--input-vcf", required=True, help="Path to sorted VCF file, may be gzip-compressed"
+    )
+    parser_annotate.add_argument(
+        "--output-vcf",
+        required=True,
+        help="Path to annotated VCF file, bgzip-compressed if ending in .gz",
+    )
+    parser_annotate.add_argument(
+        "--info-prefix",
+        default=annotate.DEFAULT_INFO_PREFIX,
+        help="Prefix of the added INFO fields",
+    )
+    parser_annotate.add_argument(
+        "--seek-distance",
+        default=annotate.DEFAULT_SEEK_DISTANCE,
+        type=int,
+        help="Largest distance in bp to read the table linearly instead of seeking with the index",
+    )
+    parser_annotate.add_argument(
+        "--workers", default=1, type=int, help="Number of processes annotating batches of lines"
+    )
+    parser_annotate.add_argument(
+        "--batch-lines",
+        default=annotate.DEFAULT_BATCH_LINES,
+        type=int,
+        help="Number of VCF lines per batch",
+    )
+    parser_annotate.add_argument(
+        "--output-metrics", help="Path to JSON file with the number of records annotated."
+    )
+    parser_annotate.set_defaults(func=run_annotate)
+
+    # -----------------------------------------------------------------------
+    # Command: serve
+    # -----------------------------------------------------------------------
+
+    parser_serve = subparsers.add_parser(
+        "serve", help="Serve lookups in the merged tables as JSON over HTTP"
+    )
+    parser_serve.add_argument(
+        "--input-tsv",
+        required=True,
+        action="append",
+        help="Path to merged table, bgzip-compressed and indexed with tabix, may be repeated",
+    )
+    parser_serve.add_argument("--host", default=serve.DEFAULT_HOST, help="Address to listen on")
+    parser_serve.add_argument(
+        "--port", default=serve.DEFAULT_PORT, type=int, help="Port to listen on"
+    )
+    parser_serve.add_argument(
+        "--cache-size",
+        default=serve.DEFAULT_CACHE_SIZE,
+        type=int,
+        help="Number of answers to single queries kept in the cache",
+    )
+    parser_serve.add_argument(
+        "--reload-interval",
+        default=serve.DEFAULT_RELOAD_INTERVAL,
+        type=float,
+        help="Seconds between checks for changed files, 0 to only reload on SIGHUP",
+    )
+    parser_serve.set_defaults(func=run_serve)
+
     args = parser.parse_args(argv)
     clinvar_version = os.environ.get("CLINVAR_VERSION", getattr(args, "clinvar_version", None))
     if clinvar_version:
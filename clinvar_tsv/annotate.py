@@ -0,0 +1,220 @@
+"""Annotation of VCF files with the merged small variant table.
+
+The records of the input VCF are matched to the records of the merged table with the same
+chromosome, position, reference, and alternative allele, and the INFO fields of
+``export_vcf.INFO_FIELDS`` with a prefix (``CLINVAR_`` by default) are added for the matches.
+With several matches, e.g., for multi-allelic records, the values of all matches are listed.
+The ``chr`` prefix of chromosome names is ignored and ``M`` is the same as ``MT``.
+
+The input is read in batches of lines.  The records of each batch are merge-joined with the
+merged table: the table is read in one linear pass from the first position on, and only when
+the next position is more than ``seek_distance`` bp ahead (or behind, for unsorted input) the
+table is read from the index again.  So dense inputs such as exomes are joined in one pass and
+sparse inputs do not read the whole table.  With ``workers > 1``, batches are annotated in a
+process pool and written in input order.
+"""
+
+import concurrent.futures
+import itertools
+import typing
+
+from logzero import logger
+
+from clinvar_tsv.bgzf import BgzfWriter
+from clinvar_tsv.common import open_maybe_gzip
+from clinvar_tsv.export_vcf import INFO_FIELDS, info_values
+from clinvar_tsv.memprofile import MemoryProfiler
+from clinvar_tsv.pool import OrderedPool
+from clinvar_tsv.query import ClinVarReader
+
+#: Default prefix of the added INFO fields.
+DEFAULT_INFO_PREFIX = "CLINVAR_"
+
+#: Default distance in bp up to which the merged table is read linearly instead of seeking.
+DEFAULT_SEEK_DISTANCE = 100_000
+
+#: Default number of VCF lines annotated at a time.
+DEFAULT_BATCH_LINES = 10_000
+
+#: Largest number of bytes of VCF lines in flight with ``workers > 1``.
+MAX_INFLIGHT_BYTES = 256 * 1024 * 1024
+
+#: Readers of the worker processes by path.
+_WORKER_READERS: typing.Dict[str, ClinVarReader] = {}
+
+
+def clinvar_chromosome(chromosome: str) -> str:
+    """Return name of ``chromosome`` in the merged table."""
+    if chromosome.startswith("chr"):
+        chromosome = chromosome[3:]
+    return "MT" if chromosome == "M" else chromosome
+
+
+def info_header(prefix: str) -> typing.List[str]:
+    """Return header lines of the added INFO fields."""
+    return [
+        '##INFO=<ID=%s%s,Number=.,Type=%s,Description="ClinVar: %s">'
+        % (prefix, id_, type_, description)
+        for id_, _, type_, _, description in INFO_FIELDS
+    ]
+
+
+class _Joiner:
+    """Merge-join of increasing positions on one chromosome with the merged table."""
+
+    def __init__(self, reader: ClinVarReader, chromosome: str, seek_distance: int):
+        self.reader = reader
+        self.chromosome = chromosome
+        self.seek_distance = seek_distance
+        self._idx_start = reader.header.index("start")
+        self._records: typing.Optional[typing.Iterator[typing.List[str]]] = None
+        self._fields: typing.Optional[typing.List[str]] = None
+        self._position = -1
+        self._at_position: typing.List[typing.List[str]] = []
+        #: Number of times the table was read from the index.
+        self.seeks = 0
+
+    def lookup(self, position: int) -> typing.List[typing.List[str]]:
+        """Return fields of the records starting at ``position``."""
+        if position == self._position:
+            return self._at_position
+        if (
+            self._records is None
+            or position < self._position
+            or position - self._position > self.seek_distance
+        ):
+            self._records = self.reader.stream(self.chromosome, position)
+            self._fields = next(self._records, None)
+            self.seeks += 1
+        idx_start, fields = self._idx_start, self._fields
+        while fields is not None and int(fields[idx_start]) < position:
+            fields = next(self._records, None)
+        self._at_position = []
+        while fields is not None and int(fields[idx_start]) == position:
+            self._at_position.append(fields)
+            fields = next(self._records, None)
+        self._fields, self._position = fields, position
+        return self._at_position
+
+
+def annotate_lines(
+    reader: ClinVarReader, lines: typing.List[str], prefix: str, seek_distance: int
+) -> typing.Tuple[typing.List[str], typing.Dict[str, int]]:
+    """Return annotated VCF record ``lines`` and counts of annotated records and seeks."""
+    idx_ref, idx_alt = reader.header.index("reference"), reader.header.index("alternative")
+    info_columns = [
+        (prefix + id_, column, reader.header.index(column)) for id_, _, _, column, _ in INFO_FIELDS
+    ]
+    result, annotated, seeks = [], 0, 0
+    joiner = None
+    for line in lines:
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) < 8:
+            result.append(line)
+            continue
+        chromosome = clinvar_chromosome(fields[0])
+        if joiner is None or joiner.chromosome != chromosome:
+            seeks += joiner.seeks if joiner else 0
+            joiner = _Joiner(reader, chromosome, seek_distance)
+        alts = fields[4].split(",")
+        matches = [
+            record
+            for record in joiner.lookup(int(fields[1]))
+            if record[idx_ref] == fields[3] and record[idx_alt] in alts
+        ]
+        if matches:
+            annotated += 1
+            info = []
+            for id_, column, idx in info_columns:
+                values = [value for record in matches for value in info_values(column, record[idx])]
+                if values:
+                    info.append("%s=%s" % (id_, ",".join(values)))
+            if fields[7] in ("", "."):
+                fields[7] = ";".join(info)
+            else:
+                fields[7] += ";" + ";".join(info)
+            line = "\t".join(fields) + "\n"
+        result.append(line)
+    seeks += joiner.seeks if joiner else 0
+    return result, {"records_annotated": annotated, "seeks": seeks}
+
+
+def _annotate_batch(clinvar_path: str, prefix: str, seek_distance: int, lines: typing.List[str]):
+    reader = _WORKER_READERS.get(clinvar_path)
+    if reader is None:
+        reader = _WORKER_READERS[clinvar_path] = ClinVarReader(clinvar_path)
+    return annotate_lines(reader, lines, prefix, seek_distance)
+
+
+def _batches(inputf, batch_lines: int) -> typing.Iterator[typing.List[str]]:
+    batch: typing.List[str] = []
+    for line in inputf:
+        batch.append(line)
+        if len(batch) >= batch_lines:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def annotate(
+    clinvar_path: str,
+    input_path: str,
+    output_path: str,
+    prefix: str = DEFAULT_INFO_PREFIX,
+    seek_distance: int = DEFAULT_SEEK_DISTANCE,
+    workers: int = 1,
+    batch_lines: int = DEFAULT_BATCH_LINES,
+    mem_profiler: typing.Optional[MemoryProfiler] = None,
+) -> typing.Dict[str, int]:
+    """Annotate VCF file at ``input_path`` with the indexed merged table at ``clinvar_path``.
+
+    The output is written to ``output_path``, BGZF-compressed if it ends in ``.gz``.  The
+    records of each written batch are registered with ``mem_profiler``, if any.  Returns the
+    number of records read and annotated, and the number of seeks.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    metrics = {"records": 0, "records_annotated": 0, "seeks": 0}
+
+    if output_path.endswith(".gz"):
+        outputf = BgzfWriter.open(output_path)
+    else:
+        outputf = open(output_path, "wt")
+    with open_maybe_gzip(input_path, "rt") as inputf, outputf:
+        records: typing.Iterable[str] = inputf
+        for line in inputf:
+            if not line.startswith("#"):
+                records = itertools.chain([line], inputf)
+                break
+            if line.startswith("#CHROM"):
+                outputf.write("".join(header + "\n" for header in info_header(prefix)))
+            outputf.write(line)
+            if not line.startswith("##"):
+                break
+
+        def on_result(result):
+            lines, counts = result
+            outputf.write("".join(lines))
+            metrics["records"] += len(lines)
+            mem_profiler.tick(len(lines))
+            for key, value in counts.items():
+                metrics[key] += value
+
+        args = (clinvar_path, prefix, seek_distance)
+        if workers > 1:
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                pool = OrderedPool(executor, on_result, MAX_INFLIGHT_BYTES, 2 * workers)
+                for batch in _batches(records, batch_lines):
+                    pool.submit(sum(map(len, batch)), _annotate_batch, *args, batch)
+                pool.drain()
+        else:
+            with ClinVarReader(clinvar_path) as reader:
+                for batch in _batches(records, batch_lines):
+                    on_result(annotate_lines(reader, batch, prefix, seek_distance))
+    logger.info(
+        "Annotated %d of %d records (%d seeks)",
+        metrics["records_annotated"],
+        metrics["records"],
+        metrics["seeks"],
+    )
+    return metrics
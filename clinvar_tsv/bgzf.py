@@ -0,0 +1,250 @@
+"""Writing and random access reading of BGZF files as created by ``bgzip``.
+
+BGZF files are a series of gzip members of at most 64KB each, so they can be read by any
+gzip reader and indexed by ``tabix``.  Positions in BGZF files are given as virtual offsets,
+i.e., ``(block_offset << 16) | offset_in_block``.  ``BgzfWriter.tell()`` returns the virtual
+offset of the next byte written, which allows for building indices while writing, and
+``BgzfReader.seek()`` goes back to such an offset, decompressing only the blocks read from.
+As ``tell()`` writes out the pending blocks, writers that need the offsets of many records
+record the uncompressed ``BgzfWriter.data_offset()`` instead and convert it with
+``BgzfWriter.virtual_offset()`` later.
+"""
+
+import bisect
+import collections
+import concurrent.futures
+import struct
+import typing
+import zlib
+
+#: Largest number of uncompressed bytes in one block, same as ``bgzip``.
+MAX_BLOCK_DATA = 0xFF00
+
+#: Header of a BGZF block, followed by the block size minus one.
+_BLOCK_HEADER = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+
+#: Length of the header of a BGZF block including the block size.
+_HEADER_SIZE = len(_BLOCK_HEADER) + 2
+
+#: The empty block at the end of each BGZF file.
+EOF_BLOCK = _BLOCK_HEADER + b"\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+
+
+def compress_block(data: bytes, level: int = 6) -> bytes:
+    """Return BGZF block for ``data`` (at most ``MAX_BLOCK_DATA`` bytes)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    return b"".join(
+        (
+            _BLOCK_HEADER,
+            struct.pack("<H", len(_BLOCK_HEADER) + 2 + len(cdata) + 8 - 1),
+            cdata,
+            struct.pack("<II", zlib.crc32(data), len(data)),
+        )
+    )
+
+
+class BgzfWriter:
+    """Write BGZF to the binary file ``fileobj``.
+
+    With ``threads > 1``, blocks are compressed in a thread pool (``zlib`` releases the GIL)
+    and written out in batches.
+    """
+
+    def __init__(self, fileobj: typing.BinaryIO, level: int = 6, threads: int = 1):
+        #: The file to write to.
+        self.fileobj = fileobj
+        #: The compression level.
+        self.level = level
+        #: Offset of the next block in the compressed file.
+        self._block_offset = 0
+        #: Uncompressed data of the current block.
+        self._buffer = bytearray()
+        #: Full blocks waiting for compression.
+        self._pending: typing.List[bytes] = []
+        #: Uncompressed offset of the first byte of ``_pending`` or else ``_buffer``.
+        self._pending_start = 0
+        #: Uncompressed offsets of the blocks written so far.
+        self._data_starts: typing.List[int] = []
+        #: Compressed offsets of the blocks written so far.
+        self._block_starts: typing.List[int] = []
+        self._batch_size = max(1, 4 * threads)
+        if threads > 1:
+            self._executor = concurrent.futures.ThreadPoolExecutor(threads)
+        else:
+            self._executor = None
+
+    @classmethod
+    def open(cls, path: str, level: int = 6, threads: int = 1):
+        return cls(open(path, "wb"), level=level, threads=threads)
+
+    def tell(self) -> int:
+        """Return virtual offset of the next byte to be written.
+
+        This compresses and writes out all full blocks, so calling it often defeats the
+        batching for ``threads > 1``.
+        """
+        self._flush_pending()
+        return (self._block_offset << 16) | len(self._buffer)
+
+    def data_offset(self) -> int:
+        """Return uncompressed offset of the next byte to be written, without writing out."""
+        # Pending blocks are full, ``flush()`` writes out partial blocks at once.
+        return self._pending_start + len(self._pending) * MAX_BLOCK_DATA + len(self._buffer)
+
+    def virtual_offset(self, data_offset: int) -> int:
+        """Return virtual offset of the byte written at uncompressed offset ``data_offset``.
+
+        The offset must be of a byte written already or of the next byte to be written, and
+        it is valid once the block of that byte is written out.
+        """
+        self._flush_pending()
+        if data_offset >= self._pending_start:
+            return (self._block_offset << 16) | (data_offset - self._pending_start)
+        i = bisect.bisect_right(self._data_starts, data_offset) - 1
+        return (self._block_starts[i] << 16) | (data_offset - self._data_starts[i])
+
+    def write(self, data: typing.Union[bytes, str]):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._buffer += data
+        while len(self._buffer) >= MAX_BLOCK_DATA:
+            self._pending.append(bytes(self._buffer[:MAX_BLOCK_DATA]))
+            del self._buffer[:MAX_BLOCK_DATA]
+            if len(self._pending) >= self._batch_size:
+                self._flush_pending()
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+        if self._executor:
+            levels = [self.level] * len(self._pending)
+            blocks = self._executor.map(compress_block, self._pending, levels)
+        else:
+            blocks = (compress_block(data, self.level) for data in self._pending)
+        for data, block in zip(self._pending, blocks):
+            self.fileobj.write(block)
+            self._data_starts.append(self._pending_start)
+            self._block_starts.append(self._block_offset)
+            self._pending_start += len(data)
+            self._block_offset += len(block)
+        self._pending = []
+
+    def flush(self):
+        """Write out the current block, the next write starts a new block."""
+        if self._buffer:
+            self._pending.append(bytes(self._buffer))
+            self._buffer = bytearray()
+        self._flush_pending()
+
+    def close(self):
+        self.flush()
+        self.fileobj.write(EOF_BLOCK)
+        self.fileobj.close()
+        if self._executor:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class BgzfReader:
+    """Read lines from the binary BGZF file ``fileobj`` at virtual offsets.
+
+    Besides the last block read, up to ``cache_blocks`` decompressed blocks are kept in memory
+    and evicted in least recently used order.
+    """
+
+    def __init__(self, fileobj: typing.BinaryIO, cache_blocks: int = 0):
+        #: The file to read from.
+        self.fileobj = fileobj
+        #: Largest number of blocks in the cache.
+        self.cache_blocks = cache_blocks
+        #: Cached blocks, data and offset of next block by block offset.
+        self._cache: "collections.OrderedDict[int, typing.Tuple[bytes, int]]" = (
+            collections.OrderedDict()
+        )
+        #: Number of blocks found in and missing from the cache.
+        self.cache_hits = 0
+        self.cache_misses = 0
+        #: Offset of the current block in the compressed file.
+        self._block_offset = -1
+        #: Offset of the block after the current one.
+        self._next_block_offset = 0
+        #: Uncompressed data of the current block and position in it.
+        self._data = b""
+        self._pos = 0
+
+    @classmethod
+    def open(cls, path: str, cache_blocks: int = 0):
+        return cls(open(path, "rb"), cache_blocks=cache_blocks)
+
+    def _load_block(self, block_offset: int):
+        if block_offset == self._block_offset:
+            return
+        if self.cache_blocks:
+            cached = self._cache.get(block_offset)
+            if cached is not None:
+                self.cache_hits += 1
+                self._cache.move_to_end(block_offset)
+                self._data, self._next_block_offset = cached
+                self._block_offset = block_offset
+                self._pos = 0
+                return
+            self.cache_misses += 1
+        self.fileobj.seek(block_offset)
+        header = self.fileobj.read(_HEADER_SIZE)
+        if not header:
+            data, block_size = b"", 0
+        elif (
+            len(header) < _HEADER_SIZE or header[:4] != _BLOCK_HEADER[:4] or header[12:14] != b"BC"
+        ):
+            raise ValueError("Invalid BGZF block at offset %d" % block_offset)
+        else:
+            block_size = struct.unpack("<H", header[-2:])[0] + 1
+            cdata = self.fileobj.read(block_size - _HEADER_SIZE)
+            data = zlib.decompress(cdata[:-8], -15)
+        self._block_offset = block_offset
+        self._next_block_offset = block_offset + block_size
+        self._data = data
+        self._pos = 0
+        if self.cache_blocks:
+            self._cache[block_offset] = (data, self._next_block_offset)
+            if len(self._cache) > self.cache_blocks:
+                self._cache.popitem(last=False)
+
+    def tell(self) -> int:
+        """Return virtual offset of the next byte to be read."""
+        return (self._block_offset << 16) | self._pos
+
+    def seek(self, virtual_offset: int):
+        self._load_block(virtual_offset >> 16)
+        self._pos = virtual_offset & 0xFFFF
+
+    def readline(self) -> bytes:
+        """Return the next line including the newline, an empty string at the end."""
+        parts = []
+        while True:
+            end = self._data.find(b"\n", self._pos)
+            if end >= 0:
+                parts.append(self._data[self._pos : end + 1])
+                self._pos = end + 1
+                break
+            parts.append(self._data[self._pos :])
+            if self._block_offset == self._next_block_offset:  # end of file
+                self._pos = len(self._data)
+                break
+            self._load_block(self._next_block_offset)
+        return b"".join(parts)
+
+    def close(self):
+        self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
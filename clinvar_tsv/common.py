@@ -2,6 +2,7 @@
 
 import datetime
 import enum
+import gzip
 from itertools import chain
 import json
 import typing
@@ -23,11 +24,47 @@ cattr.register_structure_hook(
 )
 
 
+def open_maybe_gzip(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    else:
+        return open(path, mode)
+
+
 def as_pg_list(vals: typing.Iterable[str]) -> str:
     """Convert to Postgres TSV list of strings."""
     return "{%s}" % (",".join(map(json.dumps, vals)))
 
 
+def from_pg_list(value: str) -> typing.List[str]:
+    """Convert Postgres TSV list of strings written by ``as_pg_list()`` back to list."""
+    return json.loads("[" + value[1:-1] + "]")
+
+
+#: Types of the columns of the merged tables (with or without details), others are strings, see
+#: ``export_parquet`` and ``serve``.
+COLUMN_TYPES = {
+    "release": "dictionary",
+    "chromosome": "dictionary",
+    "start": "int32",
+    "end": "int32",
+    "bin": "int32",
+    "clinvar_version": "dictionary",
+    "set_type": "dictionary",
+    "variation_type": "dictionary",
+    "symbols": "list",
+    "hgnc_ids": "list",
+    "summary_clinvar_review_status_label": "dictionary",
+    "summary_clinvar_pathogenicity_label": "dictionary",
+    "summary_clinvar_pathogenicity": "list",
+    "summary_clinvar_gold_stars": "int8",
+    "summary_paranoid_review_status_label": "dictionary",
+    "summary_paranoid_pathogenicity_label": "dictionary",
+    "summary_paranoid_pathogenicity": "list",
+    "summary_paranoid_gold_stars": "int8",
+    "details_offset": "int64",
+}
+
 #: Mapping from review status to gold stars.
 GOLD_STAR_MAP = {
     "no assertion provided": 0,
@@ -599,9 +636,9 @@ class Pathogenicity(enum.Enum):
 
     @classmethod
     def from_label(cls, label, variant_id):
-        for val in cls:
-            if label in _PATHOGENICITY_LABELS[val.value]:
-                return val
+        result = _PATHOGENICITY_BY_LABEL.get(label)
+        if result is not None:
+            return result
         # We sometimes see "likely pathogenic - $something"
         for val in cls:
             for pl in _PATHOGENICITY_LABELS[val.value]:
@@ -652,10 +689,23 @@ class ReviewStatus(enum.Enum):
 
     @classmethod
     def from_label(cls, label, variant_id):
-        for val in cls:
-            if label in _REVIEW_STATUS_LABELS[val.value]:
-                return val
+        result = _REVIEW_STATUS_BY_LABEL.get(label)
+        if result is not None:
+            return result
         raise ValueError(f"Invalid label: {label} for {variant_id}")  # pragma: no cover
 
     def label(self):
         return _REVIEW_STATUS_LABELS[self.value][0]
+
+
+def _by_label(enum_cls, labels):
+    """Return the first value of ``enum_cls`` with each of its ``labels``."""
+    result = {}
+    for val in enum_cls:
+        for label in labels[val.value]:
+            result.setdefault(label, val)
+    return result
+
+
+_PATHOGENICITY_BY_LABEL = _by_label(Pathogenicity, _PATHOGENICITY_LABELS)
+_REVIEW_STATUS_BY_LABEL = _by_label(ReviewStatus, _REVIEW_STATUS_LABELS)
@@ -0,0 +1,203 @@
+"""Handling of the ``details`` column with the ``ClinVarSet`` of each row as JSON.
+
+The JSON is written as ``json.dumps(...).replace(r'\\"', "'").replace('"', '\"\"\"')``, i.e.,
+double quotes within strings are replaced by single quotes and all remaining double quotes are
+tripled such that the column survives as a single TSV field.  Strings thus contain no double
+quotes and ``\"\"\"`` only occurs as the delimiter of keys and strings.
+
+``decode_details()`` decodes the full ``ClinVarSet``.  ``decode_details_partial()`` only
+extracts the fields that are needed for the summaries with regular expressions and falls back
+to the full decoding if the text does not look as expected.  ``canonical_details()`` rewrites
+the text as ``encode_details()`` would write the decoded ``ClinVarSet`` again, such that the
+original text can be passed through instead of decoding and encoding it.
+"""
+
+import datetime
+import json
+import re
+import typing
+
+import attr
+import cattr
+
+from clinvar_tsv.common import ClinVarSet, DateTimeEncoder
+from clinvar_tsv.exceptions import ClinvarTsvException
+
+#: Allowed values of the ``details_decoding`` argument.
+DETAILS_DECODING_CHOICES = ("full", "partial")
+
+
+def decode_details(details: str) -> ClinVarSet:
+    """Decode ``ClinVarSet`` from ``details`` column value."""
+    return cattr.structure(json.loads(details.replace('"""', '"')), ClinVarSet)
+
+
+def encode_details(clinvar_sets: typing.Iterable[ClinVarSet]) -> str:
+    """Encode list of ``clinvar_sets`` for the ``details`` column."""
+    return (
+        json.dumps([cattr.unstructure(entry) for entry in clinvar_sets], cls=DateTimeEncoder)
+        .replace(r"\"", "'")
+        .replace('"', '"""')
+    )
+
+
+def _model_fields(cls) -> typing.Dict[str, typing.Set[typing.Any]]:
+    """Return types of the fields of ``cls`` and all nested attrs classes by field name."""
+    result: typing.Dict[str, typing.Set[typing.Any]] = {}
+    todo, seen = [cls], {cls}
+    while todo:
+        for field in attr.fields(todo.pop()):
+            result.setdefault(field.name, set()).add(field.type)
+            for arg in (field.type,) + typing.get_args(field.type):
+                if attr.has(arg) and arg not in seen:
+                    todo.append(arg)
+                    seen.add(arg)
+    return result
+
+
+_FIELD_TYPES = _model_fields(ClinVarSet)
+
+#: Fields of type ``datetime.date`` which are written as ``datetime.datetime`` by the parser.
+_DATE_FIELDS = frozenset(
+    name
+    for name, types in _FIELD_TYPES.items()
+    if types & {datetime.date, typing.Optional[datetime.date]}
+)
+
+#: Fields of type ``str`` where ``null`` is structured as ``"None"``.
+_STR_FIELDS = frozenset(name for name, types in _FIELD_TYPES.items() if types == {str})
+
+#: Matches values that may need rewriting, starting after the key; the key is looked up
+#: backwards from the match as a leading ``"""`` would make the search slow.
+_CANONICAL_RE = re.compile(r'""": (?:null|("""\d{4}-\d{2}-\d{2})T[^"]*""")')
+
+
+def canonical_details(details: str) -> str:
+    """Return ``details`` as written by ``encode_details([decode_details(details)])[1:-1]``."""
+    parts, pos = [], 0
+    for match in _CANONICAL_RE.finditer(details):
+        start = match.start()
+        name = details[details.rfind('"""', 0, start) + 3 : start]
+        date = match.group(1)
+        if date is None and name in _STR_FIELDS:
+            parts += [details[pos:start], '""": """None"""']
+        elif date is not None and name in _DATE_FIELDS:
+            parts += [details[pos:start], '""": ', date, '"""']
+        else:
+            continue
+        pos = match.end()
+    if not parts:
+        return details
+    parts.append(details[pos:])
+    return "".join(parts)
+
+
+def join_details(details: typing.Iterable[str]) -> str:
+    """Join ``details`` values of several rows into one as ``encode_details()`` would."""
+    return "[" + ", ".join(map(canonical_details, details)) + "]"
+
+
+@attr.s(frozen=True, auto_attribs=True)
+class PartialClinVarAssertion:
+    """The fields of a ``ClinVarAssertion`` that are used for the summaries."""
+
+    #: Review status
+    review_status: str
+    #: Pathogenicity
+    pathogenicity: str
+
+
+@attr.s(frozen=True, auto_attribs=True)
+class PartialGenotypeSet:
+    """The fields of a ``GenotypeSet`` that are used for the merged record."""
+
+    set_type: str
+
+
+@attr.s(frozen=True, auto_attribs=True)
+class PartialReferenceClinVarAssertion:
+    """The fields of a ``ReferenceClinVarAssertion`` that are used for the merged record."""
+
+    genotype_sets: typing.Tuple[PartialGenotypeSet, ...]
+
+
+@attr.s(frozen=True, auto_attribs=True)
+class PartialClinVarSet:
+    """The fields of a ``ClinVarSet`` that are used for the merged record.
+
+    Can be used in place of ``ClinVarSet`` by ``summarize()`` and ``merge_and_write()``.
+    """
+
+    #: Numeric id_no for the ClinVarSet.
+    id_no: int
+    #: The ReferenceClinVarAssertion, if any.
+    ref_cv_assertion: typing.Optional[PartialReferenceClinVarAssertion]
+    #: The ClinVarAssertion objects, if any.
+    cv_assertions: typing.Tuple[PartialClinVarAssertion, ...]
+
+
+_ID_NO_RE = re.compile(r'\{"""id_no""": (\d+), ')
+_REF_CV_ASSERTION_KEY = '"""ref_cv_assertion""": '
+_CV_ASSERTIONS_KEY = '"""cv_assertions""": ['
+#: Matches a ``GenotypeSet``, the only object with ``measure_sets``.
+_GENOTYPE_SET_RE = re.compile(
+    r'\{"""set_type""": """([^"]*)""", """accession""": (?:"""[^"]*"""|null), """measure_sets""": '
+)
+_GENOTYPE_SET_KEY = '"""measure_sets""": '
+#: Matches the last two fields of a ``ClinVarAssertion``.
+_CV_ASSERTION_RE = re.compile(
+    r'"""review_status""": """([^"]*)""", """pathogenicity""": """([^"]*)"""\}'
+)
+_CV_ASSERTION_KEY = '"""clinvar_accession""": '
+
+
+def _decode_partial(details: str) -> typing.Optional[PartialClinVarSet]:
+    match = _ID_NO_RE.match(details)
+    ref_start = details.find(_REF_CV_ASSERTION_KEY)
+    cv_start = details.find(_CV_ASSERTIONS_KEY)
+    if not match or ref_start < 0 or cv_start < ref_start:
+        return None
+
+    ref_cv_assertion = None
+    ref_text = details[ref_start + len(_REF_CV_ASSERTION_KEY) : cv_start]
+    if not ref_text.startswith("null"):
+        set_types = _GENOTYPE_SET_RE.findall(ref_text)
+        if len(set_types) != ref_text.count(_GENOTYPE_SET_KEY):
+            return None
+        ref_cv_assertion = PartialReferenceClinVarAssertion(
+            genotype_sets=tuple(map(PartialGenotypeSet, set_types))
+        )
+
+    cv_text = details[cv_start:]
+    assertions = _CV_ASSERTION_RE.findall(cv_text)
+    if len(assertions) != cv_text.count(_CV_ASSERTION_KEY):
+        return None
+    return PartialClinVarSet(
+        id_no=int(match.group(1)),
+        ref_cv_assertion=ref_cv_assertion,
+        cv_assertions=tuple(PartialClinVarAssertion(*assertion) for assertion in assertions),
+    )
+
+
+def decode_details_partial(
+    details: str,
+) -> typing.Union[PartialClinVarSet, ClinVarSet]:
+    """Decode the fields of ``PartialClinVarSet`` from ``details`` column value.
+
+    Falls back to ``decode_details()`` if the value is not as expected, e.g., when a review
+    status is ``null``.
+    """
+    result = _decode_partial(details)
+    if result is None:
+        result = decode_details(details)
+    return result
+
+
+def get_decoder(details_decoding: str) -> typing.Callable[[str], typing.Any]:
+    """Return decoding function for the ``details_decoding`` mode."""
+    if details_decoding == "full":
+        return decode_details
+    elif details_decoding == "partial":
+        return decode_details_partial
+    else:
+        raise ClinvarTsvException("Invalid details decoding: %s" % details_decoding)
@@ -0,0 +1,118 @@
+"""Store of the ``details`` of the merged records, keyed by VCV.
+
+With a details store, ``merge_tsvs()`` writes a summary table without the bulky ``details``
+column.  The details are written to a BGZF file with one ``vcv`` and ``details`` line per
+record instead, and the summary table gets the virtual offset of that line in the
+``details_offset`` column.  An index file next to the store (``<path>.idx``) lists the
+``vcv`` and ``offset`` of each line, so the details of a VCV can be looked up without the
+summary table.  Reading the details of a record only decompresses the blocks of its line.
+"""
+
+import collections
+import shutil
+import typing
+
+from clinvar_tsv.bgzf import BgzfReader, BgzfWriter
+
+#: Header of the details store.
+HEADER_STORE = ("vcv", "details")
+
+#: Header of the index of the details store.
+HEADER_INDEX = ("vcv", "offset")
+
+#: Suffix of the index path.
+INDEX_SUFFIX = ".idx"
+
+#: Size of the chunks copied from files to the store.
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class DetailsStoreWriter:
+    """Write details store to ``path`` and its index to ``path + INDEX_SUFFIX``."""
+
+    def __init__(self, path: str, threads: int = 1):
+        #: Path to the store.
+        self.path = path
+        self._store = BgzfWriter.open(path, threads=threads)
+        self._index = open(path + INDEX_SUFFIX, "wt")
+        self._store.write("\t".join(HEADER_STORE) + "\n")
+        self._index.write("\t".join(HEADER_INDEX) + "\n")
+
+    def _start(self, vcv: str) -> int:
+        offset = self._store.tell()
+        self._index.write("%s\t%d\n" % (vcv, offset))
+        self._store.write(vcv + "\t")
+        return offset
+
+    def write(self, vcv: str, details: str) -> int:
+        """Write ``details`` of a record of ``vcv``, return the virtual offset of the line."""
+        offset = self._start(vcv)
+        self._store.write(details + "\n")
+        return offset
+
+    def write_file(self, vcv: str, prefix: str, inputf: typing.TextIO, suffix: str) -> int:
+        """Write details of ``vcv`` that are ``prefix``, the rest of ``inputf``, and ``suffix``."""
+        offset = self._start(vcv)
+        self._store.write(prefix)
+        shutil.copyfileobj(inputf, self._store, COPY_BUFFER_SIZE)
+        self._store.write(suffix + "\n")
+        return offset
+
+    def close(self):
+        self._store.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DetailsStore:
+    """Random access to the details store at ``path``.
+
+    ``read()`` returns the line at a virtual offset from the summary table.  ``get()`` looks up
+    the details of all records of a VCV by the index which is loaded on first use.
+    """
+
+    def __init__(self, path: str):
+        #: Path to the store.
+        self.path = path
+        self._reader = BgzfReader.open(path)
+        self._index: typing.Optional[typing.Dict[str, typing.List[int]]] = None
+
+    @property
+    def index(self) -> typing.Dict[str, typing.List[int]]:
+        """Virtual offsets of the records of each VCV."""
+        if self._index is None:
+            index = collections.defaultdict(list)
+            with open(self.path + INDEX_SUFFIX, "rt") as inputf:
+                inputf.readline()
+                for line in inputf:
+                    vcv, offset = line.rstrip("\n").split("\t")
+                    index[vcv].append(int(offset))
+            self._index = dict(index)
+        return self._index
+
+    def read(self, offset: int) -> typing.Tuple[str, str]:
+        """Return VCV and details of the record at the virtual ``offset``."""
+        self._reader.seek(offset)
+        vcv, details = self._reader.readline().decode("utf-8").rstrip("\n").split("\t", 1)
+        return vcv, details
+
+    def get(self, vcv: str) -> typing.List[str]:
+        """Return details of the records of ``vcv``, empty if there are none."""
+        return [self.read(offset)[1] for offset in self.index.get(vcv, ())]
+
+    def __contains__(self, vcv: str) -> bool:
+        return vcv in self.index
+
+    def close(self):
+        self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,138 @@
+"""Export of the merged ClinVar TSV files to a Parquet dataset.
+
+The dataset is partitioned by release (genome build) and chromosome in the Hive layout, e.g.,
+``release=GRCh37/chromosome=1/part-0.parquet``, such that readers can prune partitions.  The
+columns get proper types: coordinates and gold stars are integers, the PostgreSQL array columns
+written with ``as_pg_list()`` are lists of strings, and columns with few distinct values are
+dictionary encoded.  Row group statistics then allow for predicate pushdown of filters such as
+``summary_clinvar_gold_stars >= 2``.
+
+Requires ``pyarrow`` which is imported on first use only.
+"""
+
+import typing
+
+from logzero import logger
+
+from clinvar_tsv.common import COLUMN_TYPES, from_pg_list, open_maybe_gzip
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.memprofile import MemoryProfiler
+from clinvar_tsv.tsv import TsvReader
+
+#: Columns to partition by.
+PARTITION_COLUMNS = ("release", "chromosome")
+
+#: Default number of rows converted at a time.
+DEFAULT_BATCH_ROWS = 100_000
+
+#: Default largest number of rows in one row group.
+DEFAULT_ROW_GROUP_ROWS = 100_000
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+    except ImportError as e:  # pragma: no cover
+        raise ClinvarTsvException("Exporting to Parquet requires pyarrow: %s" % e)
+    return pyarrow, pyarrow.dataset
+
+
+def arrow_type(pa, column: str):
+    """Return ``pyarrow`` type of ``column``."""
+    kind = COLUMN_TYPES.get(column, "string")
+    if kind == "dictionary":
+        return pa.dictionary(pa.int32(), pa.string())
+    elif kind == "list":
+        return pa.list_(pa.string())
+    else:
+        return getattr(pa, kind)()
+
+
+def _convert(column: str, values: typing.List[str]) -> typing.List[typing.Any]:
+    kind = COLUMN_TYPES.get(column, "string")
+    if kind == "list":
+        return [from_pg_list(value) if value else None for value in values]
+    elif kind.startswith("int"):
+        return [int(value) if value else None for value in values]
+    else:
+        return values
+
+
+def _record_batches(pa, schema, readers, batch_rows: int):
+    """Yield ``RecordBatch`` objects with ``batch_rows`` rows of the ``readers``."""
+    columns = schema.names
+    for reader in readers:
+        indices = [reader.index(column) for column in columns]
+        batch: typing.List[typing.List[str]] = []
+        for row in reader:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                yield _to_record_batch(pa, schema, indices, batch)
+                batch = []
+        if batch:
+            yield _to_record_batch(pa, schema, indices, batch)
+
+
+def _to_record_batch(pa, schema, indices, rows):
+    arrays = []
+    for field, idx in zip(schema, indices):
+        values = _convert(field.name, [row[idx] for row in rows])
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_parquet(
+    input_paths: typing.Sequence[str],
+    output_dir: str,
+    with_details: bool = True,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+    row_group_rows: int = DEFAULT_ROW_GROUP_ROWS,
+    mem_profiler: typing.Optional[MemoryProfiler] = None,
+) -> typing.Dict[str, int]:
+    """Write merged TSV files at ``input_paths`` as Parquet dataset to ``output_dir``.
+
+    The inputs must have the same header, either ``HEADER_OUT`` or ``HEADER_SUMMARY`` from
+    ``merge_tsvs``.  The ``details`` column is left out unless ``with_details``.  The rows of
+    each batch are registered with ``mem_profiler``, if any.  Returns the number of rows written.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    pa, ds = _import_pyarrow()
+    readers, header = [], None
+    try:
+        for path in input_paths:
+            reader = TsvReader(open_maybe_gzip(path, "rt"))
+            readers.append(reader)
+            if header is not None and reader.header != header:
+                raise ClinvarTsvException("Header of %s differs from %s" % (path, input_paths[0]))
+            header = reader.header
+        columns = [column for column in header if with_details or column != "details"]
+        schema = pa.schema([(column, arrow_type(pa, column)) for column in columns])
+
+        rows = 0
+
+        def counted(batches):
+            nonlocal rows
+            for batch in batches:
+                rows += batch.num_rows
+                mem_profiler.tick(batch.num_rows)
+                yield batch
+
+        logger.info("Writing Parquet dataset to %s", output_dir)
+        ds.write_dataset(
+            counted(_record_batches(pa, schema, readers, batch_rows)),
+            output_dir,
+            schema=schema,
+            format="parquet",
+            partitioning=ds.partitioning(
+                pa.schema([schema.field(column) for column in PARTITION_COLUMNS]), flavor="hive"
+            ),
+            existing_data_behavior="delete_matching",
+            max_rows_per_group=row_group_rows,
+            min_rows_per_group=min(row_group_rows, batch_rows),
+        )
+    finally:
+        for reader in readers:
+            reader.infile.close()
+    logger.info("Wrote %d rows", rows)
+    return {"rows": rows}
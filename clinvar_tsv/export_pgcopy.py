@@ -0,0 +1,210 @@
+"""Export of the merged ClinVar TSV files as PostgreSQL binary ``COPY`` files.
+
+Binary ``COPY`` spares the server the parsing of the text format which is slow for the large
+``details`` column.  The columns get native types: coordinates and gold stars are integers,
+the PostgreSQL array columns written with ``as_pg_list()`` are ``text[]``, and the details are
+``jsonb``.  ``create_table_sql()`` returns a matching ``CREATE TABLE`` statement, the file is
+then loaded with ``COPY <table> FROM '<path>' WITH (FORMAT binary)``.
+
+``read_pgcopy()`` decodes such a file again, e.g., for testing without a database server.
+"""
+
+import json
+import struct
+import typing
+
+from logzero import logger
+
+from clinvar_tsv.common import from_pg_list, open_maybe_gzip
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.memprofile import MemoryProfiler
+from clinvar_tsv.tsv import TsvReader
+
+#: Signature at the start of each binary ``COPY`` file.
+PGCOPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+#: Header of the binary ``COPY`` file: signature, flags, and length of header extension.
+PGCOPY_HEADER = PGCOPY_SIGNATURE + struct.pack("!ii", 0, 0)
+
+#: Trailer of the binary ``COPY`` file, a field count of -1.
+PGCOPY_TRAILER = struct.pack("!h", -1)
+
+#: OID of the PostgreSQL ``text`` type, used in arrays.
+TEXT_OID = 25
+
+#: Version of the binary ``jsonb`` format.
+JSONB_VERSION = 1
+
+#: PostgreSQL types of the columns of the merged tables, others are ``text``.
+PG_COLUMN_TYPES = {
+    "start": "integer",
+    "end": "integer",
+    "bin": "integer",
+    "symbols": "text[]",
+    "hgnc_ids": "text[]",
+    "summary_clinvar_pathogenicity": "text[]",
+    "summary_clinvar_gold_stars": "integer",
+    "summary_paranoid_pathogenicity": "text[]",
+    "summary_paranoid_gold_stars": "integer",
+    "details": "jsonb",
+    "details_offset": "bigint",
+}
+
+#: Number of rows to write out at a time.
+WRITE_BATCH = 1024
+
+_NULL = struct.pack("!i", -1)
+_INT = struct.Struct("!ii")
+_BIGINT = struct.Struct("!iq")
+
+
+def _encode_text(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return struct.pack("!i", len(data)) + data
+
+
+def _encode_integer(value: str) -> bytes:
+    return _INT.pack(4, int(value)) if value else _NULL
+
+
+def _encode_bigint(value: str) -> bytes:
+    return _BIGINT.pack(8, int(value)) if value else _NULL
+
+
+def _encode_text_array(value: str) -> bytes:
+    if not value:
+        return _NULL
+    values = [item.encode("utf-8") for item in from_pg_list(value)]
+    if values:
+        parts = [struct.pack("!iiiii", 1, 0, TEXT_OID, len(values), 1)]
+        for item in values:
+            parts += [struct.pack("!i", len(item)), item]
+    else:
+        parts = [struct.pack("!iii", 0, 0, TEXT_OID)]
+    data = b"".join(parts)
+    return struct.pack("!i", len(data)) + data
+
+
+def _encode_jsonb(value: str) -> bytes:
+    if not value:
+        return _NULL
+    data = value.replace('"""', '"').encode("utf-8")
+    return struct.pack("!iB", len(data) + 1, JSONB_VERSION) + data
+
+
+_ENCODERS = {
+    "text": _encode_text,
+    "integer": _encode_integer,
+    "bigint": _encode_bigint,
+    "text[]": _encode_text_array,
+    "jsonb": _encode_jsonb,
+}
+
+
+def column_type(column: str) -> str:
+    """Return PostgreSQL type of ``column``."""
+    return PG_COLUMN_TYPES.get(column, "text")
+
+
+def create_table_sql(table: str, columns: typing.Iterable[str]) -> str:
+    """Return ``CREATE TABLE`` statement for loading a file with ``columns``."""
+    return "CREATE TABLE %s (\n%s\n);\n" % (
+        table,
+        ",\n".join('    "%s" %s' % (column, column_type(column)) for column in columns),
+    )
+
+
+def encode_row(encoders, row: typing.List[str]) -> bytes:
+    """Encode TSV ``row`` as tuple of binary ``COPY`` file."""
+    return struct.pack("!h", len(encoders)) + b"".join(
+        encode(value) for encode, value in zip(encoders, row)
+    )
+
+
+def export_pgcopy(
+    input_path: str,
+    output_path: str,
+    sql_path: typing.Optional[str] = None,
+    table: str = "clinvar",
+    mem_profiler: typing.Optional[MemoryProfiler] = None,
+) -> typing.Dict[str, int]:
+    """Write the merged TSV file at ``input_path`` as binary ``COPY`` file to ``output_path``.
+
+    If ``sql_path`` is given, the ``CREATE TABLE`` statement for ``table`` is written there.
+    Written rows are registered with ``mem_profiler``, if any.  Returns the number of rows
+    written.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    rows = 0
+    with open_maybe_gzip(input_path, "rt") as inputf:
+        reader = TsvReader(inputf)
+        if sql_path:
+            with open(sql_path, "wt") as sqlf:
+                sqlf.write(create_table_sql(table, reader.header))
+        encoders = [_ENCODERS[column_type(column)] for column in reader.header]
+        with open_maybe_gzip(output_path, "wb") as outputf:
+            outputf.write(PGCOPY_HEADER)
+            batch = []
+            for row in reader:
+                batch.append(encode_row(encoders, row))
+                if len(batch) >= WRITE_BATCH:
+                    outputf.write(b"".join(batch))
+                    rows += len(batch)
+                    mem_profiler.tick(len(batch))
+                    batch = []
+            outputf.write(b"".join(batch) + PGCOPY_TRAILER)
+            rows += len(batch)
+            mem_profiler.tick(len(batch))
+    logger.info("Wrote %d rows to %s", rows, output_path)
+    return {"rows": rows}
+
+
+def _decode_text_array(data: bytes) -> typing.List[str]:
+    ndim, _, oid = struct.unpack_from("!iii", data)
+    if oid != TEXT_OID or ndim > 1:
+        raise ClinvarTsvException("Unsupported array with %d dimensions of type %d" % (ndim, oid))
+    if ndim == 0:
+        return []
+    size, _ = struct.unpack_from("!ii", data, 12)
+    result, pos = [], 20
+    for _ in range(size):
+        (length,) = struct.unpack_from("!i", data, pos)
+        result.append(data[pos + 4 : pos + 4 + length].decode("utf-8"))
+        pos += 4 + length
+    return result
+
+
+def _decode_jsonb(data: bytes) -> typing.Any:
+    if data[0] != JSONB_VERSION:
+        raise ClinvarTsvException("Unsupported jsonb version %d" % data[0])
+    return json.loads(data[1:].decode("utf-8"))
+
+
+_DECODERS = {
+    "text": lambda data: data.decode("utf-8"),
+    "integer": lambda data: struct.unpack("!i", data)[0],
+    "bigint": lambda data: struct.unpack("!q", data)[0],
+    "text[]": _decode_text_array,
+    "jsonb": _decode_jsonb,
+}
+
+
+def read_pgcopy(inputf: typing.BinaryIO, types: typing.Sequence[str]) -> typing.Iterator[tuple]:
+    """Yield the tuples of the binary ``COPY`` file ``inputf`` with columns of ``types``."""
+    header = inputf.read(len(PGCOPY_HEADER))
+    if not header.startswith(PGCOPY_SIGNATURE):
+        raise ClinvarTsvException("Not a binary COPY file")
+    (extension_length,) = struct.unpack("!i", header[-4:])
+    inputf.read(extension_length)
+    decoders = [_DECODERS[type_] for type_ in types]
+    while True:
+        (count,) = struct.unpack("!h", inputf.read(2))
+        if count == -1:
+            break
+        if count != len(decoders):
+            raise ClinvarTsvException("Expected %d fields but got %d" % (len(decoders), count))
+        values = []
+        for decode in decoders:
+            (length,) = struct.unpack("!i", inputf.read(4))
+            values.append(None if length == -1 else decode(inputf.read(length)))
+        yield tuple(values)
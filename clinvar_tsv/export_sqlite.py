@@ -0,0 +1,205 @@
+"""Export of the merged ClinVar TSV files to a single-file SQLite database.
+
+All records go to the table ``clinvar`` with an ``id`` primary key and the columns of the
+merged tables.  Coordinates and gold stars are integers, the PostgreSQL array columns written
+with ``as_pg_list()`` and the details are stored as JSON text, so they can be queried with the
+SQLite JSON functions.  For lookups by gene, the elements of ``symbols`` and ``hgnc_ids`` are
+also written to the side tables ``clinvar_symbols`` and ``clinvar_hgnc_ids`` that refer to
+``clinvar.id``.  There are indexes on ``(release, chromosome, bin, start)``, ``vcv``,
+``clinvar_symbols.symbol``, and ``clinvar_hgnc_ids.hgnc_id``, e.g.::
+
+    SELECT clinvar.* FROM clinvar JOIN clinvar_symbols ON clinvar_symbols.id = clinvar.id
+    WHERE clinvar_symbols.symbol = 'BRCA1'
+
+The rows are inserted in batches of one transaction each, and the indexes are created after
+loading.
+"""
+
+import json
+import os
+import sqlite3
+import typing
+
+from logzero import logger
+
+from clinvar_tsv.common import from_pg_list, open_maybe_gzip
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.memprofile import MemoryProfiler
+from clinvar_tsv.tsv import TsvReader
+
+#: Name of the main table.
+TABLE = "clinvar"
+
+#: Side tables with the elements of list columns, by list column.
+LIST_TABLES = {
+    "symbols": ("clinvar_symbols", "symbol"),
+    "hgnc_ids": ("clinvar_hgnc_ids", "hgnc_id"),
+}
+
+#: SQLite types of the columns of the merged tables, others are ``TEXT``.
+SQLITE_COLUMN_TYPES = {
+    "start": "INTEGER",
+    "end": "INTEGER",
+    "bin": "INTEGER",
+    "summary_clinvar_gold_stars": "INTEGER",
+    "summary_paranoid_gold_stars": "INTEGER",
+    "details_offset": "INTEGER",
+}
+
+#: Columns stored as JSON arrays.
+LIST_COLUMNS = (
+    "symbols",
+    "hgnc_ids",
+    "summary_clinvar_pathogenicity",
+    "summary_paranoid_pathogenicity",
+)
+
+#: Indexes to create after loading, by name.
+INDEXES = {
+    "clinvar_position": (TABLE, ("release", "chromosome", "bin", "start")),
+    "clinvar_vcv": (TABLE, ("vcv",)),
+    "clinvar_symbols_symbol": ("clinvar_symbols", ("symbol",)),
+    "clinvar_hgnc_ids_hgnc_id": ("clinvar_hgnc_ids", ("hgnc_id",)),
+}
+
+#: Default number of rows inserted per transaction.
+DEFAULT_BATCH_ROWS = 50_000
+
+
+def _quote(name: str) -> str:
+    return '"%s"' % name
+
+
+def create_tables_sql(header: typing.Sequence[str]) -> typing.List[str]:
+    """Return ``CREATE TABLE`` statements for records with ``header``."""
+    columns = ["id INTEGER PRIMARY KEY"] + [
+        "%s %s" % (_quote(column), SQLITE_COLUMN_TYPES.get(column, "TEXT")) for column in header
+    ]
+    result = ["CREATE TABLE %s (\n    %s\n)" % (TABLE, ",\n    ".join(columns))]
+    for table, column in LIST_TABLES.values():
+        result.append(
+            "CREATE TABLE %s (id INTEGER NOT NULL REFERENCES %s (id), %s TEXT NOT NULL)"
+            % (table, TABLE, column)
+        )
+    return result
+
+
+def create_indexes_sql() -> typing.List[str]:
+    """Return ``CREATE INDEX`` statements."""
+    return [
+        "CREATE INDEX %s ON %s (%s)" % (name, table, ", ".join(map(_quote, columns)))
+        for name, (table, columns) in INDEXES.items()
+    ]
+
+
+def _converters(header: typing.Sequence[str]) -> typing.List[typing.Callable[[str], typing.Any]]:
+    def as_int(value):
+        return int(value) if value else None
+
+    def as_list(value):
+        return json.dumps(from_pg_list(value)) if value else None
+
+    def as_details(value):
+        return value.replace('"""', '"') if value else None
+
+    def as_text(value):
+        return value
+
+    result = []
+    for column in header:
+        if column in LIST_COLUMNS:
+            result.append(as_list)
+        elif column == "details":
+            result.append(as_details)
+        elif SQLITE_COLUMN_TYPES.get(column) == "INTEGER":
+            result.append(as_int)
+        else:
+            result.append(as_text)
+    return result
+
+
+class _Loader:
+    """Batched insertion of rows into the tables."""
+
+    def __init__(self, conn: sqlite3.Connection, header: typing.Sequence[str], batch_rows: int):
+        self.conn = conn
+        self.batch_rows = batch_rows
+        self.converters = _converters(header)
+        self.list_indices = {column: header.index(column) for column in LIST_TABLES}
+        self.insert_sql = "INSERT INTO %s VALUES (%s)" % (TABLE, ", ".join("?" * (len(header) + 1)))
+        self.rows = 0
+        self._batch: typing.List[tuple] = []
+        self._elements: typing.Dict[str, typing.List[typing.Tuple[int, str]]] = {
+            column: [] for column in LIST_TABLES
+        }
+
+    def add(self, row: typing.List[str]):
+        self.rows += 1
+        self._batch.append(
+            (self.rows,) + tuple(convert(value) for convert, value in zip(self.converters, row))
+        )
+        for column, idx in self.list_indices.items():
+            if row[idx]:
+                self._elements[column] += [(self.rows, value) for value in from_pg_list(row[idx])]
+        if len(self._batch) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        with self.conn:
+            self.conn.executemany(self.insert_sql, self._batch)
+            for column, (table, _) in LIST_TABLES.items():
+                self.conn.executemany(
+                    "INSERT INTO %s VALUES (?, ?)" % table, self._elements[column]
+                )
+        self._batch = []
+        self._elements = {column: [] for column in LIST_TABLES}
+
+
+def export_sqlite(
+    input_paths: typing.Sequence[str],
+    output_path: str,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+    mem_profiler: typing.Optional[MemoryProfiler] = None,
+) -> typing.Dict[str, int]:
+    """Write merged TSV files at ``input_paths`` to SQLite database at ``output_path``.
+
+    The inputs must have the same header, either ``HEADER_OUT`` or ``HEADER_SUMMARY`` from
+    ``merge_tsvs``.  An existing database at ``output_path`` is replaced.  Each row is
+    registered with ``mem_profiler``, if any.  Returns the number of rows written.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    conn = sqlite3.connect(output_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        loader, header = None, None
+        for path in input_paths:
+            with open_maybe_gzip(path, "rt") as inputf:
+                reader = TsvReader(inputf)
+                if header is None:
+                    header = reader.header
+                    for statement in create_tables_sql(header):
+                        conn.execute(statement)
+                    loader = _Loader(conn, header, batch_rows)
+                elif reader.header != header:
+                    raise ClinvarTsvException(
+                        "Header of %s differs from %s" % (path, input_paths[0])
+                    )
+                logger.info("Loading %s into %s", path, output_path)
+                for row in reader:
+                    loader.add(row)
+                    mem_profiler.tick()
+        if loader is None:
+            raise ClinvarTsvException("No input files given")
+        loader.flush()
+        logger.info("Creating indexes")
+        with conn:
+            for statement in create_indexes_sql():
+                conn.execute(statement)
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    logger.info("Wrote %d rows to %s", loader.rows, output_path)
+    return {"rows": loader.rows}
@@ -0,0 +1,210 @@
+"""Export of the merged small variant table as bgzip-compressed and CSI-indexed VCF file.
+
+The VCF file can be used by annotation tools with their indexed lookups.  Each record of the
+merged table becomes one VCF record with the VCV as ID.  The summaries, VCV, and genes go to
+the INFO column, the genome build and ClinVar version to the header.  Spaces in INFO values
+are replaced by underscores as in the VCF files of ClinVar, and the characters with special
+meaning in INFO are percent-encoded.  Records without VCF-style reference and alternative
+alleles are skipped.
+
+The index is written to ``<path>.csi`` while writing the records, so no ``tabix`` run is
+needed.  The input must be sorted as written by ``merge_tsvs`` (records of each chromosome
+contiguous and sorted by position).
+"""
+
+import re
+import typing
+
+from logzero import logger
+
+from clinvar_tsv import __version__
+from clinvar_tsv.bgzf import BgzfWriter
+from clinvar_tsv.common import from_pg_list, open_maybe_gzip
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.index import BinningIndex
+from clinvar_tsv.memprofile import MemoryProfiler
+from clinvar_tsv.tsv import TsvReader
+
+#: Suffix of the index path.
+INDEX_SUFFIX = ".csi"
+
+#: INFO fields: ID, number, type, column of the merged table, and description.
+INFO_FIELDS = (
+    ("VCV", "1", "String", "vcv", "ClinVar variation archive accession"),
+    ("GENE", ".", "String", "symbols", "Gene symbols"),
+    ("HGNC", ".", "String", "hgnc_ids", "HGNC IDs of the genes"),
+    (
+        "CLNSIG",
+        ".",
+        "String",
+        "summary_clinvar_pathogenicity",
+        "Pathogenicity of the summary as computed by ClinVar",
+    ),
+    (
+        "CLNREVSTAT",
+        ".",
+        "String",
+        "summary_clinvar_review_status_label",
+        "Review status of the summary as computed by ClinVar",
+    ),
+    (
+        "GOLD_STARS",
+        "1",
+        "Integer",
+        "summary_clinvar_gold_stars",
+        "Gold stars of the summary as computed by ClinVar",
+    ),
+    (
+        "PARANOID_CLNSIG",
+        ".",
+        "String",
+        "summary_paranoid_pathogenicity",
+        "Pathogenicity of the summary of all assertions regardless of review status",
+    ),
+    (
+        "PARANOID_CLNREVSTAT",
+        ".",
+        "String",
+        "summary_paranoid_review_status_label",
+        "Review status of the summary of all assertions regardless of review status",
+    ),
+    (
+        "PARANOID_GOLD_STARS",
+        "1",
+        "Integer",
+        "summary_paranoid_gold_stars",
+        "Gold stars of the summary of all assertions regardless of review status",
+    ),
+)
+
+#: Columns with PostgreSQL arrays.
+_LIST_COLUMNS = (
+    "symbols",
+    "hgnc_ids",
+    "summary_clinvar_pathogenicity",
+    "summary_paranoid_pathogenicity",
+)
+
+#: Columns with comma-separated lists.
+_LABEL_COLUMNS = ("summary_clinvar_review_status_label", "summary_paranoid_review_status_label")
+
+#: Replacement of spaces and characters with special meaning in INFO values.
+_INFO_ESCAPES = str.maketrans({" ": "_", **{c: "%%%02X" % ord(c) for c in "%;=,\t\r\n"}})
+
+#: Valid VCF alleles.
+_ALLELE_RE = re.compile(r"^[ACGTN]+$", re.IGNORECASE)
+
+
+def encode_info(value: str) -> str:
+    """Return ``value`` with spaces replaced and special characters percent-encoded."""
+    return value.translate(_INFO_ESCAPES)
+
+
+def info_values(column: str, value: str) -> typing.List[str]:
+    """Return encoded INFO values for ``value`` of ``column`` of the merged table."""
+    if not value:
+        return []
+    elif column in _LIST_COLUMNS:
+        return [encode_info(item) for item in from_pg_list(value)]
+    elif column in _LABEL_COLUMNS:
+        return [encode_info(item) for item in value.split(", ")]
+    else:
+        return [encode_info(value)]
+
+
+def _scan(input_path: str) -> typing.Tuple[typing.List[str], typing.Set[str], str]:
+    """Return chromosomes in order, releases, and the first ClinVar version of the input."""
+    chromosomes, releases, clinvar_version = [], set(), "."
+    with open_maybe_gzip(input_path, "rt") as inputf:
+        reader = TsvReader(inputf)
+        idx_release, idx_chrom, idx_version = map(
+            reader.index, ("release", "chromosome", "clinvar_version")
+        )
+        for row in reader:
+            if not chromosomes:
+                clinvar_version = row[idx_version]
+            releases.add(row[idx_release])
+            if not chromosomes or chromosomes[-1] != row[idx_chrom]:
+                if row[idx_chrom] in chromosomes:
+                    raise ClinvarTsvException(
+                        "Records on chromosome %s are not contiguous in %s"
+                        % (row[idx_chrom], input_path)
+                    )
+                chromosomes.append(row[idx_chrom])
+    return chromosomes, releases, clinvar_version
+
+
+def vcf_header(chromosomes: typing.Sequence[str], release: str, clinvar_version: str) -> str:
+    """Return VCF header lines including the ``#CHROM`` line."""
+    lines = [
+        "##fileformat=VCFv4.2",
+        "##source=clinvar-tsv %s" % __version__,
+        "##reference=%s" % release,
+        "##clinvar_version=%s" % clinvar_version,
+    ]
+    lines += ["##contig=<ID=%s,assembly=%s>" % (chrom, release) for chrom in chromosomes]
+    lines += [
+        '##INFO=<ID=%s,Number=%s,Type=%s,Description="%s">' % (id_, number, type_, description)
+        for id_, number, type_, _, description in INFO_FIELDS
+    ]
+    lines.append("\t".join(("#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO")))
+    return "\n".join(lines) + "\n"
+
+
+def export_vcf(
+    input_path: str,
+    output_path: str,
+    index: bool = True,
+    mem_profiler: typing.Optional[MemoryProfiler] = None,
+) -> typing.Dict[str, int]:
+    """Write merged small variant table at ``input_path`` as VCF file to ``output_path``.
+
+    The CSI index is written to ``output_path + INDEX_SUFFIX`` unless ``index`` is ``False``.
+    Each row is registered with ``mem_profiler``, if any.  Returns the number of records
+    written and skipped.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    chromosomes, releases, clinvar_version = _scan(input_path)
+    if len(releases) > 1:
+        raise ClinvarTsvException(
+            "Expected one release in %s but found %s" % (input_path, ", ".join(sorted(releases)))
+        )
+    release = releases.pop() if releases else "."
+
+    binning = BinningIndex()
+    records, skipped = 0, 0
+    with open_maybe_gzip(input_path, "rt") as inputf, BgzfWriter.open(output_path) as writer:
+        reader = TsvReader(inputf)
+        idx_chrom, idx_start, idx_ref, idx_alt, idx_vcv = map(
+            reader.index, ("chromosome", "start", "reference", "alternative", "vcv")
+        )
+        info_columns = [(id_, column, reader.index(column)) for id_, _, _, column, _ in INFO_FIELDS]
+        writer.write(vcf_header(chromosomes, release, clinvar_version))
+        offset = writer.tell()
+        for row in reader:
+            mem_profiler.tick()
+            chrom, start, ref, alt = row[idx_chrom], row[idx_start], row[idx_ref], row[idx_alt]
+            if not _ALLELE_RE.match(ref) or not _ALLELE_RE.match(alt):
+                skipped += 1
+                continue
+            info = []
+            for id_, column, idx in info_columns:
+                values = info_values(column, row[idx])
+                if values:
+                    info.append("%s=%s" % (id_, ",".join(values)))
+            writer.write(
+                "\t".join((chrom, start, row[idx_vcv], ref, alt, ".", ".", ";".join(info) or "."))
+                + "\n"
+            )
+            records += 1
+            if index:
+                next_offset = writer.tell()
+                beg = int(start) - 1
+                binning.add(chrom, beg, beg + len(ref), offset, next_offset)
+                offset = next_offset
+    if index:
+        binning.write_csi(output_path + INDEX_SUFFIX)
+    if skipped:
+        logger.warning("Skipped %d records without VCF-style alleles", skipped)
+    logger.info("Wrote %d records to %s", records, output_path)
+    return {"records": records, "skipped": skipped}
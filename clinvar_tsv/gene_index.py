@@ -0,0 +1,181 @@
+"""Inverted index from gene symbols and HGNC IDs to the rows of a merged table.
+
+The ``symbols`` and ``hgnc_ids`` columns are PostgreSQL list literals, so finding the records
+of a gene otherwise means reading and parsing the whole table.  ``GeneIndexWriter`` sits
+between the writer of a merged table and the ``BgzfWriter`` of the output file, and records
+the offset of each row by gene symbol and HGNC ID while the table is written.
+``write_gene_index()`` then writes the offsets to the gene index file, by convention the path
+of the table plus ``GENE_INDEX_SUFFIX``.
+
+The gene index file has a fixed header, a JSON block with the genes and the range of their
+offsets, and the offsets as big-endian 64 bit integers in file order for each gene.
+``GeneIndex`` maps the file into memory and reads the rows of genes from the table.
+"""
+
+import struct
+import typing
+
+from logzero import logger
+
+from clinvar_tsv.bgzf import BgzfReader, BgzfWriter
+from clinvar_tsv.common import from_pg_list
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.mapped import open_mapped, write_header
+
+#: Magic bytes at the start of gene index files.
+MAGIC = b"CVGENIDX"
+
+#: Version of the file format.
+VERSION = 1
+
+#: Suffix of the gene index file next to the merged table.
+GENE_INDEX_SUFFIX = ".genes"
+
+#: Columns with the list of genes of a record.
+GENE_COLUMNS = ("symbols", "hgnc_ids")
+
+#: Size of an offset in bytes.
+_OFFSET_SIZE = 8
+
+
+class GeneIndexWriter:
+    """Text file writing to the ``BgzfWriter`` ``outputf`` and recording offsets by gene.
+
+    The first line written must be the header of the table.  Lines may be written in parts
+    and several at a time.  Of the rows, only the prefix up to the gene columns is kept until
+    the end of the row, so rows with large details streamed in parts are not held in memory.
+    The uncompressed offsets of the rows are recorded while writing and converted to virtual
+    offsets by ``offsets``, so blocks are still compressed in batches.
+    """
+
+    def __init__(self, outputf: BgzfWriter):
+        if not isinstance(outputf, BgzfWriter):
+            raise ClinvarTsvException("The gene index requires a bgzip-compressed output file")
+        #: The file to write to.
+        self.outputf = outputf
+        #: Uncompressed offsets of the rows by gene symbol and HGNC ID.
+        self.data_offsets: typing.Dict[str, typing.List[int]] = {}
+        self._columns: typing.Optional[typing.List[int]] = None
+        self._line_start: typing.Optional[int] = None
+        self._parts: typing.List[str] = []
+        self._tabs = 0
+
+    def write(self, data: str):
+        pos = 0
+        while pos < len(data):
+            end = data.find("\n", pos) + 1 or len(data)
+            if self._line_start is None:
+                self._line_start = self.outputf.data_offset()
+            piece = data[pos:end]
+            self.outputf.write(piece)
+            if self._columns is None:  # header
+                self._parts.append(piece)
+            elif self._tabs <= max(self._columns):  # gene columns not complete yet
+                self._parts.append(piece)
+                self._tabs += piece.count("\t")
+            if piece.endswith("\n"):
+                self._add("".join(self._parts), self._line_start)
+                self._parts, self._line_start, self._tabs = [], None, 0
+            pos = end
+
+    @property
+    def offsets(self) -> typing.Dict[str, typing.List[int]]:
+        """Virtual offsets of the rows by gene symbol and HGNC ID."""
+        virtual_offset = self.outputf.virtual_offset
+        return {
+            gene: [virtual_offset(offset) for offset in offsets]
+            for gene, offsets in self.data_offsets.items()
+        }
+
+    def _add(self, line: str, offset: int):
+        if self._columns is None:
+            header = line.rstrip("\n").split("\t")
+            missing = [column for column in GENE_COLUMNS if column not in header]
+            if missing:
+                raise ClinvarTsvException("Missing columns: %s" % ", ".join(missing))
+            self._columns = [header.index(column) for column in GENE_COLUMNS]
+            return
+        fields = line.rstrip("\n").split("\t", max(self._columns) + 1)
+        for column in self._columns:
+            if fields[column]:
+                for gene in from_pg_list(fields[column]):
+                    offsets = self.data_offsets.setdefault(gene, [])
+                    if not offsets or offsets[-1] != offset:
+                        offsets.append(offset)
+
+
+def write_gene_index(offsets: typing.Dict[str, typing.List[int]], path: str) -> int:
+    """Write gene index with the virtual ``offsets`` by gene to ``path``.
+
+    Returns the number of genes.
+    """
+    genes, first = [], 0
+    for gene in sorted(offsets):
+        genes.append((gene, first, len(offsets[gene])))
+        first += len(offsets[gene])
+    with open(path, "wb") as outputf:
+        write_header(outputf, MAGIC, VERSION, {"genes": genes})
+        for gene, _, count in genes:
+            outputf.write(struct.pack(">%dQ" % count, *offsets[gene]))
+    logger.info("Wrote gene index with %d genes and %d offsets to %s", len(genes), first, path)
+    return len(genes)
+
+
+class GeneIndex:
+    """Memory-mapped gene index at ``path``.
+
+    The rows are read from ``table_path``, by default ``path`` without ``GENE_INDEX_SUFFIX``.
+    """
+
+    def __init__(self, path: str, table_path: typing.Optional[str] = None):
+        #: Path to the gene index file.
+        self.path = path
+        if table_path is None:
+            if not path.endswith(GENE_INDEX_SUFFIX):
+                raise ClinvarTsvException("No table path given for gene index %s" % path)
+            table_path = path[: -len(GENE_INDEX_SUFFIX)]
+        #: Path to the indexed table.
+        self.table_path = table_path
+        self._reader: typing.Optional[BgzfReader] = None
+        self._columns: typing.List[str] = []
+        self._mm, meta, self._offset = open_mapped(path, MAGIC, VERSION, "a gene index")
+        self._genes = {gene: (first, count) for gene, first, count in meta["genes"]}
+
+    @property
+    def genes(self) -> typing.List[str]:
+        """Gene symbols and HGNC IDs in the index, sorted."""
+        return sorted(self._genes)
+
+    def __contains__(self, gene: str) -> bool:
+        return gene in self._genes
+
+    def offsets(self, gene: str) -> typing.List[int]:
+        """Return virtual offsets of the rows of the gene with symbol or HGNC ID ``gene``."""
+        first, count = self._genes.get(gene, (0, 0))
+        return list(
+            struct.unpack_from(">%dQ" % count, self._mm, self._offset + first * _OFFSET_SIZE)
+        )
+
+    def records(self, genes: typing.Iterable[str]) -> typing.List[typing.Dict[str, str]]:
+        """Return rows of any of ``genes`` in file order as ``dict`` objects, each row once."""
+        offsets = sorted({offset for gene in genes for offset in self.offsets(gene)})
+        if self._reader is None:
+            self._reader = BgzfReader.open(self.table_path)
+            self._columns = self._reader.readline().decode("utf-8").rstrip("\n").split("\t")
+        result = []
+        for offset in offsets:
+            self._reader.seek(offset)
+            row = self._reader.readline().decode("utf-8").rstrip("\n").split("\t")
+            result.append(dict(zip(self._columns, row)))
+        return result
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
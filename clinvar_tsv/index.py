@@ -0,0 +1,308 @@
+"""Binning indices of BGZF files in the CSI format of ``htslib``.
+
+Records are assigned to the smallest bin of a hierarchical binning scheme that contains them.
+With the defaults of ``tabix``, the smallest bins are 16kbp (``min_shift=14``) and there are
+5 levels below the root bin (``depth=5``), each level having 8 times as many bins as the one
+above.  For each bin, the index lists the chunks of virtual offsets of its records.  A query
+collects the chunks of all bins overlapping the region.  The virtual offset of the first
+record overlapping the smallest bin the query starts in (``loffset``) allows for skipping
+chunks that end before it.
+
+``BinningIndex`` is built by calling ``add()`` for each record while writing the BGZF file,
+e.g., with ``BgzfWriter.tell()`` before and after the record, and saved with ``write_csi()``.
+``BinningIndex.load()`` reads a CSI file or a TBI file as written by ``tabix`` and
+``chunks()`` returns the chunks to read for a region.
+"""
+
+import gzip
+import struct
+import typing
+
+from clinvar_tsv.bgzf import BgzfWriter
+from clinvar_tsv.exceptions import ClinvarTsvException
+
+#: Size of the smallest bins as bit shift, 16kbp as in ``tabix``.
+DEFAULT_MIN_SHIFT = 14
+
+#: Number of levels below the root bin as in ``tabix``.
+DEFAULT_DEPTH = 5
+
+#: Magic bytes of CSI files.
+CSI_MAGIC = b"CSI\x01"
+
+#: Magic bytes of TBI files.
+TBI_MAGIC = b"TBI\x01"
+
+#: Configuration of ``tabix`` for VCF files: format, sequence, begin, and end column, meta
+#: character, and number of lines to skip.
+TABIX_VCF = (2, 1, 2, 0, ord("#"), 0)
+
+#: Unset entry of the linear index.
+_UNSET = -1
+
+
+def bin_first(level: int) -> int:
+    """Return the first bin on ``level``, 0 being the root level."""
+    return ((1 << (3 * level)) - 1) // 7
+
+
+def bin_level(bin_: int) -> int:
+    """Return level of ``bin_``."""
+    level = 0
+    while bin_ >= bin_first(level + 1):
+        level += 1
+    return level
+
+
+def reg2bin(beg: int, end: int, min_shift: int = DEFAULT_MIN_SHIFT, depth: int = DEFAULT_DEPTH):
+    """Return smallest bin containing the 0-based half-open interval ``[beg, end)``."""
+    end -= 1
+    shift = min_shift
+    for level in range(depth, 0, -1):
+        if beg >> shift == end >> shift:
+            return bin_first(level) + (beg >> shift)
+        shift += 3
+    return 0
+
+
+def reg2bins(
+    beg: int, end: int, min_shift: int = DEFAULT_MIN_SHIFT, depth: int = DEFAULT_DEPTH
+) -> typing.List[int]:
+    """Return all bins overlapping the 0-based half-open interval ``[beg, end)``."""
+    end -= 1
+    result = []
+    shift = min_shift + 3 * depth
+    for level in range(depth + 1):
+        first = bin_first(level)
+        result += range(first + (beg >> shift), first + (end >> shift) + 1)
+        shift -= 3
+    return result
+
+
+class ReferenceIndex:
+    """Index of the records on one reference sequence."""
+
+    def __init__(self):
+        #: Chunks ``[begin, end]`` of virtual offsets by bin.
+        self.bins: typing.Dict[int, typing.List[typing.List[int]]] = {}
+        #: Virtual offset of the first record overlapping each bin, set on saving and loading.
+        self.loffsets: typing.Dict[int, int] = {}
+        #: Virtual offset of the first record overlapping each window of the smallest bins.
+        self.linear: typing.Dict[int, int] = {}
+        #: Virtual offsets of the first and after the last record, and the number of records.
+        self.off_beg = _UNSET
+        self.off_end = 0
+        self.n_records = 0
+
+    def add(self, bin_: int, beg: int, end: int, min_shift: int, off_beg: int, off_end: int):
+        chunks = self.bins.setdefault(bin_, [])
+        if chunks and chunks[-1][1] == off_beg:
+            chunks[-1][1] = off_end
+        else:
+            chunks.append([off_beg, off_end])
+        for window in range(beg >> min_shift, ((end - 1) >> min_shift) + 1):
+            self.linear.setdefault(window, off_beg)
+        if self.off_beg == _UNSET:
+            self.off_beg = off_beg
+        self.off_end = off_end
+        self.n_records += 1
+
+    def compute_loffsets(self, depth: int):
+        """Set ``loffsets`` from the linear index as ``htslib`` does."""
+        size = max(self.linear) + 1 if self.linear else 0
+        linear = [self.linear.get(window, _UNSET) for window in range(size)]
+        previous = max(self.off_beg, 0)
+        for window, offset in enumerate(linear):
+            if offset == _UNSET:
+                linear[window] = previous
+            previous = linear[window]
+        self.loffsets = {}
+        for bin_ in self.bins:
+            level = bin_level(bin_)
+            bottom = (bin_ - bin_first(level)) << (3 * (depth - level))
+            self.loffsets[bin_] = linear[bottom] if bottom < size else 0
+
+
+class BinningIndex:
+    """Binning index of the records of a BGZF file, by reference sequence name.
+
+    ``tabix_conf`` is the configuration of ``tabix`` stored with the names of the references
+    in the CSI file, e.g., ``TABIX_VCF``.
+    """
+
+    def __init__(
+        self,
+        min_shift: int = DEFAULT_MIN_SHIFT,
+        depth: int = DEFAULT_DEPTH,
+        tabix_conf: typing.Optional[typing.Tuple[int, ...]] = TABIX_VCF,
+    ):
+        #: Size of the smallest bins as bit shift.
+        self.min_shift = min_shift
+        #: Number of levels below the root bin.
+        self.depth = depth
+        #: Configuration of ``tabix``, if any.
+        self.tabix_conf = tabix_conf
+        #: Names of the reference sequences in order of their records.
+        self.names: typing.List[str] = []
+        #: Index of each reference sequence.
+        self.refs: typing.Dict[str, ReferenceIndex] = {}
+
+    @property
+    def pseudo_bin(self) -> int:
+        """Bin with the offsets and number of records of each reference sequence."""
+        return bin_first(self.depth + 1) + 1
+
+    def add(self, name: str, beg: int, end: int, off_beg: int, off_end: int):
+        """Add record on ``name`` at 0-based ``[beg, end)`` between the virtual offsets.
+
+        Records must be added grouped by reference sequence and sorted by ``beg``.
+        """
+        ref = self.refs.get(name)
+        if ref is None:
+            ref = self.refs[name] = ReferenceIndex()
+            self.names.append(name)
+        elif name != self.names[-1]:
+            raise ClinvarTsvException("Records on %s are not contiguous" % name)
+        end = max(end, beg + 1)
+        bin_ = reg2bin(beg, end, self.min_shift, self.depth)
+        ref.add(bin_, beg, end, self.min_shift, off_beg, off_end)
+
+    def _aux(self) -> bytes:
+        if self.tabix_conf is None:
+            return b""
+        names = b"".join(name.encode("utf-8") + b"\x00" for name in self.names)
+        return struct.pack("<7i", *self.tabix_conf, len(names)) + names
+
+    def write_csi(self, path: str):
+        """Write index in CSI format to ``path``."""
+        aux = self._aux()
+        with BgzfWriter.open(path) as writer:
+            writer.write(CSI_MAGIC + struct.pack("<3i", self.min_shift, self.depth, len(aux)))
+            writer.write(aux + struct.pack("<i", len(self.names)))
+            for name in self.names:
+                ref = self.refs[name]
+                ref.compute_loffsets(self.depth)
+                parts = [struct.pack("<i", len(ref.bins) + 1)]
+                for bin_, chunks in sorted(ref.bins.items()):
+                    parts.append(struct.pack("<IQi", bin_, ref.loffsets[bin_], len(chunks)))
+                    parts += [struct.pack("<QQ", *chunk) for chunk in chunks]
+                parts.append(
+                    struct.pack(
+                        "<IQiQQQQ",
+                        self.pseudo_bin,
+                        0,
+                        2,
+                        ref.off_beg,
+                        ref.off_end,
+                        ref.n_records,
+                        0,
+                    )
+                )
+                writer.write(b"".join(parts))
+            writer.write(struct.pack("<Q", 0))
+
+    @classmethod
+    def load(cls, path: str) -> "BinningIndex":
+        """Load index in CSI or TBI format from ``path``."""
+        with gzip.open(path, "rb") as inputf:
+            data = inputf.read()
+        if data[:4] == CSI_MAGIC:
+            return cls._from_csi(data)
+        elif data[:4] == TBI_MAGIC:
+            return cls._from_tbi(data)
+        else:
+            raise ClinvarTsvException("Neither CSI nor TBI file: %s" % path)
+
+    @classmethod
+    def load_csi(cls, path: str) -> "BinningIndex":
+        """Load index in CSI format from ``path``."""
+        with gzip.open(path, "rb") as inputf:
+            data = inputf.read()
+        if data[:4] != CSI_MAGIC:
+            raise ClinvarTsvException("Not a CSI file: %s" % path)
+        return cls._from_csi(data)
+
+    @classmethod
+    def _from_csi(cls, data: bytes) -> "BinningIndex":
+        min_shift, depth, l_aux = struct.unpack_from("<3i", data, 4)
+        aux = data[16 : 16 + l_aux]
+        if len(aux) >= 28:
+            *tabix_conf, l_nm = struct.unpack_from("<7i", aux)
+            names = aux[28 : 28 + l_nm].decode("utf-8").split("\x00")[:-1]
+            result = cls(min_shift, depth, tuple(tabix_conf))
+        else:
+            names, result = [], cls(min_shift, depth, None)
+        (n_ref,) = struct.unpack_from("<i", data, 16 + l_aux)
+        result._read_refs(data, 20 + l_aux, n_ref, names, True)
+        return result
+
+    @classmethod
+    def _from_tbi(cls, data: bytes) -> "BinningIndex":
+        (n_ref,) = struct.unpack_from("<i", data, 4)
+        *tabix_conf, l_nm = struct.unpack_from("<7i", data, 8)
+        names = data[36 : 36 + l_nm].decode("utf-8").split("\x00")[:-1]
+        if len(names) != n_ref:
+            raise ClinvarTsvException(
+                "Expected %d names in TBI file but got %d" % (n_ref, len(names))
+            )
+        result = cls(DEFAULT_MIN_SHIFT, DEFAULT_DEPTH, tuple(tabix_conf))
+        result._read_refs(data, 36 + l_nm, n_ref, names, False)
+        return result
+
+    def _read_refs(self, data: bytes, pos: int, n_ref: int, names: typing.List[str], csi: bool):
+        """Read ``n_ref`` references starting at ``pos`` of CSI or TBI file in ``data``."""
+        for i in range(n_ref):
+            ref = ReferenceIndex()
+            (n_bin,) = struct.unpack_from("<i", data, pos)
+            pos += 4
+            for _ in range(n_bin):
+                if csi:
+                    bin_, loffset, n_chunk = struct.unpack_from("<IQi", data, pos)
+                    pos += 16
+                else:
+                    bin_, n_chunk = struct.unpack_from("<Ii", data, pos)
+                    pos += 8
+                chunks = [
+                    list(struct.unpack_from("<QQ", data, pos + 16 * j)) for j in range(n_chunk)
+                ]
+                pos += 16 * n_chunk
+                if bin_ == self.pseudo_bin:
+                    ref.off_beg, ref.off_end = chunks[0]
+                    ref.n_records = chunks[1][0]
+                else:
+                    ref.bins[bin_] = chunks
+                    if csi:
+                        ref.loffsets[bin_] = loffset
+            if not csi:
+                (n_intv,) = struct.unpack_from("<i", data, pos)
+                ref.linear = dict(enumerate(struct.unpack_from("<%dQ" % n_intv, data, pos + 4)))
+                pos += 4 + 8 * n_intv
+                ref.compute_loffsets(self.depth)
+            name = names[i] if i < len(names) else str(i)
+            self.names.append(name)
+            self.refs[name] = ref
+
+    def chunks(self, name: str, beg: int, end: int) -> typing.List[typing.Tuple[int, int]]:
+        """Return sorted and merged chunks of virtual offsets with the records on ``name``
+        overlapping the 0-based ``[beg, end)``."""
+        ref = self.refs.get(name)
+        if ref is None:
+            return []
+        beg, end = max(beg, 0), max(end, beg + 1)
+        bin_ = bin_first(self.depth) + (beg >> self.min_shift)
+        while bin_ and bin_ not in ref.bins:
+            bin_ = (bin_ - 1) >> 3
+        min_off = ref.loffsets.get(bin_, 0)
+        found = sorted(
+            (chunk_beg, chunk_end)
+            for other in reg2bins(beg, end, self.min_shift, self.depth)
+            for chunk_beg, chunk_end in ref.bins.get(other, ())
+            if chunk_end > min_off
+        )
+        result: typing.List[typing.Tuple[int, int]] = []
+        for chunk_beg, chunk_end in found:
+            if result and chunk_beg <= result[-1][1]:
+                result[-1] = (result[-1][0], max(result[-1][1], chunk_end))
+            else:
+                result.append((chunk_beg, chunk_end))
+        return result
@@ -0,0 +1,221 @@
+"""Binary lookup file of the merged small variant table for fast point lookups.
+
+The lookup file has one fixed-width record of ``RECORD_SIZE`` bytes per row of the merged
+table, sorted by its key: chromosome ID, position, and a 64 bit hash of reference and
+alternative allele.  The fields are big-endian, so the byte order of the keys is their sort
+order.  The remaining fields are the VCV number, the pathogenicity code (bit ``i`` for
+``PATHOGENICITY_ORDER[i]`` in the ClinVar summary, ``CONFLICTING_BIT`` for conflicting
+interpretations), and the gold stars of the ClinVar summary.
+
+The records are preceded by a fixed header and a JSON block with the genome build, the
+ClinVar version, and the name and record range of each chromosome.  ``LookupFile`` maps the
+file into memory and finds records by binary search in the range of their chromosome, so
+opening is cheap and only the pages touched by lookups are read.
+"""
+
+import bisect
+import hashlib
+import struct
+import typing
+
+import attr
+from logzero import logger
+
+from clinvar_tsv.common import Pathogenicity, from_pg_list, open_maybe_gzip
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.mapped import open_mapped, write_header
+from clinvar_tsv.memprofile import MemoryProfiler
+from clinvar_tsv.merge_tsvs import PATHOGENICITY_ORDER
+from clinvar_tsv.tsv import TsvReader
+
+#: Magic bytes at the start of lookup files.
+MAGIC = b"CVLOOKUP"
+
+#: Version of the file format.
+VERSION = 1
+
+#: Key of a record: chromosome ID, position, and allele hash.
+_KEY = struct.Struct(">HIQ")
+
+#: Record: key, VCV number, pathogenicity code, and gold stars.
+_RECORD = struct.Struct(">HIQIBb")
+
+#: Size of a record in bytes.
+RECORD_SIZE = _RECORD.size
+
+#: Size of the key of a record in bytes.
+KEY_SIZE = _KEY.size
+
+#: Bit of the pathogenicity code for conflicting interpretations.
+CONFLICTING_BIT = 1 << 7
+
+
+def allele_hash(reference: str, alternative: str) -> int:
+    """Return 64 bit hash of the alleles."""
+    data = ("%s>%s" % (reference, alternative)).encode("ascii")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def vcv_number(vcv: str) -> int:
+    """Return number of the VCV accession, e.g., 12846 for ``VCV000012846``."""
+    return int(vcv[3:]) if vcv.startswith("VCV") else int(vcv)
+
+
+def pathogenicity_code(
+    pathogenicities: typing.Iterable[str], review_status: str, variant_id: str = ""
+) -> int:
+    """Return pathogenicity code for pathogenicity labels and review status label."""
+    code = CONFLICTING_BIT if "conflicting" in review_status else 0
+    for label in pathogenicities:
+        code |= 1 << PATHOGENICITY_ORDER.index(Pathogenicity.from_label(label, variant_id))
+    return code
+
+
+@attr.s(frozen=True, auto_attribs=True, slots=True)
+class LookupRecord:
+    """A record of the lookup file."""
+
+    #: Chromosome name.
+    chromosome: str
+    #: 1-based position.
+    position: int
+    #: VCV accession.
+    vcv: str
+    #: Pathogenicity code.
+    pathogenicity_code: int
+    #: Gold stars of the ClinVar summary.
+    gold_stars: int
+
+    @property
+    def pathogenicities(self) -> typing.Tuple[Pathogenicity, ...]:
+        """Pathogenicities of the ClinVar summary."""
+        return tuple(
+            p for i, p in enumerate(PATHOGENICITY_ORDER) if self.pathogenicity_code >> i & 1
+        )
+
+    @property
+    def conflicting(self) -> bool:
+        """Whether there are conflicting interpretations."""
+        return bool(self.pathogenicity_code & CONFLICTING_BIT)
+
+
+def build_lookup(
+    input_path: str, output_path: str, mem_profiler: typing.Optional[MemoryProfiler] = None
+) -> typing.Dict[str, int]:
+    """Write lookup file for the merged small variant table at ``input_path`` to ``output_path``.
+
+    The input does not need to be sorted.  Each row is registered with ``mem_profiler``, if
+    any.  Returns the number of records written.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    chrom_ids: typing.Dict[str, int] = {}
+    releases, clinvar_version = set(), "."
+    records = []
+    with open_maybe_gzip(input_path, "rt") as inputf:
+        reader = TsvReader(inputf)
+        idx = {column: reader.index(column) for column in reader.header}
+        for row in reader:
+            mem_profiler.tick()
+            chrom = row[idx["chromosome"]]
+            chrom_id = chrom_ids.setdefault(chrom, len(chrom_ids))
+            if not records:
+                clinvar_version = row[idx["clinvar_version"]]
+            releases.add(row[idx["release"]])
+            records.append(
+                _RECORD.pack(
+                    chrom_id,
+                    int(row[idx["start"]]),
+                    allele_hash(row[idx["reference"]], row[idx["alternative"]]),
+                    vcv_number(row[idx["vcv"]]),
+                    pathogenicity_code(
+                        from_pg_list(row[idx["summary_clinvar_pathogenicity"]] or "{}"),
+                        row[idx["summary_clinvar_review_status_label"]],
+                        row[idx["vcv"]],
+                    ),
+                    int(row[idx["summary_clinvar_gold_stars"]] or 0),
+                )
+            )
+    if len(releases) > 1:
+        raise ClinvarTsvException(
+            "Expected one release in %s but found %s" % (input_path, ", ".join(sorted(releases)))
+        )
+    if len(chrom_ids) > 0xFFFF:
+        raise ClinvarTsvException("Too many chromosomes in %s" % input_path)
+    records.sort()
+
+    bounds = [bisect.bisect_left(records, struct.pack(">H", i)) for i in range(len(chrom_ids))]
+    bounds.append(len(records))
+    chromosomes = [(name, bounds[i], bounds[i + 1]) for name, i in chrom_ids.items()]
+    meta = {
+        "release": releases.pop() if releases else ".",
+        "clinvar_version": clinvar_version,
+        "chromosomes": chromosomes,
+    }
+    with open(output_path, "wb") as outputf:
+        write_header(outputf, MAGIC, VERSION, meta)
+        outputf.write(b"".join(records))
+    logger.info("Wrote %d records to %s", len(records), output_path)
+    return {"records": len(records)}
+
+
+class LookupFile:
+    """Memory-mapped lookup file at ``path``."""
+
+    def __init__(self, path: str):
+        #: Path to the lookup file.
+        self.path = path
+        self._mm, meta, self._offset = open_mapped(path, MAGIC, VERSION, "a lookup file")
+        #: Genome build of the records.
+        self.release: str = meta["release"]
+        #: ClinVar version of the records.
+        self.clinvar_version: str = meta["clinvar_version"]
+        self._names = [name for name, _, _ in meta["chromosomes"]]
+        self._chroms = {
+            name: (chrom_id, first, end)
+            for chrom_id, (name, first, end) in enumerate(meta["chromosomes"])
+        }
+        self._size = (len(self._mm) - self._offset) // RECORD_SIZE
+
+    def __len__(self) -> int:
+        return self._size
+
+    def record(self, i: int) -> LookupRecord:
+        """Return the ``i``-th record."""
+        chrom_id, position, _, vcv, code, gold_stars = _RECORD.unpack_from(
+            self._mm, self._offset + i * RECORD_SIZE
+        )
+        return LookupRecord(self._names[chrom_id], position, "VCV%09d" % vcv, code, gold_stars)
+
+    def lookup(
+        self, chromosome: str, position: int, reference: str, alternative: str
+    ) -> typing.List[LookupRecord]:
+        """Return records of the variant, empty if there are none."""
+        chrom = self._chroms.get(chromosome)
+        if chrom is None:
+            return []
+        chrom_id, lo, hi = chrom
+        key = _KEY.pack(chrom_id, position, allele_hash(reference, alternative))
+        mm, offset = self._mm, self._offset
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = offset + mid * RECORD_SIZE
+            if mm[start : start + KEY_SIZE] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        result = []
+        start = offset + lo * RECORD_SIZE
+        while lo < self._size and mm[start : start + KEY_SIZE] == key:
+            result.append(self.record(lo))
+            lo += 1
+            start += RECORD_SIZE
+        return result
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
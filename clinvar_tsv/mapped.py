@@ -0,0 +1,44 @@
+"""Binary index files with a fixed header and a JSON block, mapped into memory for reading.
+
+The lookup file, the SV index, and the gene index share this layout: magic bytes, the version
+of the file format, and the length of the JSON block with the metadata, followed by the JSON
+block and the fixed-width records of the file.
+"""
+
+import json
+import mmap
+import struct
+import typing
+
+from clinvar_tsv.exceptions import ClinvarTsvException
+
+#: Header: magic, version, and length of the JSON block.
+HEADER = struct.Struct(">8sII")
+
+
+def write_header(outputf: typing.BinaryIO, magic: bytes, version: int, meta: dict):
+    """Write header and JSON block with ``meta`` to the binary file ``outputf``."""
+    data = json.dumps(meta).encode("utf-8")
+    outputf.write(HEADER.pack(magic, version, len(data)) + data)
+
+
+def open_mapped(
+    path: str, magic: bytes, version: int, description: str
+) -> typing.Tuple[mmap.mmap, dict, int]:
+    """Map the file at ``path`` into memory, return map, metadata, and offset of the records.
+
+    Raises a ``ClinvarTsvException`` naming the file ``description`` if the file does not
+    start with ``magic`` and ``version``.
+    """
+    error = ClinvarTsvException("Not %s of version %d: %s" % (description, version, path))
+    with open(path, "rb") as inputf:
+        try:
+            mm = mmap.mmap(inputf.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            raise error
+    if len(mm) < HEADER.size or HEADER.unpack_from(mm)[:2] != (magic, version):
+        mm.close()
+        raise error
+    meta_size = HEADER.unpack_from(mm)[2]
+    meta = json.loads(mm[HEADER.size : HEADER.size + meta_size].decode("utf-8"))
+    return mm, meta, HEADER.size + meta_size
@@ -0,0 +1,146 @@
+"""In-process memory profiling shared by the subcommands.
+
+The processing loops call ``MemoryProfiler.tick()`` once per record.  Every ``interval``
+records, the profiler appends one line to its timeline TSV file with the resident set size of
+this process and, optionally, the top allocation sites as reported by ``tracemalloc``.  The
+resulting file can be plotted directly against the ``records`` column.
+
+Sampling reads ``/proc/self/statm`` and thus does not fork or shell out.  Worker processes
+profile themselves with the profiler of ``MemoryProfiler.for_worker()``, which writes its own
+timeline next to the one of the main process.
+"""
+
+import resource
+import time
+import tracemalloc
+import typing
+
+#: Header of the timeline TSV file.
+TIMELINE_HEADER = (
+    "records",
+    "elapsed_seconds",
+    "rss_bytes",
+    "max_rss_bytes",
+    "traced_bytes",
+    "traced_peak_bytes",
+    "top_allocations",
+)
+
+#: Default number of records between two samples.
+DEFAULT_INTERVAL = 10_000
+
+
+def current_rss() -> int:
+    """Return the current resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm", "rt") as inputf:
+            return int(inputf.read().split()[1]) * resource.getpagesize()
+    except OSError:  # pragma: no cover
+        return max_rss()  # no procfs, fall back to peak value
+
+
+def max_rss() -> int:
+    """Return the peak resident set size of this process in bytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryProfiler:
+    """Write memory usage timeline to ``path``.
+
+    If ``path`` is ``None`` then ``tick()`` only counts records, so the processing code can
+    call it unconditionally.  If ``top_allocations`` is positive then ``tracemalloc`` is
+    enabled while the profiler is active and the given number of top allocation sites is
+    written with each sample.  Entering the profiler again while it is active, e.g., in code
+    that is called with an active profiler or profiles itself otherwise, has no effect.
+    """
+
+    def __init__(
+        self,
+        path: typing.Optional[str] = None,
+        interval: int = DEFAULT_INTERVAL,
+        top_allocations: int = 0,
+    ):
+        #: Path to the timeline file, if any.
+        self.path = path
+        #: Number of records between two samples.
+        self.interval = interval
+        #: Number of top allocation sites to write.
+        self.top_allocations = top_allocations
+        #: Number of records processed so far.
+        self.records = 0
+        #: Record count at which the next sample is to be taken.
+        self._next_sample = float("inf")
+        self._outputf = None
+        self._start_time = None
+        self._depth = 0
+        self._started_tracing = False
+
+    def for_worker(self, name: str) -> "MemoryProfiler":
+        """Return inactive profiler for the worker ``name`` writing to ``path`` plus ``.name``."""
+        path = "%s.%s" % (self.path, name) if self.path else None
+        return MemoryProfiler(path, self.interval, self.top_allocations)
+
+    def __enter__(self):
+        self._depth += 1
+        if self._depth == 1 and self.path:
+            self._outputf = open(self.path, "wt")
+            print("\t".join(TIMELINE_HEADER), file=self._outputf)
+            if self.top_allocations and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            self._start_time = time.monotonic()
+            self._next_sample = 0
+            self.sample()
+        return self
+
+    def __exit__(self, *args):
+        self._depth -= 1
+        if self._depth:
+            return
+        if self._outputf:
+            self.sample()
+            self._outputf.close()
+            self._outputf = None
+            if self._started_tracing:  # leave tracing of the caller running
+                tracemalloc.stop()
+                self._started_tracing = False
+        self._next_sample = float("inf")
+
+    def tick(self, count: int = 1):
+        """Register that ``count`` more records have been processed."""
+        self.records += count
+        if self.records >= self._next_sample:
+            self.sample()
+
+    def sample(self):
+        """Write one line to the timeline file."""
+        if self._outputf is None:
+            return
+        if tracemalloc.is_tracing():
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            stats = tracemalloc.take_snapshot().statistics("lineno")[: self.top_allocations]
+            top = ";".join(
+                "%s:%d=%d" % (stat.traceback[0].filename, stat.traceback[0].lineno, stat.size)
+                for stat in stats
+            )
+        else:
+            traced, traced_peak, top = 0, 0, "."
+        print(
+            "\t".join(
+                map(
+                    str,
+                    (
+                        self.records,
+                        "%.3f" % (time.monotonic() - self._start_time),
+                        current_rss(),
+                        max_rss(),
+                        traced,
+                        traced_peak,
+                        top or ".",
+                    ),
+                )
+            ),
+            file=self._outputf,
+        )
+        self._outputf.flush()
+        self._next_sample = self.records + self.interval
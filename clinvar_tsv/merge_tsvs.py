@@ -1,14 +1,42 @@
 """Merging of normalized ClinVar TSV files."""
 
-import itertools
-import json
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import operator
+import os
 import re
+import shutil
+import tempfile
 import typing
+import zlib
 
 import attr
-import cattr
+from logzero import logger
 
-from clinvar_tsv.common import ClinVarSet, DateTimeEncoder, Pathogenicity, ReviewStatus, as_pg_list
+from clinvar_tsv.common import (
+    ClinVarSet,
+    Pathogenicity,
+    ReviewStatus,
+    as_pg_list,
+    from_pg_list,
+    open_maybe_gzip,
+)
+from clinvar_tsv.details import (
+    canonical_details,
+    decode_details,
+    encode_details,
+    get_decoder,
+    join_details,
+)
+from clinvar_tsv.details_store import DetailsStoreWriter
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.gene_index import GeneIndexWriter, write_gene_index
+from clinvar_tsv.memprofile import MemoryProfiler
+from clinvar_tsv.pool import OrderedPool
+from clinvar_tsv.sort_tsv import OrderChecker, merge_sorted, open_output, sort_key, write_merged
+from clinvar_tsv.tsv import TsvReader, TsvWriter
 
 HEADER_OUT = (
     "release",
@@ -35,157 +63,282 @@ HEADER_OUT = (
     "details",
 )
 
+#: Header of the summary table written instead of ``HEADER_OUT`` with a details store, see
+#: ``clinvar_tsv.details_store``.
+HEADER_SUMMARY = HEADER_OUT[:-1] + ("details_offset",)
+
+_IDX_VCV_OUT = HEADER_OUT.index("vcv")
+
+#: Indices of the sort columns chromosome, start, end, and vcv in ``HEADER_OUT``.
+OUTPUT_SORT_COLUMNS = tuple(
+    HEADER_OUT.index(column) for column in ("chromosome", "start", "end", "vcv")
+)
+
 
 _ReviewedPathogenicity = typing.TypeVar("_ReviewedPathogenicity")
 
+#: Separators of the labels in the review status and pathogenicity of an assertion.
+_LABEL_SEP_RE = re.compile(r", ?|/")
 
-@attr.s(frozen=True, auto_attribs=True)
-class ReviewedPathogenicity:
-    review_statuses: typing.Tuple[ReviewStatus, ...]
-    pathogenicities: typing.Tuple[Pathogenicity, ...]
+#: Bit of each ``ReviewStatus`` in the masks of ``CompactReviewedPathogenicity``.
+REVIEW_STATUS_BITS = {status: 1 << status.value for status in ReviewStatus}
 
-    def review_status_label(self):
-        return ", ".join([s.label() for s in self.review_statuses])
+_PRACTICE_GUIDELINE = REVIEW_STATUS_BITS[ReviewStatus.PRACTICE_GUIDELINE]
+_EXPERT_PANEL = REVIEW_STATUS_BITS[ReviewStatus.EXPERT_PANEL]
+_CRITERIA_PROVIDED = REVIEW_STATUS_BITS[ReviewStatus.CRITERIA_PROVIDED]
+_NO_ASSERTION_CRITERIA_PROVIDED = REVIEW_STATUS_BITS[ReviewStatus.NO_ASSERTION_CRITERIA_PROVIDED]
+_MULTIPLE_SUBMITTERS = REVIEW_STATUS_BITS[ReviewStatus.MULTIPLE_SUBMITTERS]
+_SINGLE_SUBMITTER = REVIEW_STATUS_BITS[ReviewStatus.SINGLE_SUBMITTER]
+_NO_CONFLICTS = REVIEW_STATUS_BITS[ReviewStatus.NO_CONFLICTS]
+_CONFLICTING_INTERPRETATIONS = REVIEW_STATUS_BITS[ReviewStatus.CONFLICTING_INTERPRETATIONS]
+
+#: Order of the review statuses as appended by ``combine()``.
+COMBINED_REVIEW_STATUS_ORDER = (
+    ReviewStatus.PRACTICE_GUIDELINE,
+    ReviewStatus.EXPERT_PANEL,
+    ReviewStatus.MULTIPLE_SUBMITTERS,
+    ReviewStatus.SINGLE_SUBMITTER,
+    ReviewStatus.CRITERIA_PROVIDED,
+    ReviewStatus.NO_ASSERTION_CRITERIA_PROVIDED,
+    ReviewStatus.NO_ASSERTION_PROVIDED,
+    ReviewStatus.NO_CONFLICTS,
+    ReviewStatus.CONFLICTING_INTERPRETATIONS,
+)
+
+#: Pathogenicities by their index in the counts of ``CompactReviewedPathogenicity``.
+PATHOGENICITY_ORDER = tuple(sorted(Pathogenicity))
+
+_PATHOGENICITY_INDEX = {pathogenicity: i for i, pathogenicity in enumerate(PATHOGENICITY_ORDER)}
+#: Offset from the values to the indices of the pathogenicities (the values are contiguous).
+_MIN_PATHOGENICITY = PATHOGENICITY_ORDER[0].value
+_PATHOGENICITY_LABELS = tuple(pathogenicity.label() for pathogenicity in PATHOGENICITY_ORDER)
+#: Indices of the benign, uncertain, and pathogenic pathogenicities.
+_NEGATIVE = tuple(i for i, p in enumerate(PATHOGENICITY_ORDER) if p.value < 0)
+_UNCERTAIN = PATHOGENICITY_ORDER.index(Pathogenicity.UNCERTAIN)
+_POSITIVE = tuple(i for i, p in enumerate(PATHOGENICITY_ORDER) if p.value > 0)
+
+#: Bits and labels of the review statuses in the order of ``COMBINED_REVIEW_STATUS_ORDER``.
+_COMBINED_REVIEW_STATUS_LABELS = tuple(
+    (REVIEW_STATUS_BITS[status], status.label()) for status in COMBINED_REVIEW_STATUS_ORDER
+)
+
+#: Bits of the review status labels seen so far.
+_REVIEW_STATUS_BITS_BY_LABEL: typing.Dict[str, int] = {}
+
+
+def _review_status_bit(label: str, variant_id: typing.Any) -> int:
+    result = _REVIEW_STATUS_BITS_BY_LABEL.get(label)
+    if result is None:
+        result = REVIEW_STATUS_BITS[ReviewStatus.from_label(label, variant_id)]
+        _REVIEW_STATUS_BITS_BY_LABEL[label] = result
+    return result
+
+
+@attr.s(frozen=True, slots=True, auto_attribs=True)
+class CompactReviewedPathogenicity:
+    """``ReviewedPathogenicity`` with the review statuses as a bitmask and the pathogenicities
+    as counts, which is what the summaries work on.
+    """
+
+    #: Bitmask of the review statuses, see ``REVIEW_STATUS_BITS``.
+    mask: int
+    #: Number of review statuses, including repeated ones.
+    num_statuses: int
+    #: Count of each pathogenicity in the order of ``PATHOGENICITY_ORDER``.
+    counts: typing.Tuple[int, ...]
+
+    @classmethod
+    def from_labels(
+        cls, review_status: str, pathogenicity: str, variant_id: typing.Any
+    ) -> "CompactReviewedPathogenicity":
+        """Create from the labels of one ``ClinVarAssertion`` of ``variant_id``."""
+        statuses = _LABEL_SEP_RE.split(review_status)
+        mask = 0
+        for label in statuses:
+            mask |= _review_status_bit(label, variant_id)
+        counts = [0] * len(PATHOGENICITY_ORDER)
+        for label in _LABEL_SEP_RE.split(pathogenicity):
+            counts[Pathogenicity.from_label(label, variant_id).value - _MIN_PATHOGENICITY] += 1
+        return cls(mask, len(statuses), tuple(counts))
+
+    @classmethod
+    def combine(
+        cls, elems: typing.Sequence["CompactReviewedPathogenicity"]
+    ) -> "CompactReviewedPathogenicity":
+        """Combine ``elems``, see ``ReviewedPathogenicity.combine()``."""
+        all_mask, num_statuses = 0, 0
+        for elem in elems:
+            all_mask |= elem.mask
+            num_statuses += elem.num_statuses
+        all_counts = list(map(sum, zip(*(elem.counts for elem in elems))))
+
+        multiple_submitters = len(elems) > 1
+
+        if num_statuses == 1 and all_mask in (_PRACTICE_GUIDELINE, _EXPERT_PANEL):
+            mask = all_mask
+        else:
+            mask = _MULTIPLE_SUBMITTERS if multiple_submitters else _SINGLE_SUBMITTER
+            if all_mask & _CRITERIA_PROVIDED:
+                mask |= _CRITERIA_PROVIDED
+            else:
+                mask |= _NO_ASSERTION_CRITERIA_PROVIDED
+
+        negative = any(all_counts[i] for i in _NEGATIVE)
+        uncertain = bool(all_counts[_UNCERTAIN])
+        positive = any(all_counts[i] for i in _POSITIVE)
+        if multiple_submitters:
+            if negative + uncertain + positive == 1:
+                mask |= _NO_CONFLICTS
+            else:
+                mask |= _CONFLICTING_INTERPRETATIONS
+
+        if positive and uncertain:
+            drop = _NEGATIVE
+        elif positive and negative:
+            drop = (_UNCERTAIN,)
+        elif uncertain and negative:
+            drop = _POSITIVE
+        else:
+            drop = ()
+            all_counts = [min(count, 1) for count in all_counts]
+        for i in drop:
+            all_counts[i] = 0
+
+        return cls(mask, bin(mask).count("1"), tuple(all_counts))
+
+    def review_status_label(self) -> str:
+        """Return label of the review statuses in the order of ``combine()``."""
+        return ", ".join(label for bit, label in _COMBINED_REVIEW_STATUS_LABELS if self.mask & bit)
 
     def pathogenicity_label(self) -> str:
-        if ReviewStatus.CONFLICTING_INTERPRETATIONS in self.review_statuses:
-            result = "conflicting interpretations of pathogenicity - "
-            counts = {}
-            for pathogenicity in sorted(self.pathogenicities):
-                counts.setdefault(pathogenicity, 0)
-                counts[pathogenicity] += 1
-            result += "; ".join("%s (%d)" % (k.label(), v) for k, v in counts.items())
-            return result
+        if self.mask & _CONFLICTING_INTERPRETATIONS:
+            return "conflicting interpretations of pathogenicity - " + "; ".join(
+                "%s (%d)" % (label, count)
+                for label, count in zip(_PATHOGENICITY_LABELS, self.counts)
+                if count
+            )
         else:
-            pathogenicities = list(sorted(set(self.pathogenicities)))
-            return " / ".join(a.label() for a in pathogenicities)
+            return " / ".join(
+                label for label, count in zip(_PATHOGENICITY_LABELS, self.counts) if count
+            )
 
     def pathogenicity_list(self, *, all_on_conflicts: bool) -> typing.List[str]:
-        if (
-            ReviewStatus.CONFLICTING_INTERPRETATIONS in self.review_statuses
-            and not all_on_conflicts
-        ):
-            return [Pathogenicity.UNCERTAIN.label()]
+        if self.mask & _CONFLICTING_INTERPRETATIONS and not all_on_conflicts:
+            return [_PATHOGENICITY_LABELS[_UNCERTAIN]]
         else:
-            return [pathogenicity.label() for pathogenicity in sorted(set(self.pathogenicities))]
+            return [label for label, count in zip(_PATHOGENICITY_LABELS, self.counts) if count]
 
-    def gold_stars(self):
-        if ReviewStatus.PRACTICE_GUIDELINE in self.review_statuses:
+    def gold_stars(self) -> int:
+        mask = self.mask
+        if mask & _PRACTICE_GUIDELINE:
             return 4
-        elif ReviewStatus.EXPERT_PANEL in self.review_statuses:
+        elif mask & _EXPERT_PANEL:
             return 3
-        elif (
-            ReviewStatus.CRITERIA_PROVIDED in self.review_statuses
-            and ReviewStatus.CRITERIA_PROVIDED in self.review_statuses
-            and ReviewStatus.MULTIPLE_SUBMITTERS in self.review_statuses
-            and ReviewStatus.NO_CONFLICTS in self.review_statuses
-        ):
+        elif mask & _CRITERIA_PROVIDED:
+            if mask & _MULTIPLE_SUBMITTERS and mask & _NO_CONFLICTS:
+                return 2
+            elif mask & (_CONFLICTING_INTERPRETATIONS | _SINGLE_SUBMITTER):
+                return 1
+        return 0
+
+    def stratum(self) -> int:
+        """Return stratum of the review status, see ``rp_stratum()``."""
+        if self.mask & _PRACTICE_GUIDELINE:
+            return 4
+        elif self.mask & _EXPERT_PANEL:
+            return 3
+        elif self.mask & _CRITERIA_PROVIDED:
             return 2
-        elif (
-            ReviewStatus.CRITERIA_PROVIDED in self.review_statuses
-            and ReviewStatus.CONFLICTING_INTERPRETATIONS in self.review_statuses
-        ):
-            return 1
-        elif (
-            ReviewStatus.CRITERIA_PROVIDED in self.review_statuses
-            and ReviewStatus.SINGLE_SUBMITTER in self.review_statuses
-        ):
-            return 1
         else:
-            return 0
+            return 1
 
-    @classmethod
-    def from_clinvar_set(cls, elem: ClinVarSet) -> typing.Tuple[_ReviewedPathogenicity, ...]:
-        result = []
-        for cv_assertion in elem.cv_assertions:
-            result.append(
-                ReviewedPathogenicity(
-                    review_statuses=tuple(
-                        map(
-                            lambda label: ReviewStatus.from_label(label, elem.id_no),
-                            re.split(r", ?|/", cv_assertion.review_status),
-                        )
-                    ),
-                    pathogenicities=tuple(
-                        map(
-                            lambda label: Pathogenicity.from_label(label, elem.id_no),
-                            re.split(r", ?|/", cv_assertion.pathogenicity),
-                        )
-                    ),
-                )
-            )
-        return tuple(result)
+    def expand(self) -> "ReviewedPathogenicity":
+        """Return as ``ReviewedPathogenicity`` with the review statuses in combined order."""
+        return ReviewedPathogenicity(
+            review_statuses=tuple(
+                status
+                for status in COMBINED_REVIEW_STATUS_ORDER
+                if self.mask & REVIEW_STATUS_BITS[status]
+            ),
+            pathogenicities=tuple(
+                pathogenicity
+                for pathogenicity, count in zip(PATHOGENICITY_ORDER, self.counts)
+                for _ in range(count)
+            ),
+        )
 
-    @classmethod
-    def combine(cls, elems: typing.Iterable[_ReviewedPathogenicity]) -> _ReviewedPathogenicity:
-        def sign(x):
-            if x < 0:
-                return -1
-            elif x > 0:
-                return 1
-            else:
-                return 0
 
-        all_pathogenicities = []
-        for elem in elems:
-            all_pathogenicities += elem.pathogenicities
-        all_pathogenicities = list(sorted(all_pathogenicities))
+@attr.s(frozen=True, auto_attribs=True)
+class ReviewedPathogenicity:
+    review_statuses: typing.Tuple[ReviewStatus, ...]
+    pathogenicities: typing.Tuple[Pathogenicity, ...]
 
-        all_statuses = []
-        for elem in elems:
-            all_statuses += elem.review_statuses
-        all_statuses = list(sorted(all_statuses))
+    def compact(self) -> CompactReviewedPathogenicity:
+        mask = 0
+        for status in self.review_statuses:
+            mask |= REVIEW_STATUS_BITS[status]
+        counts = [0] * len(PATHOGENICITY_ORDER)
+        for pathogenicity in self.pathogenicities:
+            counts[_PATHOGENICITY_INDEX[pathogenicity]] += 1
+        return CompactReviewedPathogenicity(mask, len(self.review_statuses), tuple(counts))
 
-        multiple_submitters = len(elems) > 1
+    def review_status_label(self):
+        return ", ".join([s.label() for s in self.review_statuses])
 
-        if all_statuses == [ReviewStatus.PRACTICE_GUIDELINE]:
-            review_statuses = [ReviewStatus.PRACTICE_GUIDELINE]
-        elif all_statuses == [ReviewStatus.EXPERT_PANEL]:
-            review_statuses = [ReviewStatus.EXPERT_PANEL]
-        else:
-            if multiple_submitters:
-                review_statuses = [ReviewStatus.MULTIPLE_SUBMITTERS]
-            else:
-                review_statuses = [ReviewStatus.SINGLE_SUBMITTER]
-            if ReviewStatus.CRITERIA_PROVIDED in all_statuses:
-                review_statuses.append(ReviewStatus.CRITERIA_PROVIDED)
-            else:
-                review_statuses.append(ReviewStatus.NO_ASSERTION_CRITERIA_PROVIDED)
+    def pathogenicity_label(self) -> str:
+        return self.compact().pathogenicity_label()
 
-        signs = {sign(assertion.value) for assertion in set(all_pathogenicities)}
-        if multiple_submitters:
-            if len(signs) == 1:
-                review_statuses.append(ReviewStatus.NO_CONFLICTS)
-            else:
-                review_statuses.append(ReviewStatus.CONFLICTING_INTERPRETATIONS)
-
-        if 1 in signs and 0 in signs:
-            assertions = [assertion for assertion in all_pathogenicities if assertion.value >= 0]
-        elif 1 in signs and -1 in signs:
-            assertions = [assertion for assertion in all_pathogenicities if assertion.value != 0]
-        elif 0 in signs and -1 in signs:
-            assertions = [assertion for assertion in all_pathogenicities if assertion.value <= 0]
-        else:
-            assertions = []
-            for assertion in all_pathogenicities:
-                if assertion not in assertions:
-                    assertions.append(assertion)
+    def pathogenicity_list(self, *, all_on_conflicts: bool) -> typing.List[str]:
+        return self.compact().pathogenicity_list(all_on_conflicts=all_on_conflicts)
+
+    def gold_stars(self):
+        return self.compact().gold_stars()
 
+    def stratum(self) -> int:
+        return self.compact().stratum()
+
+    @classmethod
+    def from_clinvar_set(cls, elem: ClinVarSet) -> typing.Tuple[_ReviewedPathogenicity, ...]:
+        return tuple(
+            cls.from_labels(cv_assertion.review_status, cv_assertion.pathogenicity, elem.id_no)
+            for cv_assertion in elem.cv_assertions
+        )
+
+    @classmethod
+    def from_labels(
+        cls, review_status: str, pathogenicity: str, variant_id: typing.Any
+    ) -> _ReviewedPathogenicity:
+        """Create from the labels of one ``ClinVarAssertion`` of ``variant_id``."""
         return ReviewedPathogenicity(
-            review_statuses=tuple(review_statuses), pathogenicities=tuple(sorted(assertions))
+            review_statuses=tuple(
+                ReviewStatus.from_label(label, variant_id)
+                for label in _LABEL_SEP_RE.split(review_status)
+            ),
+            pathogenicities=tuple(
+                Pathogenicity.from_label(label, variant_id)
+                for label in _LABEL_SEP_RE.split(pathogenicity)
+            ),
         )
 
+    @classmethod
+    def combine(cls, elems: typing.Sequence[_ReviewedPathogenicity]) -> _ReviewedPathogenicity:
+        return CompactReviewedPathogenicity.combine([elem.compact() for elem in elems]).expand()
+
 
-def rp_stratum(rp: ReviewedPathogenicity) -> int:
+def rp_stratum(rp: typing.Union[ReviewedPathogenicity, CompactReviewedPathogenicity]) -> int:
     """Get stratum from ClinVarAssertion record."""
-    if ReviewStatus.PRACTICE_GUIDELINE in rp.review_statuses:
-        return 4
-    elif ReviewStatus.EXPERT_PANEL in rp.review_statuses:
-        return 3
-    elif ReviewStatus.CRITERIA_PROVIDED in rp.review_statuses:
-        return 2
-    else:
-        return 1
+    return rp.stratum()
+
+
+def compact_rps(chunk: typing.List[ClinVarSet]) -> typing.List[CompactReviewedPathogenicity]:
+    """Return ``CompactReviewedPathogenicity`` of all assertions in ``chunk``."""
+    return [
+        CompactReviewedPathogenicity.from_labels(
+            cv_assertion.review_status, cv_assertion.pathogenicity, clinvar_set.id_no
+        )
+        for clinvar_set in chunk
+        for cv_assertion in clinvar_set.cv_assertions
+    ]
 
 
 def summarize(
@@ -196,32 +349,162 @@ def summarize(
     If ``stratify_by_review_status`` then only the highest stratum will be used (e.g., assessments
     with assertion criteria beat those without).  Otherwise, all will be considered.
     """
-    # Obtain list of ReviewedAssertion objects
-    rps = list(itertools.chain(*map(ReviewedPathogenicity.from_clinvar_set, chunk)))
-    # Process, possibly stratified by review status
-    stratified = {}
-    for rp in rps:
-        stratum = rp_stratum(rp) if stratify_by_review_status else 0
-        stratified.setdefault(stratum, [])
-        stratified[stratum].append(rp)
-    highest_stratum = stratified[max(stratified.keys())]
+    rps = compact_rps(chunk)
+    return summarize_rps(rps, stratify_by_review_status=stratify_by_review_status).expand()
+
+
+def summarize_rps(
+    rps: typing.List[CompactReviewedPathogenicity], *, stratify_by_review_status: bool
+) -> CompactReviewedPathogenicity:
+    """Create summary from the ``rps`` of a chunk, see ``summarize()``."""
+    if stratify_by_review_status:
+        strata = [rp.stratum() for rp in rps]
+        highest_stratum = max(strata)
+        rps = [rp for rp, stratum in zip(rps, strata) if stratum == highest_stratum]
+    elif not rps:
+        raise ValueError("Cannot summarize chunk without assertions")
+    return CompactReviewedPathogenicity.combine(rps)
+
+
+def summary_fields(chunk: typing.List[ClinVarSet]) -> typing.Tuple[str, ...]:
+    """Return the ``summary_clinvar_*`` and ``summary_paranoid_*`` output fields for ``chunk``."""
+    return rps_summary_fields(compact_rps(chunk))
+
+
+def rps_summary_fields(
+    rps: typing.List[CompactReviewedPathogenicity],
+) -> typing.Tuple[str, ...]:
+    """Return the summary output fields for the ``rps`` of a chunk, see ``summary_fields()``."""
+    clinvar_summary = summarize_rps(rps, stratify_by_review_status=True)
+    paranoid_summary = summarize_rps(rps, stratify_by_review_status=False)
+    return (
+        clinvar_summary.review_status_label(),
+        clinvar_summary.pathogenicity_label(),
+        as_pg_list(clinvar_summary.pathogenicity_list(all_on_conflicts=False)),
+        str(clinvar_summary.gold_stars()),
+        paranoid_summary.review_status_label(),
+        paranoid_summary.pathogenicity_label(),
+        as_pg_list(paranoid_summary.pathogenicity_list(all_on_conflicts=True)),
+        str(paranoid_summary.gold_stars()),
+    )
+
+
+def assertion_profile(chunk: typing.List[ClinVarSet]) -> typing.Tuple[typing.Tuple[str, str], ...]:
+    """Return the sorted review status and pathogenicity of all assertions in ``chunk``.
+
+    The summaries only depend on this profile.
+    """
+    return tuple(
+        sorted(
+            (cv_assertion.review_status, cv_assertion.pathogenicity)
+            for clinvar_set in chunk
+            for cv_assertion in clinvar_set.cv_assertions
+        )
+    )
+
+
+#: Default number of assertion profiles kept by ``SummaryCache``.
+DEFAULT_SUMMARY_CACHE_SIZE = 100_000
+
+#: Largest number of assertions of a profile kept by ``SummaryCache``.
+MAX_PROFILE_LENGTH = 64
+
+
+class SummaryCache:
+    """Memoization of ``summary_fields()`` by ``assertion_profile()``.
+
+    Once ``maxsize`` profiles are stored, the cache is cleared.  Warnings about invalid labels
+    are only logged for the first chunk with a given profile.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_SUMMARY_CACHE_SIZE):
+        #: Largest number of profiles to keep.
+        self.maxsize = maxsize
+        #: Number of lookups answered from the cache.
+        self.hits = 0
+        #: Number of lookups that were computed.
+        self.misses = 0
+        self._cache: typing.Dict[
+            typing.Tuple[typing.Tuple[str, str], ...], typing.Tuple[str, ...]
+        ] = {}
+
+    def summary_fields(self, chunk: typing.List[ClinVarSet]) -> typing.Tuple[str, ...]:
+        profile = assertion_profile(chunk)
+        result = self._cache.get(profile)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = summary_fields(chunk)
+        if len(profile) <= MAX_PROFILE_LENGTH:
+            if len(self._cache) >= self.maxsize:
+                self._cache.clear()
+            self._cache[profile] = result
+        return result
+
+    def metrics(self) -> typing.Dict[str, typing.Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._cache),
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+#: Columns of the input file used by ``merge_and_write()``.
+INPUT_COLUMNS = (
+    "release",
+    "chromosome",
+    "start",
+    "end",
+    "bin",
+    "reference",
+    "alternative",
+    "variation_type",
+    "symbols",
+    "hgnc_ids",
+    "vcv",
+    "details",
+)
+
+
+def verify_details(vcv: str, details: str, raw_details: typing.Iterable[str]):
+    """Check that ``details`` joined from ``raw_details`` equals their decoding and encoding.
+
+    Raises ``ClinvarTsvException`` at the first difference.
+    """
+    expected = encode_details(map(decode_details, raw_details))
+    if details != expected:
+        offset = len(os.path.commonprefix([details, expected]))
+        raise ClinvarTsvException(
+            "Details of %s differ from encoded details at offset %d: %r vs. %r"
+            % (vcv, offset, details[offset : offset + 40], expected[offset : offset + 40])
+        )
 
-    return ReviewedPathogenicity.combine(highest_stratum)
 
+def merge_group(clinvar_version, rows, chunk, idx, verify=False, cache=None) -> typing.List[str]:
+    """Return fields of merged record for the input ``rows`` of one VCV.
 
-def merge_and_write(clinvar_version, valss, chunk, out_tsv):
+    ``chunk`` holds the ``ClinVarSet`` (or ``PartialClinVarSet``) from the details of each row
+    and ``idx`` maps the names in ``INPUT_COLUMNS`` to column indices.  The details of ``rows``
+    are joined as text rather than encoding ``chunk`` again.  If ``verify`` then this is
+    checked against the encoding with ``verify_details()``.  The summaries are looked up in
+    the ``SummaryCache`` ``cache``, if any.
+    """
     # Summarize chunks in clinvar and paranoid way.
-    clinvar_summary = summarize(chunk, stratify_by_review_status=True)
-    paranoid_summary = summarize(chunk, stratify_by_review_status=False)
+    if cache is None:
+        summaries = summary_fields(chunk)
+    else:
+        summaries = cache.summary_fields(chunk)
 
     # Concatenate symbols & HGNC IDs.
-    vals = valss[0]
+    row = rows[0]
     symbols, hgnc_ids = [], []
-    for one_vals in valss:
-        if one_vals["symbols"] != "{}":
-            symbols += list(map(json.loads, one_vals["symbols"][1:-1].split(",")))
-        if one_vals["hgnc_ids"] != "{}":
-            hgnc_ids += list(map(json.loads, one_vals["hgnc_ids"][1:-1].split(",")))
+    idx_symbols, idx_hgnc_ids = idx["symbols"], idx["hgnc_ids"]
+    for one_row in rows:
+        symbols += from_pg_list(one_row[idx_symbols])
+        hgnc_ids += from_pg_list(one_row[idx_hgnc_ids])
 
     # Get set type(s)
     set_type = ",".join(
@@ -234,61 +517,587 @@ def merge_and_write(clinvar_version, valss, chunk, out_tsv):
         )
     )
 
-    # Write out record.
-    print(
+    # Join details.
+    details = join_details(one_row[idx["details"]] for one_row in rows)
+    if verify:
+        verify_details(row[idx["vcv"]], details, (one_row[idx["details"]] for one_row in rows))
+
+    return _record_fields(
+        clinvar_version, row, idx, set_type, symbols, hgnc_ids, summaries, details
+    )
+
+
+def _record_fields(
+    clinvar_version, row, idx, set_type, symbols, hgnc_ids, summaries, details
+) -> typing.List[str]:
+    """Return fields of the merged record as in ``HEADER_OUT``."""
+    return [
+        row[idx["release"]],
+        row[idx["chromosome"]],
+        row[idx["start"]],
+        row[idx["end"]],
+        row[idx["bin"]],
+        row[idx["reference"]],
+        row[idx["alternative"]],
+        clinvar_version,
+        set_type,
+        row[idx["variation_type"]],
+        as_pg_list(sorted(set(symbols))),
+        as_pg_list(sorted(set(hgnc_ids))),
+        row[idx["vcv"]],
+        *summaries,
+        details,
+    ]
+
+
+class StreamedGroup:
+    """Running aggregate of the rows of one VCV, for groups too large to keep in memory.
+
+    ``add()`` decodes each row with ``decode``, counts the review status and pathogenicity of
+    its assertions, and appends its details to a temporary file in ``tmp_dir``.  Only the first
+    row (without details) and the distinct values are kept in memory.  ``write()`` then writes
+    the same record as ``merge_and_write()`` would, copying the details from the file.
+    """
+
+    def __init__(self, idx, decode, tmp_dir=None, verify=False):
+        #: Column indices of ``INPUT_COLUMNS``.
+        self.idx = idx
+        #: Function for decoding details.
+        self.decode = decode
+        #: Whether to check the details with ``verify_details()``.
+        self.verify = verify
+        #: Number of rows added.
+        self.rows = 0
+        #: First row added, without details.
+        self.first_row: typing.Optional[typing.List[str]] = None
+        #: Count of (review status, pathogenicity) pairs and the id_no of their first set.
+        self.profile: typing.Counter[typing.Tuple[str, str]] = collections.Counter()
+        self.id_nos: typing.Dict[typing.Tuple[str, str], int] = {}
+        #: Distinct set types, symbols, and HGNC IDs.
+        self.set_types: typing.Set[str] = set()
+        self.symbols: typing.Set[str] = set()
+        self.hgnc_ids: typing.Set[str] = set()
+        self._details = tempfile.TemporaryFile("w+t", dir=tmp_dir)
+
+    def add(self, row: typing.List[str]):
+        raw_details = row[self.idx["details"]]
+        if self.first_row is None:
+            self.first_row = list(row)
+            self.first_row[self.idx["details"]] = ""
+        clinvar_set = self.decode(raw_details)
+        for cv_assertion in clinvar_set.cv_assertions:
+            key = (cv_assertion.review_status, cv_assertion.pathogenicity)
+            self.profile[key] += 1
+            self.id_nos.setdefault(key, clinvar_set.id_no)
+        self.set_types.update(
+            genotype_set.set_type.lower()
+            for genotype_set in clinvar_set.ref_cv_assertion.genotype_sets
+        )
+        self.symbols.update(from_pg_list(row[self.idx["symbols"]]))
+        self.hgnc_ids.update(from_pg_list(row[self.idx["hgnc_ids"]]))
+
+        details = canonical_details(raw_details)
+        if self.verify:
+            verify_details(row[self.idx["vcv"]], "[" + details + "]", [raw_details])
+        if self.rows:
+            self._details.write(", ")
+        self._details.write(details)
+        self.rows += 1
+
+    def summary_fields(self) -> typing.Tuple[str, ...]:
+        rps = []
+        for key, count in self.profile.items():
+            rps += [CompactReviewedPathogenicity.from_labels(*key, self.id_nos[key])] * count
+        return rps_summary_fields(rps)
+
+    def write(self, clinvar_version, writer: TsvWriter):
+        """Write merged record to ``writer`` and remove the temporary file."""
+        fields = _record_fields(
+            clinvar_version,
+            self.first_row,
+            self.idx,
+            ",".join(sorted(self.set_types)),
+            self.symbols,
+            self.hgnc_ids,
+            self.summary_fields(),
+            "[",
+        )
+        self._details.seek(0)
+        if isinstance(writer, SummaryWriter):
+            writer.write_streamed(fields, self._details, "]")
+        else:
+            writer.flush()
+            writer.outfile.write("\t".join(fields))
+            shutil.copyfileobj(self._details, writer.outfile)
+            writer.outfile.write("]\n")
+        self.close()
+
+    def close(self):
+        self._details.close()
+
+
+class SummaryWriter:
+    """Write merged records to the ``TsvWriter`` ``writer`` with their details in ``store``.
+
+    Takes rows as in ``HEADER_OUT`` and writes them as in ``HEADER_SUMMARY``, replacing the
+    details by their offset in the ``DetailsStoreWriter`` ``store``.
+    """
+
+    def __init__(self, writer: TsvWriter, store: DetailsStoreWriter):
+        #: Writer of the summary table.
+        self.writer = writer
+        #: Writer of the details store.
+        self.store = store
+
+    def write(self, fields: typing.List[str]):
+        offset = self.store.write(fields[_IDX_VCV_OUT], fields[-1])
+        self.writer.write(fields[:-1] + [str(offset)])
+
+    def write_line(self, lines: str):
+        """Write one or more rows that have already been joined."""
+        for line in lines.split("\n"):
+            self.write(line.split("\t"))
+
+    def write_streamed(self, fields: typing.List[str], details_file, suffix: str):
+        """Write row whose details are ``fields[-1]``, the rest of ``details_file``, and ``suffix``."""
+        offset = self.store.write_file(fields[_IDX_VCV_OUT], fields[-1], details_file, suffix)
+        self.writer.write(fields[:-1] + [str(offset)])
+
+    def flush(self):
+        self.writer.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+
+def split_details(
+    input_path, output_path, details_store, threads=1, gene_index=None, mem_profiler=None
+):
+    """Split the merged TSV file at ``input_path`` into a summary table and details store.
+
+    The summary table is written to ``output_path`` and the store to ``details_store``,
+    paths ending in ``.gz`` are written as BGZF.  If ``gene_index`` is given, the gene index
+    of the summary table is written to this path, which requires BGZF.  Each record is
+    registered with ``mem_profiler``, if any.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    with contextlib.ExitStack() as stack:
+        reader = TsvReader(stack.enter_context(open_maybe_gzip(input_path, "rt")))
+        store = stack.enter_context(DetailsStoreWriter(details_store, threads))
+        outputf = stack.enter_context(open_output(output_path, threads))
+        if gene_index:
+            outputf = gene_writer = GeneIndexWriter(outputf)
+        writer = SummaryWriter(stack.enter_context(TsvWriter(outputf, HEADER_SUMMARY)), store)
+        for fields in reader:
+            writer.write(fields)
+            mem_profiler.tick()
+    if gene_index:
+        write_gene_index(gene_writer.offsets, gene_index)
+
+
+def merge_and_write(clinvar_version, rows, chunk, writer, idx, verify=False, cache=None):
+    """Write merged record for the input ``rows`` of one VCV with ``merge_group()``."""
+    writer.write(merge_group(clinvar_version, rows, chunk, idx, verify, cache))
+
+
+#: The ``SummaryCache`` of a worker process, kept between batches.
+_worker_cache: typing.Optional[SummaryCache] = None
+
+
+def _merge_batch(
+    clinvar_version, idx, details_decoding, verify, groups, cache=None
+) -> typing.Tuple[str, int, int]:
+    """Merge ``groups`` of rows, return the joined output lines and the cache hits and misses.
+
+    Uses the worker's ``SummaryCache`` if ``cache`` is not given.
+    """
+    global _worker_cache
+    if cache is None:
+        if _worker_cache is None:
+            _worker_cache = SummaryCache()
+        cache = _worker_cache
+    hits, misses = cache.hits, cache.misses
+    decode = get_decoder(details_decoding)
+    idx_details = idx["details"]
+    lines = "\n".join(
         "\t".join(
-            [
-                vals["release"],
-                vals["chromosome"],
-                vals["start"],
-                vals["end"],
-                vals["bin"],
-                vals["reference"],
-                vals["alternative"],
+            merge_group(
                 clinvar_version,
-                set_type,
-                vals["variation_type"],
-                as_pg_list(sorted(set(symbols))),
-                as_pg_list(sorted(set(hgnc_ids))),
-                vals["vcv"],
-                clinvar_summary.review_status_label(),
-                clinvar_summary.pathogenicity_label(),
-                as_pg_list(clinvar_summary.pathogenicity_list(all_on_conflicts=False)),
-                str(clinvar_summary.gold_stars()),
-                paranoid_summary.review_status_label(),
-                paranoid_summary.pathogenicity_label(),
-                as_pg_list(paranoid_summary.pathogenicity_list(all_on_conflicts=True)),
-                str(paranoid_summary.gold_stars()),
-                json.dumps([cattr.unstructure(entry) for entry in chunk], cls=DateTimeEncoder)
-                .replace(r"\"", "'")
-                .replace('"', '"""'),
-            ]
-        ),
-        file=out_tsv,
+                rows,
+                [decode(row[idx_details]) for row in rows],
+                idx,
+                verify,
+                cache,
+            )
+        )
+        for rows in groups
     )
+    return lines, cache.hits - hits, cache.misses - misses
 
 
-def merge_tsvs(clinvar_version, in_tsv, out_tsv):
-    header_in = in_tsv.readline().strip().split("\t")
-    print("\t".join(HEADER_OUT), file=out_tsv)
-
-    prev_vals = None
-    chunk = []
-    valss = []
-    while True:
-        line = in_tsv.readline().strip().replace('"""', '"')
-        if not line:
-            break
-        vals = dict(zip(header_in, line.split("\t")))
-        # if vals["vcv"] not in ("VCV000210112", "VCV000243036"):
-        #     continue
-        if prev_vals and vals["vcv"] != prev_vals["vcv"]:  # write chunk and start new one
-            merge_and_write(clinvar_version, valss, chunk, out_tsv)
-            chunk = []
-            valss = []
-        prev_vals = vals
-        obj = json.loads(vals["details"])
-        chunk.append(cattr.structure(obj, ClinVarSet))
-        valss.append(vals)
-    if prev_vals:  # write final chunk
-        merge_and_write(clinvar_version, valss, chunk, out_tsv)
+#: Handling of input rows that are not sorted, see ``merge_tsvs()``.
+ON_UNSORTED_CHOICES = ("error", "warn", "ignore")
+
+
+#: Default number of input rows in one batch of groups sent to a worker.
+DEFAULT_BATCH_ROWS = 1000
+
+#: Default bound of the (estimated) size in MB of the batches in flight.
+DEFAULT_MAX_INFLIGHT_MB = 256
+
+#: Default size in MB of a group above which it is streamed with ``StreamedGroup``.
+DEFAULT_MAX_GROUP_MB = 64
+
+#: Estimated per-row size in bytes of the fields other than the details.
+ROW_OVERHEAD = 500
+
+
+def _group_size(rows, idx_details: int) -> int:
+    return sum(len(row[idx_details]) + ROW_OVERHEAD for row in rows)
+
+
+def merge_tsvs(
+    clinvar_version,
+    in_tsv,
+    out_tsv,
+    mem_profiler=None,
+    on_unsorted="error",
+    details_decoding="full",
+    verify=False,
+    workers=1,
+    batch_rows=DEFAULT_BATCH_ROWS,
+    max_inflight_mb=DEFAULT_MAX_INFLIGHT_MB,
+    max_group_mb=DEFAULT_MAX_GROUP_MB,
+    tmp_dir=None,
+    group_by=("vcv",),
+    details_store=None,
+    gene_index=None,
+):
+    """Merge the rows of ``in_tsv`` with the same VCV and write them to ``out_tsv``.
+
+    With ``details_decoding="partial"``, only the fields of the details needed for the
+    summaries are decoded.  The details are written out as they were read, if ``verify`` then
+    they are checked against the former decoding and encoding with ``verify_details()``.
+
+    Rows with the same VCV must be adjacent which is checked by requiring ``in_tsv`` to be
+    sorted by chromosome, start, end, and VCV.  Adjacent rows that are equal in the
+    ``group_by`` columns form one record.  Depending on ``on_unsorted``, the first row out
+    of order raises a ``ClinvarTsvException``, violations are logged as a warning, or the order
+    is not checked.
+
+    With ``workers > 1``, batches of groups with about ``batch_rows`` rows are merged in a
+    process pool and written out in input order.  Batches in flight are bounded to about
+    ``max_inflight_mb`` megabytes, groups larger than this are merged in this process after
+    the batches in flight have been written.
+
+    Groups larger than ``max_group_mb`` megabytes are aggregated with a ``StreamedGroup``
+    that keeps their details in a temporary file in ``tmp_dir`` rather than in memory.
+
+    If ``details_store`` is given, the summary table with ``HEADER_SUMMARY`` is written to
+    ``out_tsv`` and the details are written to a ``DetailsStoreWriter`` at this path.
+
+    If ``gene_index`` is given, the gene index is written to this path (BGZF output only).
+
+    Returns a ``dict`` with the number of records read and written, the number of streamed
+    groups, the number of genes if indexed, and the statistics of the ``SummaryCache``.  In the
+    worker processes, the caches are kept across batches and the reported size is that of the
+    cache of this process.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    reader = TsvReader(in_tsv)
+    idx = {column: reader.index(column) for column in INPUT_COLUMNS}
+    idx_details = idx["details"]
+    decode = get_decoder(details_decoding)
+    if on_unsorted == "ignore":
+        checker = None
+    else:
+        checker = OrderChecker(
+            getattr(in_tsv, "name", "<input>"),
+            [idx[column] for column in ("chromosome", "start", "end", "vcv")],
+        )
+
+    groups = _read_groups(
+        reader,
+        idx,
+        operator.itemgetter(*(idx[column] for column in group_by)),
+        checker,
+        on_unsorted,
+        mem_profiler,
+        max_group_mb * 1024 * 1024,
+        lambda: StreamedGroup(idx, decode, tmp_dir, verify),
+    )
+    cache = SummaryCache()
+    metrics = {"records_read": 0, "records_written": 0, "streamed_groups": 0}
+    worker_hits_misses = [0, 0]
+    if gene_index:
+        out_tsv = gene_writer = GeneIndexWriter(out_tsv)
+
+    def write_streamed(group: StreamedGroup):
+        group.write(clinvar_version, writer)
+        metrics["records_read"] += group.rows
+        metrics["records_written"] += 1
+        metrics["streamed_groups"] += 1
+
+    with contextlib.ExitStack() as stack:
+        if details_store:
+            store = stack.enter_context(DetailsStoreWriter(details_store))
+            writer = SummaryWriter(stack.enter_context(TsvWriter(out_tsv, HEADER_SUMMARY)), store)
+        else:
+            writer = stack.enter_context(TsvWriter(out_tsv, HEADER_OUT))
+        if workers <= 1:
+            for rows in groups:
+                if isinstance(rows, StreamedGroup):
+                    write_streamed(rows)
+                    continue
+                chunk = [decode(row[idx_details]) for row in rows]
+                merge_and_write(clinvar_version, rows, chunk, writer, idx, verify, cache)
+                metrics["records_read"] += len(rows)
+                metrics["records_written"] += 1
+        else:
+
+            def on_result(result):
+                lines, hits, misses = result
+                writer.write_line(lines)
+                worker_hits_misses[0] += hits
+                worker_hits_misses[1] += misses
+
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                max_inflight_bytes = max_inflight_mb * 1024 * 1024
+                pool = OrderedPool(executor, on_result, max_inflight_bytes, 2 * workers)
+                args = (clinvar_version, idx, details_decoding, verify)
+                batch, batch_len, batch_size = [], 0, 0
+                for rows in groups:
+                    streamed = isinstance(rows, StreamedGroup)
+                    size = max_inflight_bytes + 1 if streamed else _group_size(rows, idx_details)
+                    if batch and (batch_len + len(rows) > batch_rows or size > max_inflight_bytes):
+                        pool.submit(batch_size, _merge_batch, *args, batch)
+                        batch, batch_len, batch_size = [], 0, 0
+                    if size > max_inflight_bytes:
+                        pool.drain()
+                    if streamed:
+                        write_streamed(rows)
+                        continue
+                    metrics["records_read"] += len(rows)
+                    metrics["records_written"] += 1
+                    if size > max_inflight_bytes:
+                        writer.write_line(_merge_batch(*args, [rows], cache)[0])
+                    else:
+                        batch.append(rows)
+                        batch_len += len(rows)
+                        batch_size += size
+                if batch:
+                    pool.submit(batch_size, _merge_batch, *args, batch)
+                pool.drain()
+    if checker and checker.violations:
+        logger.warning("%s", checker.message())
+    if gene_index:
+        metrics["genes"] = write_gene_index(gene_writer.offsets, gene_index)
+
+    cache.hits += worker_hits_misses[0]
+    cache.misses += worker_hits_misses[1]
+    metrics["summary_cache"] = cache.metrics()
+    logger.info(
+        "Summary cache: %d hits, %d misses (hit rate %.1f%%)",
+        cache.hits,
+        cache.misses,
+        100.0 * metrics["summary_cache"]["hit_rate"],
+    )
+    return metrics
+
+
+def _read_groups(
+    reader, idx, group_key, checker, on_unsorted, mem_profiler, max_group_bytes, new_streamed_group
+):
+    """Yield lists of adjacent rows from ``reader`` with the same ``group_key()``.
+
+    Once the rows of a group take more than ``max_group_bytes`` (estimated), they are moved
+    into a ``StreamedGroup`` from ``new_streamed_group()`` that is yielded instead.
+    """
+    idx_details = idx["details"]
+    rows, size, streamed, key = [], 0, None, None
+    for lineno, row in enumerate(reader, 2):
+        if checker and not checker.check(row, lineno) and checker.violations == 1:
+            if on_unsorted == "error":
+                raise ClinvarTsvException(checker.message())
+            logger.warning("Input is not sorted, records may be split: %s", checker.message())
+        row_key = group_key(row)
+        if row_key != key and (rows or streamed):  # yield group, start new one
+            yield streamed or rows
+            rows, size, streamed = [], 0, None
+        key = row_key
+        mem_profiler.tick()
+        if streamed:
+            streamed.add(row)
+            continue
+        rows.append(row)
+        size += len(row[idx_details]) + ROW_OVERHEAD
+        if size > max_group_bytes:
+            streamed = new_streamed_group()
+            for one_row in rows:
+                streamed.add(one_row)
+            rows = []
+    if rows or streamed:  # yield final group
+        yield streamed or rows
+
+
+#: Columns the rows of one record are equal in with ``merge_tsvs_partitioned()``.
+PARTITION_GROUP_BY = ("chromosome", "start", "end", "vcv")
+
+
+def partition_tsv(input_path, partitions, out_dir, mem_profiler=None) -> typing.List[str]:
+    """Split the rows of the TSV file at ``input_path`` into ``partitions`` files by VCV.
+
+    Rows go to partition ``crc32(vcv) % partitions`` such that all rows of a VCV end up in
+    the same file.  The files are written to ``out_dir`` with the header line, returns their
+    paths.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    paths = [os.path.join(out_dir, "partition.%d.tsv" % i) for i in range(partitions)]
+    with contextlib.ExitStack() as stack:
+        inputf = stack.enter_context(open_maybe_gzip(input_path, "rt"))
+        header = inputf.readline().rstrip("\n")
+        idx_vcv = header.split("\t").index("vcv")
+        outfiles = [stack.enter_context(open(path, "wt")) for path in paths]
+        writers = [stack.enter_context(TsvWriter(outfile, [header])) for outfile in outfiles]
+        for line in inputf:
+            if line == "\n":
+                continue
+            vcv = line.split("\t", idx_vcv + 1)[idx_vcv]
+            writers[zlib.crc32(vcv.encode("utf-8")) % partitions].write_line(line.rstrip("\n"))
+            mem_profiler.tick()
+    return paths
+
+
+def _merge_partition(
+    clinvar_version, details_decoding, verify, max_group_mb, tmp_dir, mem_profiler, path, out_path
+) -> typing.Dict[str, typing.Any]:
+    """Merge the rows of the partition at ``path`` into ``out_path`` in coordinate order.
+
+    The partition is read into memory, its rows are grouped by ``PARTITION_GROUP_BY`` and
+    written back to ``path`` sorted such that they can be merged with ``merge_tsvs()``.  Only
+    the groups are sorted, the rows of a group are ordered as by ``sort_tsv()``.  The merge is
+    profiled with ``mem_profiler``, that of the worker process if run in a process pool.
+    """
+    with mem_profiler:
+        with open(path, "rt") as inputf:
+            header = inputf.readline()
+            names = header.rstrip("\n").split("\t")
+            columns = [names.index(column) for column in PARTITION_GROUP_BY]
+            group_key = operator.itemgetter(*columns)
+            maxsplit = max(columns) + 1
+            groups: typing.Dict[typing.Tuple[str, ...], typing.List[str]] = {}
+            for line in inputf:
+                if line != "\n":
+                    groups.setdefault(group_key(line.split("\t", maxsplit)), []).append(line)
+        ordered = sorted(
+            (sorted(lines) for lines in groups.values()),
+            key=lambda lines: sort_key(lines[0], columns),
+        )
+        groups.clear()
+        with open(path, "wt") as outputf:
+            outputf.write(header)
+            for lines in ordered:
+                outputf.writelines(lines)
+        del ordered
+
+        with open(path, "rt") as inputf, open(out_path, "wt") as outputf:
+            return merge_tsvs(
+                clinvar_version,
+                inputf,
+                outputf,
+                mem_profiler=mem_profiler,
+                details_decoding=details_decoding,
+                verify=verify,
+                max_group_mb=max_group_mb,
+                tmp_dir=tmp_dir,
+                group_by=PARTITION_GROUP_BY,
+            )
+
+
+def merge_tsvs_partitioned(
+    clinvar_version,
+    input_path,
+    output_path,
+    partitions,
+    mem_profiler=None,
+    details_decoding="full",
+    verify=False,
+    workers=1,
+    max_group_mb=DEFAULT_MAX_GROUP_MB,
+    tmp_dir=None,
+    details_store=None,
+    gene_index=None,
+):
+    """Merge the rows of the TSV file at ``input_path`` that need not be sorted.
+
+    The rows are split into ``partitions`` temporary files in ``tmp_dir`` with
+    ``partition_tsv()``.  Each partition is then merged on its own, in a process pool if
+    ``workers > 1``, and the sorted merged partitions are merged into ``output_path`` with
+    ``merge_sorted()``, as BGZF if the path ends in ``.gz``.  Each worker keeps one partition
+    in memory, so ``partitions`` should be chosen such that ``workers`` partitions fit.  The
+    workers write their memory timelines to that of ``mem_profiler`` plus ``.partition.<i>``.
+
+    The output equals that of ``merge_tsvs()`` on the sorted input, except that rows of one
+    VCV at different positions always form separate records while ``merge_tsvs()`` merges them
+    if they happen to be adjacent.  With ``details_store``, the merged records are split with
+    ``split_details()``, and ``gene_index`` is as for ``merge_tsvs()``.  Returns the metrics of
+    ``merge_tsvs()`` summed over the partitions.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    with tempfile.TemporaryDirectory(prefix="clinvar_tsv.partitions.", dir=tmp_dir) as out_dir:
+        logger.info("Splitting %s into %d partitions", input_path, partitions)
+        paths = partition_tsv(input_path, partitions, out_dir, mem_profiler)
+        out_paths = [path[: -len(".tsv")] + ".merged.tsv" for path in paths]
+        merge_partition = functools.partial(
+            _merge_partition, clinvar_version, details_decoding, verify, max_group_mb, out_dir
+        )
+        logger.info("Merging %d partitions with %d workers", partitions, workers)
+        if workers <= 1:
+            results = [
+                merge_partition(mem_profiler, path, out_path)
+                for path, out_path in zip(paths, out_paths)
+            ]
+        else:
+            profilers = [mem_profiler.for_worker("partition.%d" % i) for i in range(partitions)]
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                results = list(executor.map(merge_partition, profilers, paths, out_paths))
+        if details_store:
+            merged_path = os.path.join(out_dir, "merged.tsv")
+            merge_sorted(
+                out_paths, merged_path, columns=OUTPUT_SORT_COLUMNS, mem_profiler=mem_profiler
+            )
+            split_details(
+                merged_path,
+                output_path,
+                details_store,
+                threads=workers,
+                gene_index=gene_index,
+                mem_profiler=mem_profiler,
+            )
+        elif gene_index:
+            with open_output(output_path, workers) as outputf:
+                gene_writer = GeneIndexWriter(outputf)
+                write_merged(out_paths, gene_writer, OUTPUT_SORT_COLUMNS, mem_profiler)
+            write_gene_index(gene_writer.offsets, gene_index)
+        else:
+            merge_sorted(
+                out_paths,
+                output_path,
+                threads=workers,
+                columns=OUTPUT_SORT_COLUMNS,
+                mem_profiler=mem_profiler,
+            )
+
+    metrics = {"partitions": partitions}
+    for key in ("records_read", "records_written", "streamed_groups"):
+        metrics[key] = sum(result[key] for result in results)
+    cache = SummaryCache()
+    for result in results:
+        cache.hits += result["summary_cache"]["hits"]
+        cache.misses += result["summary_cache"]["misses"]
+    metrics["summary_cache"] = cache.metrics()
+    metrics["summary_cache"]["size"] = sum(result["summary_cache"]["size"] for result in results)
+    return metrics
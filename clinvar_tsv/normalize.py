@@ -28,13 +28,16 @@ hyphens. For those situations, use this script (or just run vt normalize).
 Usage: normalize.py -R $b37ref < bad_file.txt > good_file.txt
 """
 
-import os
-import subprocess
 import sys
 
-import pysam
+import binning
+from logzero import logger
 import tqdm
 
+from clinvar_tsv.memprofile import MemoryProfiler
+from clinvar_tsv.reference import open_reference
+from clinvar_tsv.tsv import TsvReader, TsvWriter
+
 
 class RefEqualsAltError(Exception):
     """
@@ -72,9 +75,22 @@ class WrongRefError(Exception):
         return repr(self.value)
 
 
+class InvalidCoordinatesError(Exception):
+    """
+    An Error class for SVs whose coordinates cannot be placed on the reference genome
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
+
+
 def normalize(pysam_fasta, chrom, pos, ref, alt):
     """
-    Accepts a pysam FastaFile object pointing to the reference genome, and
+    Accepts a pysam FastaFile object (or one of the backends from
+    ``clinvar_tsv.reference``) pointing to the reference genome, and
     chrom, pos, ref, alt genomic coordinates, and normalizes them.
     """
     pos = int(pos)  # make sure position is an integer
@@ -139,81 +155,199 @@ def has_chr(s):
     return s.startswith("chr")
 
 
-def normalize_tab_delimited_file(infile, outfile, reference_fasta, verbose=True):
+def reference_chrom(chromosome, ref_chr_prefix):
+    """Normalize "chr" prefix of ``chromosome`` towards reference and fix M/MT."""
+    if ref_chr_prefix == has_chr(chromosome):
+        chrom = chromosome
+    elif ref_chr_prefix:
+        chrom = "chr%s" % chromosome
+    else:
+        chrom = chromosome[3:]
+    if ref_chr_prefix and chrom.endswith("MT"):
+        chrom = "chrM"
+    return chrom
+
+
+def open_reference_checked(reference_fasta):
+    """Open reference and return it together with whether it uses "chr" prefixes."""
+    pysam_fasta = open_reference(reference_fasta)  # FastaFile or memory-mapped backend
+    ref_chr_prefix = any(map(has_chr, pysam_fasta.references))
+    if ref_chr_prefix and not all(map(has_chr, pysam_fasta.references)):
+        logger.warning("Inconsistent chr prefix in FASTA file")
+    return pysam_fasta, ref_chr_prefix
+
+
+def normalize_sv(reference, chrom, start, end):
+    """
+    Canonicalize SV coordinates on ``reference``.
+
+    Start and end are swapped if necessary and clamped to ``[1, length]`` of the contig.
+    Only the contig length is used, no sequence is fetched.  Raises ``KeyError`` for unknown
+    contigs and ``InvalidCoordinatesError`` if the coordinates are not integers or the SV
+    lies completely beyond the end of the contig.
+    """
+    length = reference.get_reference_length(chrom)
+    try:
+        start, end = int(start), int(end)
+    except ValueError:
+        raise InvalidCoordinatesError(
+            "Invalid SV coordinates: %s %s %s" % (chrom, start, end)
+        ) from None
+    if start > end:
+        start, end = end, start
+    if start > length:
+        raise InvalidCoordinatesError(
+            "SV beyond end of contig: %s %s %s (length %d)" % (chrom, start, end, length)
+        )
+    return chrom, max(1, start), min(end, length)
+
+
+#: Reason code for records on unknown contigs.
+REASON_UNKNOWN_CONTIG = "unknown_contig"
+#: Reason code for records with REF == ALT.
+REASON_REF_EQUALS_ALT = "ref_equals_alt"
+#: Reason code for records where REF does not match the reference genome.
+REASON_WRONG_REF = "wrong_ref"
+#: Reason code for records with invalid nucleotides in REF or ALT.
+REASON_INVALID_NUCLEOTIDE = "invalid_nucleotide"
+
+#: Mapping from exception type raised by ``normalize()`` to rejection reason code.
+REJECT_REASONS = {
+    KeyError: REASON_UNKNOWN_CONTIG,
+    RefEqualsAltError: REASON_REF_EQUALS_ALT,
+    WrongRefError: REASON_WRONG_REF,
+    InvalidNucleotideSequenceError: REASON_INVALID_NUCLEOTIDE,
+}
+
+#: Reason code for SVs with invalid coordinates.
+REASON_INVALID_COORDINATES = "invalid_coordinates"
+
+#: Mapping from exception type raised by ``normalize_sv()`` to rejection reason code.
+SV_REJECT_REASONS = {
+    KeyError: REASON_UNKNOWN_CONTIG,
+    InvalidCoordinatesError: REASON_INVALID_COORDINATES,
+}
+
+#: Header prefix of the rejected variant sidecar file, followed by the input columns.
+REJECTED_HEADER = ("reason", "message")
+
+
+def normalize_tab_delimited_file(
+    infile, outfile, reference_fasta, verbose=True, rejected=None, mem_profiler=None
+):
     """
     This function takes a tab-delimited file with a header line containing columns
     named chrom, pos, ref, and alt, plus any other columns. It normalizes the
     chrom, pos, ref, and alt, and writes all columns out to another file.
+
+    Records that cannot be normalized are written to the ``rejected`` file, if any, with
+    the reason code and message prepended to the original row.  The progress display and
+    final summary are only shown if ``verbose``.
+
+    Each input record is registered with ``mem_profiler``, if any.
+
+    Returns ``dict`` with the number of written records and the rejection counts by reason.
     """
-    pysam_fasta = pysam.FastaFile(reference_fasta)  # create a pysam object of the reference genome
-    ref_chr_prefix = any(map(has_chr, pysam_fasta.references))
-    if ref_chr_prefix and not all(map(has_chr, pysam_fasta.references)):
-        sys.err.write("Warning: inconsistent chr prefix in FASTA file")
-    header = infile.readline()  # get header of input file
-    columns = header.strip("\n").split("\t")  # parse col names
-    outfile.write("\t".join(columns) + "\n")  # write header line plus the CpG col to be generated
+    mem_profiler = mem_profiler or MemoryProfiler()
+    pysam_fasta, ref_chr_prefix = open_reference_checked(reference_fasta)
+    reader = TsvReader(infile)
+    columns = reader.header
+    idx_chrom, idx_ref, idx_alt = map(reader.index, ("chromosome", "reference", "alternative"))
+    if "position" in columns:
+        idx_pos, idx_end = reader.index("position"), None
+    else:
+        idx_pos, idx_end = reader.index("start"), reader.index("end")
+    writer = TsvWriter(outfile, columns)
+    if rejected:
+        rejected.write("\t".join(REJECTED_HEADER + columns) + "\n")
     counter = 0
-    ref_equals_alt = 0
-    wrong_ref = 0
-    invalid_nucleotide = 0
-    unknown_contig = 0
+    rejected_counts = {reason: 0 for reason in REJECT_REASONS.values()}
     # Reduce the progress bar refresh rate if we're not in a TTY
     mininterval = 0.1 if sys.stdout.isatty() else 60
-    with tqdm.tqdm(unit="lines", mininterval=mininterval) as progress:
-        for line in infile:
-            data = dict(zip(columns, line.strip("\n").split("\t")))
-            # fill the data with blanks for any missing data
-            for column in columns:
-                if column not in data.keys():
-                    data[column] = ""
-            pos = int(data.get("position", data["start"]))
-            # Normalize "chr" prefix towards reference and fix M/MT
-            if ref_chr_prefix == has_chr(data["chromosome"]):
-                chrom = data["chromosome"]
-            elif ref_chr_prefix:
-                chrom = "chr%s" % data["chromosome"]
-            else:
-                chrom = data["chrom"][3:]
-            if ref_chr_prefix and chrom.endswith("MT"):
-                chrom = "chrM"
+    with tqdm.tqdm(unit="lines", mininterval=mininterval, disable=not verbose) as progress:
+        for row in reader:
+            chrom = reference_chrom(row[idx_chrom], ref_chr_prefix)
             # Perform normalization
             try:
-                _, pos, data["reference"], data["alternative"] = normalize(
-                    pysam_fasta, chrom, pos, data["reference"], data["alternative"]
+                _, pos, row[idx_ref], row[idx_alt] = normalize(
+                    pysam_fasta, chrom, int(row[idx_pos]), row[idx_ref], row[idx_alt]
                 )
-                if data["chromosome"].startswith("chr"):
-                    data["chromosome"] = data["chromosome"][3:]
-            except KeyError as e:
-                sys.stderr.write("\n" + str(e) + "\n")
-                unknown_contig += 1
-                continue
-            except RefEqualsAltError as e:
-                sys.stderr.write("\n" + str(e) + "\n")
-                ref_equals_alt += 1
+            except tuple(REJECT_REASONS) as e:
+                reason = REJECT_REASONS[type(e)]
+                rejected_counts[reason] += 1
+                if rejected:
+                    rejected.write("%s\t%s\t%s\n" % (reason, e.args[0], "\t".join(row)))
                 continue
-            except WrongRefError as e:
-                sys.stderr.write("\n" + str(e) + "\n")
-                wrong_ref += 1
-                continue
-            except InvalidNucleotideSequenceError as e:
-                sys.stderr.write("\n" + str(e) + "\n")
-                invalid_nucleotide += 1
-                continue
-            if "position" in columns:
-                data["position"] = str(pos)
-            else:
-                data["start"] = str(pos)
-                data["end"] = str(pos + len(data["reference"]) - 1)
-            outfile.write("\t".join([data[column] for column in columns]) + "\n")
+            finally:
+                progress.update()
+                mem_profiler.tick()
+            if row[idx_chrom].startswith("chr"):
+                row[idx_chrom] = row[idx_chrom][3:]
+            row[idx_pos] = str(pos)
+            if idx_end is not None:
+                row[idx_end] = str(pos + len(row[idx_ref]) - 1)
+            writer.write(row)
             counter += 1
-            if verbose and counter % 1000 == 0:
-                sys.stderr.write("\r%s records processed\n" % (counter))
-            if os.environ.get("DEBUG_MEM", "0") == "1" and counter % 10000 == 0:
-                subprocess.run(["free"])
-            progress.update()
+    writer.flush()
     outfile.write("\n\n")
     if verbose:
-        sys.stderr.write(
-            "Final counts of variants discarded:\nREF == ALT: %s\nWrong REF: %s\nInvalid nucleotide: %s\nUnknown contig: %s\n"
-            % (ref_equals_alt, wrong_ref, invalid_nucleotide, unknown_contig)
+        logger.info(
+            "Wrote %d records, discarded: %s",
+            counter,
+            ", ".join("%s=%d" % item for item in rejected_counts.items()),
+        )
+    return {"records_written": counter, "records_rejected": rejected_counts}
+
+
+def normalize_sv_tab_delimited_file(
+    infile, outfile, reference_fasta, verbose=True, rejected=None, mem_profiler=None
+):
+    """
+    Canonicalize the coordinates in the SV table from ``parse_xml`` with ``normalize_sv()``.
+
+    The "chr" prefix is removed from the chromosome and the UCSC bin is recomputed, all
+    other columns are passed through.  Rejected records, the progress display, and the
+    return value are handled as in ``normalize_tab_delimited_file()``.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    reference, ref_chr_prefix = open_reference_checked(reference_fasta)
+    reader = TsvReader(infile)
+    idx_chrom, idx_start, idx_end, idx_bin = map(
+        reader.index, ("chromosome", "start", "end", "bin")
+    )
+    writer = TsvWriter(outfile, reader.header)
+    if rejected:
+        rejected.write("\t".join(REJECTED_HEADER + reader.header) + "\n")
+    counter = 0
+    rejected_counts = {reason: 0 for reason in SV_REJECT_REASONS.values()}
+    # Reduce the progress bar refresh rate if we're not in a TTY
+    mininterval = 0.1 if sys.stdout.isatty() else 60
+    with tqdm.tqdm(unit="lines", mininterval=mininterval, disable=not verbose) as progress:
+        for row in reader:
+            chrom = reference_chrom(row[idx_chrom], ref_chr_prefix)
+            try:
+                _, start, end = normalize_sv(reference, chrom, row[idx_start], row[idx_end])
+            except tuple(SV_REJECT_REASONS) as e:
+                reason = SV_REJECT_REASONS[type(e)]
+                rejected_counts[reason] += 1
+                if rejected:
+                    rejected.write("%s\t%s\t%s\n" % (reason, e.args[0], "\t".join(row)))
+                continue
+            finally:
+                progress.update()
+                mem_profiler.tick()
+            if row[idx_chrom].startswith("chr"):
+                row[idx_chrom] = row[idx_chrom][3:]
+            row[idx_start] = str(start)
+            row[idx_end] = str(end)
+            row[idx_bin] = str(binning.assign_bin(start - 1, end))
+            writer.write(row)
+            counter += 1
+    writer.flush()
+    if verbose:
+        logger.info(
+            "Wrote %d SV records, discarded: %s",
+            counter,
+            ", ".join("%s=%d" % item for item in rejected_counts.items()),
         )
+    return {"records_written": counter, "records_rejected": rejected_counts}
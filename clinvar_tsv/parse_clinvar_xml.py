@@ -18,6 +18,7 @@ from logzero import logger
 import tqdm
 
 from clinvar_tsv.common import ClinVarSet, DateTimeEncoder, as_pg_list
+from clinvar_tsv.memprofile import MemoryProfiler
 
 TSV_HEADER = "\t".join(
     (
@@ -56,7 +57,14 @@ class ClinvarParser:
     """Helper class for parsing Clinvar XML"""
 
     def __init__(
-        self, input_file, out_b37_small, out_b37_sv, out_b38_small, out_b38_sv, max_rcvs=None
+        self,
+        input_file,
+        out_b37_small,
+        out_b37_sv,
+        out_b38_small,
+        out_b38_sv,
+        max_rcvs=None,
+        mem_profiler=None,
     ):
         #: ``file``-like object to load the XML from
         self.input = input_file
@@ -72,6 +80,8 @@ class ClinvarParser:
         self.rcvs = 0
         #: Largest number of rcvs to process out (for testing only)
         self.max_rcvs = max_rcvs
+        #: Memory profiler to notify of each processed RCV.
+        self.mem_profiler = mem_profiler or MemoryProfiler()
 
     def run(self):  # noqa: C901
         logger.info("Parsing elements...")
@@ -88,6 +98,7 @@ class ClinvarParser:
             for event, elem in ET.iterparse(self.input):
                 if elem.tag == "ClinVarSet" and event == "end":
                     self.rcvs += 1
+                    self.mem_profiler.tick()
                     clinvar_set = ClinVarSet.from_element(elem)
                     if clinvar_set.ref_cv_assertion.observed_in:
                         origin = clinvar_set.ref_cv_assertion.observed_in.origin
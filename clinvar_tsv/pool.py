@@ -0,0 +1,46 @@
+"""Ordered execution of batches in a process pool with bounded memory.
+
+``merge_tsvs`` and ``annotate`` split their input into batches that are processed by workers
+and written in input order; ``OrderedPool`` bounds the batches in flight by size and number.
+"""
+
+import collections
+import concurrent.futures
+import typing
+
+
+class OrderedPool:
+    """Run batches in a process pool and pass their results to ``on_result`` in order.
+
+    Submitting a batch first handles the oldest results until the batches in flight take
+    at most ``max_inflight_bytes`` and there are fewer than ``max_pending`` of them.
+    """
+
+    def __init__(self, executor, on_result, max_inflight_bytes: int, max_pending: int):
+        #: The ``concurrent.futures`` executor running the batches.
+        self.executor = executor
+        #: Function called with the result of each batch, in submission order.
+        self.on_result = on_result
+        #: Bound of the summed sizes of the batches in flight.
+        self.max_inflight_bytes = max_inflight_bytes
+        #: Bound of the number of batches in flight.
+        self.max_pending = max_pending
+        #: Futures and sizes of the batches in flight, oldest first.
+        self._pending: typing.Deque[
+            typing.Tuple[concurrent.futures.Future, int]
+        ] = collections.deque()
+        self._inflight_bytes = 0
+
+    def submit(self, size: int, func, *args):
+        self.drain(self.max_inflight_bytes - size, self.max_pending - 1)
+        self._pending.append((self.executor.submit(func, *args), size))
+        self._inflight_bytes += size
+
+    def drain(self, max_inflight_bytes: int = 0, max_pending: int = 0):
+        """Handle results until at most the given bytes and batches are in flight."""
+        while self._pending and (
+            self._inflight_bytes > max(max_inflight_bytes, 0) or len(self._pending) > max_pending
+        ):
+            future, size = self._pending.popleft()
+            self.on_result(future.result())
+            self._inflight_bytes -= size
@@ -0,0 +1,239 @@
+"""Queries of the bgzip-compressed and indexed merged ClinVar TSV files.
+
+``ClinVarReader`` opens a merged table together with its binning index, the ``.tbi`` file
+written by ``tabix`` or a ``.csi`` file.  Region and point lookups only read the chunks of the
+bins overlapping the query, and decompressed blocks are kept in an LRU cache, so lookups close
+to each other do not decompress the same blocks again.  Lookups by VCV and gene use an index
+of the virtual offsets of the records that is built by one pass over the file on first use.
+If the gene index written by ``merge_tsvs`` is next to the file, lookups by gene use it instead.
+
+``batch()`` looks up many variants at once.  The queries are sorted by position and dense runs
+of queries are answered in one linear pass over the records instead of seeking for each query.
+A query more than ``BATCH_SEEK_DISTANCE`` bp after the last record read seeks with the index.
+
+Records are returned as ``dict`` objects with the columns of the merged table as keys.
+"""
+
+import collections
+import os
+import typing
+
+from clinvar_tsv.bgzf import BgzfReader
+from clinvar_tsv.common import from_pg_list
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.gene_index import GENE_INDEX_SUFFIX, GeneIndex
+from clinvar_tsv.index import BinningIndex
+from clinvar_tsv.sort_tsv import natural_key
+
+#: Default number of decompressed blocks kept in memory (about 16MB).
+DEFAULT_CACHE_BLOCKS = 256
+
+#: Suffixes of the index files tried in order.
+INDEX_SUFFIXES = (".tbi", ".csi")
+
+#: Distance in bp to the next query of ``batch()`` from which the index is used to seek to it
+#: rather than reading all records in between.
+BATCH_SEEK_DISTANCE = 100_000
+
+#: End of the largest region that can be indexed.
+_MAX_POSITION = 1 << 29
+
+#: A query of ``batch()``: chromosome, 1-based position, reference, and alternative allele.
+Query = typing.Tuple[str, int, str, str]
+
+#: A record of the merged table.
+Record = typing.Dict[str, str]
+
+
+class ClinVarReader:
+    """Reader for the merged table at ``path``.
+
+    The index is read from ``index_path`` or else ``path`` plus one of ``INDEX_SUFFIXES``.  The
+    gene index is used if it exists at ``path`` plus ``GENE_INDEX_SUFFIX``.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        index_path: typing.Optional[str] = None,
+        cache_blocks: int = DEFAULT_CACHE_BLOCKS,
+    ):
+        #: Path to the merged table.
+        self.path = path
+        if index_path is None:
+            index_path = next(
+                (path + suffix for suffix in INDEX_SUFFIXES if os.path.exists(path + suffix)), None
+            )
+            if index_path is None:
+                raise ClinvarTsvException("No index for %s, create it with tabix" % path)
+        #: The binning index.
+        self.index = BinningIndex.load(index_path)
+        self._reader = BgzfReader.open(path, cache_blocks=cache_blocks)
+        #: The column names from the header.
+        self.header: typing.Tuple[str, ...] = tuple(self._readline())
+        self._idx_chrom, self._idx_start, self._idx_end, self._idx_ref, self._idx_alt = map(
+            self.header.index, ("chromosome", "start", "end", "reference", "alternative")
+        )
+        self._offsets: typing.Optional[typing.Dict[str, typing.Dict[str, typing.List[int]]]] = None
+        #: The gene index, if any.
+        self.gene_index: typing.Optional[GeneIndex] = None
+        if os.path.exists(path + GENE_INDEX_SUFFIX):
+            self.gene_index = GeneIndex(path + GENE_INDEX_SUFFIX, table_path=path)
+
+    def _readline(self) -> typing.List[str]:
+        return self._reader.readline().decode("utf-8").rstrip("\n").split("\t")
+
+    def _record(self, fields: typing.List[str]) -> Record:
+        return dict(zip(self.header, fields))
+
+    def _read_chunks(
+        self, chunks: typing.Iterable[typing.Tuple[int, int]]
+    ) -> typing.Iterator[typing.List[str]]:
+        reader = self._reader
+        for chunk_beg, chunk_end in chunks:
+            reader.seek(chunk_beg)
+            while reader.tell() < chunk_end:
+                line = reader.readline()
+                if not line:
+                    break
+                yield line.decode("utf-8").rstrip("\n").split("\t")
+
+    def region(self, chromosome: str, start: int, end: int) -> typing.Iterator[Record]:
+        """Yield records on ``chromosome`` overlapping the 1-based ``start`` to ``end``."""
+        for fields in self._read_chunks(self.index.chunks(chromosome, start - 1, end)):
+            if (
+                fields[self._idx_chrom] == chromosome
+                and int(fields[self._idx_start]) <= end
+                and int(fields[self._idx_end]) >= start
+            ):
+                yield self._record(fields)
+
+    def point(
+        self,
+        chromosome: str,
+        position: int,
+        reference: typing.Optional[str] = None,
+        alternative: typing.Optional[str] = None,
+    ) -> typing.List[Record]:
+        """Return records starting at ``position``, with the given alleles if any."""
+        return [
+            record
+            for record in self.region(chromosome, position, position)
+            if int(record["start"]) == position
+            and reference in (None, record["reference"])
+            and alternative in (None, record["alternative"])
+        ]
+
+    def batch(self, queries: typing.Sequence[Query]) -> typing.List[typing.List[Record]]:
+        """Return records of each of ``queries`` in the order of the queries.
+
+        The records between queries of the same chromosome are read rather than seeking with the
+        index, unless the next query is more than ``BATCH_SEEK_DISTANCE`` bp ahead.
+        """
+        result: typing.List[typing.List[Record]] = [[] for _ in queries]
+        by_chrom = collections.defaultdict(list)
+        for i, (chromosome, position, _, _) in enumerate(queries):
+            by_chrom[chromosome].append((position, i))
+        for chromosome in sorted(by_chrom, key=natural_key):
+            records: typing.Iterator[typing.List[str]] = iter(())
+            fields: typing.Optional[typing.List[str]] = None
+            current, at_position = None, []
+            for position, i in sorted(by_chrom[chromosome]):
+                if current is None or (
+                    fields is not None
+                    and position - int(fields[self._idx_start]) > BATCH_SEEK_DISTANCE
+                ):
+                    records = self.stream(chromosome, position)
+                    fields = next(records, None)
+                if position != current:
+                    while fields is not None and int(fields[self._idx_start]) < position:
+                        fields = next(records, None)
+                    at_position = []
+                    while fields is not None and int(fields[self._idx_start]) == position:
+                        at_position.append(fields)
+                        fields = next(records, None)
+                    current = position
+                _, _, reference, alternative = queries[i]
+                result[i] = [
+                    self._record(fields)
+                    for fields in at_position
+                    if fields[self._idx_ref] == reference and fields[self._idx_alt] == alternative
+                ]
+        return result
+
+    def stream(self, chromosome: str, position: int) -> typing.Iterator[typing.List[str]]:
+        """Yield fields of the records on ``chromosome`` in file order.
+
+        Reading starts at the first chunk with records overlapping ``position`` or after, so
+        some records before ``position`` may be yielded.  Other reads of this reader must not
+        be interleaved with iterating.
+        """
+        chunks = self.index.chunks(chromosome, position - 1, _MAX_POSITION)
+        if not chunks:
+            return
+        self._reader.seek(chunks[0][0])
+        while True:
+            line = self._reader.readline()
+            if not line:
+                break
+            fields = line.decode("utf-8").rstrip("\n").split("\t")
+            if fields[self._idx_chrom] != chromosome:
+                break
+            yield fields
+
+    @property
+    def offsets(self) -> typing.Dict[str, typing.Dict[str, typing.List[int]]]:
+        """Virtual offsets of the records by VCV (``"vcv"``) and gene (``"gene"``).
+
+        The offsets by gene are left empty if the gene index is used.
+        """
+        if self._offsets is None:
+            idx_vcv, idx_symbols, idx_hgnc_ids = map(
+                self.header.index, ("vcv", "symbols", "hgnc_ids")
+            )
+            by_vcv, by_gene = collections.defaultdict(list), collections.defaultdict(list)
+            self._reader.seek(0)
+            self._reader.readline()
+            while True:
+                offset = self._reader.tell()
+                line = self._reader.readline()
+                if not line:
+                    break
+                fields = line.decode("utf-8").rstrip("\n").split("\t")
+                by_vcv[fields[idx_vcv]].append(offset)
+                if self.gene_index is not None:
+                    continue
+                for column in (idx_symbols, idx_hgnc_ids):
+                    if fields[column]:
+                        for gene in from_pg_list(fields[column]):
+                            by_gene[gene].append(offset)
+            self._offsets = {"vcv": dict(by_vcv), "gene": dict(by_gene)}
+        return self._offsets
+
+    def _read_offsets(self, offsets: typing.Iterable[int]) -> typing.List[Record]:
+        result = []
+        for offset in offsets:
+            self._reader.seek(offset)
+            result.append(self._record(self._readline()))
+        return result
+
+    def by_vcv(self, vcv: str) -> typing.List[Record]:
+        """Return records of ``vcv``."""
+        return self._read_offsets(self.offsets["vcv"].get(vcv, ()))
+
+    def by_gene(self, gene: str) -> typing.List[Record]:
+        """Return records of the gene with the symbol or HGNC ID ``gene``."""
+        if self.gene_index is not None:
+            return self._read_offsets(self.gene_index.offsets(gene))
+        return self._read_offsets(self.offsets["gene"].get(gene, ()))
+
+    def close(self):
+        if self.gene_index is not None:
+            self.gene_index.close()
+        self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,263 @@
+"""Reference sequence backends for normalization.
+
+``normalize`` only needs ``fetch()``, ``references`` and ``get_reference_length()`` from the
+reference, which is the subset of the ``pysam.FastaFile`` interface implemented by the classes
+in this module.  Besides ``pysam.FastaFile`` itself, the following backends are available.
+
+- ``MmapReference`` -- uncompressed sequence store with one contiguous byte range for each
+  contig.  Build it once from the FASTA file with ``build_mmap_reference()`` (or
+  ``clinvar_tsv build_reference``).
+- ``TwoBitReference`` -- UCSC 2bit files as created by ``faToTwoBit``.
+
+Both backends memory-map their file read-only such that a fetch is a slice of the mapping.
+There is no system call or decompression per fetch, and all processes working on the same
+file share the pages through the OS page cache.
+
+Use ``open_reference()`` for picking the backend based on the file name.
+"""
+
+import array
+import bisect
+import mmap
+import os
+import struct
+import typing
+
+import pysam
+
+from clinvar_tsv.common import open_maybe_gzip
+
+#: File name suffix of the memory-mapped sequence store.
+MMAP_SUFFIX = ".mmseq"
+
+#: Suffix of the contig index that goes along with the memory-mapped sequence store.
+MMAP_INDEX_SUFFIX = ".idx"
+
+#: Magic number at the start of 2bit files.
+TWOBIT_MAGIC = 0x1A412743
+
+#: Decoding of a single byte of packed 2bit sequence into four bases.
+_TWOBIT_BYTES = tuple(
+    "".join("TCAG"[(byte >> shift) & 3] for shift in (6, 4, 2, 0)) for byte in range(256)
+)
+
+
+class MmapReference:
+    """Reference backed by a memory-mapped, uncompressed sequence store."""
+
+    def __init__(self, path: str):
+        #: Path to the sequence store.
+        self.filename = path
+        #: Mapping from contig name to ``(offset, length)`` in the sequence store.
+        self._contigs: typing.Dict[str, typing.Tuple[int, int]] = {}
+        with open(path + MMAP_INDEX_SUFFIX, "rt") as inputf:
+            for line in inputf:
+                name, length, offset = line.rstrip("\n").split("\t")
+                self._contigs[name] = (int(offset), int(length))
+        self._file = open(path, "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:  # pragma: no cover
+            self._mm = b""
+
+    @property
+    def references(self) -> typing.Tuple[str, ...]:
+        return tuple(self._contigs)
+
+    @property
+    def lengths(self) -> typing.Tuple[int, ...]:
+        return tuple(length for _, length in self._contigs.values())
+
+    def get_reference_length(self, reference: str) -> int:
+        if reference not in self._contigs:
+            raise KeyError("sequence '%s' not present" % reference)
+        return self._contigs[reference][1]
+
+    def fetch(self, reference: str, start: int = 0, end: typing.Optional[int] = None) -> str:
+        """Return sequence of ``reference`` from 0-based ``start`` to ``end`` (exclusive)."""
+        if reference not in self._contigs:
+            raise KeyError("sequence '%s' not present" % reference)
+        offset, length = self._contigs[reference]
+        start, end = _clamp_region(start, end, length)
+        return self._mm[offset + start : offset + end].decode("ascii")
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _TwoBitRecord:
+    """Header of one sequence in a 2bit file, loaded on first access."""
+
+    def __init__(self, mm, offset: int, byte_order: str):
+        header = struct.Struct(byte_order + "2I")
+        #: Number of bases in the sequence.
+        self.length, n_block_count = header.unpack_from(mm, offset)
+        offset += header.size
+        self.n_starts, offset = _read_uint32s(mm, offset, n_block_count, byte_order)
+        n_sizes, offset = _read_uint32s(mm, offset, n_block_count, byte_order)
+        #: End positions of the N blocks.
+        self.n_ends = array.array("I", map(sum, zip(self.n_starts, n_sizes)))
+        (mask_block_count,) = struct.unpack_from(byte_order + "I", mm, offset)
+        offset += 4
+        self.mask_starts, offset = _read_uint32s(mm, offset, mask_block_count, byte_order)
+        mask_sizes, offset = _read_uint32s(mm, offset, mask_block_count, byte_order)
+        #: End positions of the soft-masked blocks.
+        self.mask_ends = array.array("I", map(sum, zip(self.mask_starts, mask_sizes)))
+        #: Offset of the packed DNA (after the reserved word).
+        self.dna_offset = offset + 4
+
+
+def _read_uint32s(mm, offset: int, count: int, byte_order: str):
+    values = array.array("I", struct.unpack_from("%s%dI" % (byte_order, count), mm, offset))
+    return values, offset + 4 * count
+
+
+def _overlapping_blocks(starts, ends, start: int, end: int):
+    """Yield ``(start, end)`` of the sorted, non-overlapping blocks overlapping the region."""
+    i = max(0, bisect.bisect_right(starts, start) - 1)
+    while i < len(starts) and starts[i] < end:
+        if ends[i] > start:
+            yield max(starts[i], start), min(ends[i], end)
+        i += 1
+
+
+class TwoBitReference:
+    """Reference backed by a memory-mapped UCSC 2bit file."""
+
+    def __init__(self, path: str):
+        #: Path to the 2bit file.
+        self.filename = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        for byte_order in "<>":
+            magic, version, seq_count, _ = struct.unpack_from(byte_order + "4I", self._mm, 0)
+            if magic == TWOBIT_MAGIC:
+                break
+        else:
+            raise ValueError("Not a 2bit file: %s" % path)
+        if version not in (0, 1):
+            raise ValueError("Unsupported 2bit version %d in %s" % (version, path))
+        offset_fmt = byte_order + ("Q" if version == 1 else "I")
+        #: Mapping from contig name to offset of the sequence record.
+        self._offsets: typing.Dict[str, int] = {}
+        #: Loaded sequence records.
+        self._records: typing.Dict[str, _TwoBitRecord] = {}
+        pos = 16
+        for _ in range(seq_count):
+            name_size = self._mm[pos]
+            name = self._mm[pos + 1 : pos + 1 + name_size].decode("ascii")
+            pos += 1 + name_size
+            (self._offsets[name],) = struct.unpack_from(offset_fmt, self._mm, pos)
+            pos += struct.calcsize(offset_fmt)
+        self._byte_order = byte_order
+
+    def _record(self, reference: str) -> _TwoBitRecord:
+        record = self._records.get(reference)
+        if record is None:
+            if reference not in self._offsets:
+                raise KeyError("sequence '%s' not present" % reference)
+            record = _TwoBitRecord(self._mm, self._offsets[reference], self._byte_order)
+            self._records[reference] = record
+        return record
+
+    @property
+    def references(self) -> typing.Tuple[str, ...]:
+        return tuple(self._offsets)
+
+    @property
+    def lengths(self) -> typing.Tuple[int, ...]:
+        return tuple(self._record(name).length for name in self._offsets)
+
+    def get_reference_length(self, reference: str) -> int:
+        return self._record(reference).length
+
+    def fetch(self, reference: str, start: int = 0, end: typing.Optional[int] = None) -> str:
+        """Return sequence of ``reference`` from 0-based ``start`` to ``end`` (exclusive)."""
+        record = self._record(reference)
+        start, end = _clamp_region(start, end, record.length)
+        if start == end:
+            return ""
+        packed = self._mm[record.dna_offset + start // 4 : record.dna_offset + (end + 3) // 4]
+        seq = "".join(map(_TWOBIT_BYTES.__getitem__, packed))[start % 4 : start % 4 + end - start]
+        for block_start, block_end in _overlapping_blocks(
+            record.n_starts, record.n_ends, start, end
+        ):
+            seq = (
+                seq[: block_start - start]
+                + "N" * (block_end - block_start)
+                + seq[block_end - start :]
+            )
+        for block_start, block_end in _overlapping_blocks(
+            record.mask_starts, record.mask_ends, start, end
+        ):
+            seq = (
+                seq[: block_start - start]
+                + seq[block_start - start : block_end - start].lower()
+                + seq[block_end - start :]
+            )
+        return seq
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _clamp_region(start: int, end: typing.Optional[int], length: int) -> typing.Tuple[int, int]:
+    """Clamp region to ``[0, length)`` the way ``pysam.FastaFile.fetch()`` does."""
+    if start < 0:
+        raise ValueError("start out of range (%d)" % start)
+    if end is None or end > length:
+        end = length
+    if start > end:
+        if start >= length:
+            return length, length
+        raise ValueError("invalid coordinates: start (%d) > stop (%d)" % (start, end))
+    return start, end
+
+
+def build_mmap_reference(fasta_path: str, output_path: str):
+    """Write the sequence store for ``MmapReference`` from the (optionally gzipped) FASTA file.
+
+    Sequence is written as-is, i.e., soft-masking is kept as for ``pysam.FastaFile``.
+    """
+    contigs = []  # (name, offset) of each contig
+    offset = 0
+    with open(output_path, "wb") as outputf, open_maybe_gzip(fasta_path, "rt") as inputf:
+        for line in inputf:
+            if line.startswith(">"):
+                contigs.append((line[1:].split()[0], offset))
+            else:
+                chunk = line.rstrip().encode("ascii")
+                outputf.write(chunk)
+                offset += len(chunk)
+    with open(output_path + MMAP_INDEX_SUFFIX, "wt") as output_idx:
+        for (name, start), (_, end) in zip(contigs, contigs[1:] + [(None, offset)]):
+            print("%s\t%d\t%d" % (name, end - start, start), file=output_idx)
+
+
+def open_reference(path: str):
+    """Open reference at ``path``, choosing the backend by file name.
+
+    ``*.2bit`` files are opened with ``TwoBitReference``, ``*.mmseq`` files with
+    ``MmapReference``, and anything else with ``pysam.FastaFile``.
+    """
+    if path.endswith(".2bit"):
+        return TwoBitReference(path)
+    elif path.endswith(MMAP_SUFFIX):
+        return MmapReference(path)
+    else:
+        return pysam.FastaFile(path)
@@ -0,0 +1,427 @@
+"""HTTP lookup service for the bgzip-compressed and indexed merged tables.
+
+``LookupServer`` answers batched queries by position and alleles, VCV, and gene with JSON.  It
+uses ``asyncio`` for the connections and only the standard library, so it is started with
+``clinvar_tsv serve`` without further dependencies.  The endpoints are:
+
+- ``POST /query`` with a JSON object with the optional lists ``variants`` (objects with
+  ``chromosome``, ``position``, and optionally ``reference``, ``alternative``, and
+  ``release``), ``vcvs``, and ``genes`` (symbols or HGNC IDs).  The answer has the same keys
+  with one list of records per query, in the order of the queries.
+- ``GET /status`` with the loaded files, the generation of the snapshot, and cache counters.
+- ``POST /reload`` for reloading the files now.
+
+The files are opened as a ``Snapshot`` with ``ClinVarReader`` objects, whose VCV offsets are
+built on loading by reading the whole table, so loading takes time linear in the size of the
+tables.  The gene offsets are read from the gene index next to a table if it exists and are
+built in the same pass otherwise.  Reloading builds a new snapshot next to the current one and
+then swaps the two at once, so queries never see a half-loaded release.  Reloads are triggered
+by ``SIGHUP``, ``POST /reload``, or when the modification times or sizes of the files or their
+(gene) indexes changed and stayed the same for two polls of ``reload_interval`` seconds, i.e., the
+new weekly release has been written completely.  Replace the files with ``mv`` rather than
+writing them in place, as the previous snapshot keeps reading the old files until it is closed.
+
+The readers are only used from one worker thread, so the event loop stays responsive while
+records are read.  Answers to single queries are kept in an LRU cache that is cleared on swaps.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import http
+import json
+import os
+import signal
+import time
+import typing
+import urllib.parse
+
+from logzero import logger
+
+from clinvar_tsv.common import COLUMN_TYPES, from_pg_list
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.gene_index import GENE_INDEX_SUFFIX
+from clinvar_tsv.query import INDEX_SUFFIXES, ClinVarReader
+
+#: Default address to listen on.
+DEFAULT_HOST = "127.0.0.1"
+
+#: Default port to listen on.
+DEFAULT_PORT = 8080
+
+#: Default number of answers to single queries kept in the cache.
+DEFAULT_CACHE_SIZE = 100_000
+
+#: Default interval in seconds between checks for changed files, 0 to disable.
+DEFAULT_RELOAD_INTERVAL = 60.0
+
+#: Largest size of a request body in bytes.
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+#: Largest number of queries in one request.
+MAX_QUERIES = 100_000
+
+#: Key of the cache: kind of query and its arguments.
+CacheKey = typing.Tuple[typing.Any, ...]
+
+
+class RequestError(ClinvarTsvException):
+    """Raised for invalid requests, answered with ``status``."""
+
+    def __init__(self, message: str, status: http.HTTPStatus = http.HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        #: HTTP status of the answer.
+        self.status = status
+
+
+def file_signature(paths: typing.Iterable[str]) -> typing.Tuple[typing.Tuple[str, int, int], ...]:
+    """Return modification time and size of the files at ``paths`` and their (gene) indexes."""
+    result = []
+    for path in paths:
+        suffixes = INDEX_SUFFIXES + (GENE_INDEX_SUFFIX,)
+        for name in [path] + [path + suffix for suffix in suffixes]:
+            if os.path.exists(name):
+                stat = os.stat(name)
+                result.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(result)
+
+
+def json_record(record: typing.Dict[str, str]) -> typing.Dict[str, typing.Any]:
+    """Return record of the merged table with typed values for JSON."""
+    result: typing.Dict[str, typing.Any] = {}
+    for column, value in record.items():
+        kind = COLUMN_TYPES.get(column, "string")
+        if column == "details":
+            result[column] = json.loads(value.replace('"""', '"')) if value else None
+        elif kind == "list":
+            result[column] = from_pg_list(value) if value else []
+        elif kind.startswith("int"):
+            result[column] = int(value) if value else None
+        else:
+            result[column] = value
+    return result
+
+
+class Snapshot:
+    """Readers of the merged tables at ``paths`` as of loading."""
+
+    def __init__(self, paths: typing.Sequence[str], generation: int):
+        #: Paths to the merged tables.
+        self.paths = tuple(paths)
+        #: Number of the snapshot, counting from 1.
+        self.generation = generation
+        #: Signature of the files at loading, see ``file_signature()``.
+        self.signature = file_signature(paths)
+        #: Time of loading.
+        self.loaded = time.time()
+        self.readers: typing.List[ClinVarReader] = []
+        try:
+            for path in paths:
+                reader = ClinVarReader(path)
+                self.readers.append(reader)
+                reader.offsets
+        except Exception:
+            self.close()
+            raise
+        #: Number of records by path.
+        self.records = {
+            path: sum(map(len, reader.offsets["vcv"].values()))
+            for path, reader in zip(self.paths, self.readers)
+        }
+
+    def answer(self, key: CacheKey) -> typing.List[typing.Dict[str, typing.Any]]:
+        """Return JSON records for the query ``key``."""
+        kind, args = key[0], key[1:]
+        result = []
+        for reader in self.readers:
+            if kind == "variant":
+                release, chromosome, position, reference, alternative = args
+                records = [
+                    record
+                    for record in reader.point(chromosome, position, reference, alternative)
+                    if release in (None, record["release"])
+                ]
+            elif kind == "vcv":
+                records = reader.by_vcv(*args)
+            else:
+                records = reader.by_gene(*args)
+            result += map(json_record, records)
+        return result
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
+
+
+def _parse_query(body: bytes) -> typing.Dict[str, typing.List[CacheKey]]:
+    """Return cache keys of the queries in the request ``body`` by answer key."""
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError as e:
+        raise RequestError("Invalid JSON: %s" % e)
+    if not isinstance(request, dict):
+        raise RequestError("Expected JSON object")
+    unknown = set(request) - {"variants", "vcvs", "genes"}
+    if unknown:
+        raise RequestError("Unknown keys: %s" % ", ".join(sorted(unknown)))
+    result: typing.Dict[str, typing.List[CacheKey]] = {}
+    for name in ("variants", "vcvs", "genes"):
+        queries = request.get(name, [])
+        if not isinstance(queries, list):
+            raise RequestError("Expected list of %s" % name)
+        result[name] = []
+        for query in queries:
+            if name == "variants":
+                if not isinstance(query, dict) or not {"chromosome", "position"} <= set(query):
+                    raise RequestError("Expected variants with chromosome and position")
+                position = query["position"]
+                if not isinstance(position, int) or isinstance(position, bool) or position < 1:
+                    raise RequestError("Invalid position: %r" % (position,))
+                values = [query.get(key) for key in ("release", "reference", "alternative")]
+                if not all(value is None or isinstance(value, str) for value in values):
+                    raise RequestError("Expected strings for release and alleles")
+                release, reference, alternative = values
+                key = ("variant", release, str(query["chromosome"]), position)
+                result[name].append(key + (reference, alternative))
+            else:
+                if not isinstance(query, str):
+                    raise RequestError("Expected strings in %s" % name)
+                result[name].append((name[:-1], query))
+    if sum(map(len, result.values())) > MAX_QUERIES:
+        raise RequestError("More than %d queries" % MAX_QUERIES)
+    return result
+
+
+class LookupServer:
+    """Lookup service for the merged tables at ``paths``."""
+
+    def __init__(
+        self,
+        paths: typing.Sequence[str],
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        reload_interval: float = DEFAULT_RELOAD_INTERVAL,
+    ):
+        #: Paths to the merged tables.
+        self.paths = tuple(paths)
+        #: Largest number of answers kept in the cache.
+        self.cache_size = cache_size
+        #: Interval in seconds between checks for changed files, 0 to disable.
+        self.reload_interval = reload_interval
+        #: The current snapshot.
+        self.snapshot: typing.Optional[Snapshot] = None
+        #: Number of answers taken from the cache.
+        self.cache_hits = 0
+        #: Number of answers read from the files.
+        self.cache_misses = 0
+        self._cache: typing.OrderedDict[CacheKey, typing.Any] = collections.OrderedDict()
+        self._executor = concurrent.futures.ThreadPoolExecutor(1)
+        self._reload_lock: typing.Optional[asyncio.Lock] = None
+        self._server: typing.Optional[asyncio.AbstractServer] = None
+        self._poll_task: typing.Optional[asyncio.Task] = None
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> int:
+        """Load the files and start listening, return the port."""
+        self._reload_lock = asyncio.Lock()
+        await self.reload()
+        self._server = await asyncio.start_server(self._handle, host, port)
+        if self.reload_interval > 0:
+            self._poll_task = asyncio.ensure_future(self._poll())
+        port = self._server.sockets[0].getsockname()[1]
+        logger.info("Listening on http://%s:%d/", host, port)
+        return port
+
+    async def close(self):
+        """Stop listening and close the files."""
+        if self._poll_task:
+            self._poll_task.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.snapshot:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.snapshot.close)
+            self.snapshot = None
+        self._executor.shutdown()
+
+    async def reload(self) -> bool:
+        """Load the files into a new snapshot and swap it in, return whether it succeeded."""
+        assert self._reload_lock is not None, "call start() first"
+        async with self._reload_lock:
+            generation = self.snapshot.generation + 1 if self.snapshot else 1
+            loop = asyncio.get_running_loop()
+            try:
+                snapshot = await loop.run_in_executor(None, Snapshot, self.paths, generation)
+            except Exception as e:
+                if self.snapshot is None:
+                    raise
+                logger.error("Reloading failed, keeping generation %d: %s", generation - 1, e)
+                return False
+            previous, self.snapshot = self.snapshot, snapshot
+            self._cache.clear()
+            if previous:
+                # Queries of the previous snapshot were submitted before and run first.
+                loop.run_in_executor(self._executor, previous.close)
+            logger.info("Loaded generation %d with %s records", generation, snapshot.records)
+            return True
+
+    async def _poll(self):
+        """Reload when the signature of the files changed and stayed the same for one poll."""
+        pending = None
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            signature = file_signature(self.paths)
+            if self.snapshot and signature == self.snapshot.signature:
+                pending = None
+            elif signature == pending:
+                await self.reload()
+                pending = None
+            else:
+                pending = signature
+
+    async def query(self, queries: typing.Dict[str, typing.List[CacheKey]]) -> typing.Any:
+        """Return answers to the ``queries`` from ``_parse_query()``."""
+        snapshot = self.snapshot
+        assert snapshot is not None
+        answers: typing.Dict[CacheKey, typing.Any] = {}
+        for keys in queries.values():
+            for key in keys:
+                if key in answers:
+                    continue
+                answer = self._cache.get(key)
+                if answer is not None:
+                    self._cache.move_to_end(key)
+                    self.cache_hits += 1
+                answers[key] = answer
+        missing = [key for key, answer in answers.items() if answer is None]
+        if missing:
+            self.cache_misses += len(missing)
+            found = await asyncio.get_running_loop().run_in_executor(
+                self._executor, lambda: [snapshot.answer(key) for key in missing]
+            )
+            answers.update(zip(missing, found))
+            if snapshot is self.snapshot:
+                for key, answer in zip(missing, found):
+                    self._cache[key] = answer
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        result: typing.Dict[str, typing.Any] = {"generation": snapshot.generation}
+        for name, keys in queries.items():
+            result[name] = [answers[key] for key in keys]
+        return result
+
+    def status(self) -> typing.Dict[str, typing.Any]:
+        """Return status of the service."""
+        snapshot = self.snapshot
+        assert snapshot is not None
+        return {
+            "generation": snapshot.generation,
+            "loaded": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(snapshot.loaded)),
+            "records": snapshot.records,
+            "cache": {
+                "size": len(self._cache),
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+            },
+        }
+
+    async def _route(self, method: str, path: str, body: bytes) -> typing.Any:
+        routes = {"/query": "POST", "/status": "GET", "/reload": "POST"}
+        if path not in routes:
+            raise RequestError("Not found: %s" % path, http.HTTPStatus.NOT_FOUND)
+        if method != routes[path]:
+            raise RequestError(
+                "Use %s for %s" % (routes[path], path), http.HTTPStatus.METHOD_NOT_ALLOWED
+            )
+        if path == "/query":
+            return await self.query(_parse_query(body))
+        elif path == "/reload":
+            if not await self.reload():
+                raise RequestError("Reloading failed", http.HTTPStatus.SERVICE_UNAVAILABLE)
+        return self.status()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer the requests of one connection, keeping it alive as requested."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    keep_alive = keep_alive and version == "HTTP/1.1"
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY_SIZE:
+                        keep_alive = False
+                        raise RequestError(
+                            "Body too large", http.HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+                        )
+                    body = await reader.readexactly(length)
+                    path = urllib.parse.urlsplit(target).path
+                    status, answer = http.HTTPStatus.OK, await self._route(method, path, body)
+                except RequestError as e:
+                    status, answer = e.status, {"error": str(e)}
+                except ValueError:
+                    status, answer, keep_alive = (
+                        http.HTTPStatus.BAD_REQUEST,
+                        {"error": "Invalid request"},
+                        False,
+                    )
+                data = json.dumps(answer).encode("utf-8")
+                writer.write(
+                    (
+                        "HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n"
+                        "Content-Length: %d\r\nConnection: %s\r\n\r\n"
+                        % (
+                            status,
+                            status.phrase,
+                            len(data),
+                            "keep-alive" if keep_alive else "close",
+                        )
+                    ).encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            logger.exception("Error answering request")
+        finally:
+            writer.close()
+
+
+def serve(
+    paths: typing.Sequence[str],
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    reload_interval: float = DEFAULT_RELOAD_INTERVAL,
+):
+    """Serve lookups of the merged tables at ``paths`` until interrupted or terminated."""
+
+    async def main():
+        loop, stopped = asyncio.get_running_loop(), asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stopped.set)
+        server = LookupServer(paths, cache_size=cache_size, reload_interval=reload_interval)
+        await server.start(host, port)
+        if hasattr(signal, "SIGHUP"):
+            loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(server.reload()))
+        try:
+            await stopped.wait()
+        finally:
+            await server.close()
+        logger.info("Stopped")
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Stopped")
@@ -0,0 +1,395 @@
+"""Bounded-memory external sort of the ClinVar TSV files.
+
+Rows are sorted by chromosome (natural order, as ``sort -V``), start, end, and VCV which is
+the order of ``sort -k2,2V -k3,3n -k4,4n -k11,11``.  The input is read once.  It is cut into
+chunks that are written to temporary files, sorted in a process pool, and spilled to temporary
+files that are then k-way merged into the output.  If the input fits into a single chunk, it is
+sorted in memory without spilling.  Chunks are passed to the workers as files rather than
+pickled, so at most the chunk being read and one chunk with its sort keys in each worker are in
+memory at a time.  ``memory_mb`` bounds their estimated size, so chunks are at most
+``memory_mb / (threads + 1)`` megabytes, counting each line with its sort key.  Output paths ending
+in ``.gz`` are written as BGZF such that ``tabix`` can index them directly.
+
+Inputs that are already sorted, e.g., the concatenation of per-chromosome or sharded outputs,
+are cheap to handle: chunks that are found to be in order are spilled without sorting and
+adjacent runs that continue each other are read back one after the other rather than merged.
+With ``presorted=True``, each of several inputs is assumed to be sorted and the inputs are
+streamed through a k-way merge directly, raising ``ClinvarTsvException`` on the first row that
+is out of order.  ``check_sorted()`` only checks the order of a file.
+"""
+
+import concurrent.futures
+import contextlib
+import functools
+import heapq
+import itertools
+import operator
+import os
+import re
+import tempfile
+import typing
+
+import attr
+from logzero import logger
+
+from clinvar_tsv.bgzf import BgzfWriter
+from clinvar_tsv.common import open_maybe_gzip
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.memprofile import MemoryProfiler
+
+#: Default memory budget in megabytes.
+DEFAULT_MEMORY_MB = 1024
+
+#: Estimated per-line overhead in bytes of keeping a line in memory, on top of its length.
+LINE_OVERHEAD = 200
+
+#: Estimated per-line size in bytes of the sort key of a line.
+KEY_OVERHEAD = 200
+
+#: Number of lines to write out at a time.
+WRITE_BATCH = 1024
+
+#: Indices of the sort columns chromosome, start, end, and vcv.
+SORT_COLUMNS = (1, 2, 3, 10)
+
+
+@functools.lru_cache(maxsize=None)
+def natural_key(value: str) -> typing.Tuple[typing.Tuple[int, typing.Union[int, str]], ...]:
+    """Key for natural ("version") ordering, e.g., ``2 < 10 < MT < X``."""
+    return tuple(
+        (0, int(part)) if part.isdigit() else (1, part) for part in re.findall(r"\d+|\D+", value)
+    )
+
+
+def _numeric(value: str) -> int:
+    """Interpret ``value`` as for ``sort -n``, non-numbers are zero."""
+    try:
+        return int(value)
+    except ValueError:
+        return 0
+
+
+def sort_key(line: str, columns: typing.Sequence[int] = SORT_COLUMNS):
+    """Sort key of a TSV line, the whole line breaks ties as for ``sort``.
+
+    ``columns`` are the indices of chromosome, start, end, and vcv.
+    """
+    chrom, start, end, vcv = columns
+    fields = line.split("\t", max(columns) + 1)
+    return (
+        natural_key(fields[chrom]),
+        _numeric(fields[start]),
+        _numeric(fields[end]),
+        fields[vcv],
+        line,
+    )
+
+
+class OrderChecker:
+    """Streaming check that rows come in sort order.
+
+    Rows are passed to ``check()`` as lists of fields and compared on the ``columns`` with
+    the indices of chromosome, start, end, and vcv.  Rows that are equal in these columns may
+    come in any order.
+    """
+
+    def __init__(self, path: str = "<input>", columns: typing.Sequence[int] = SORT_COLUMNS):
+        #: Name of the checked file, for messages.
+        self.path = path
+        #: Indices of the sort columns.
+        self.columns = tuple(columns)
+        #: Number of rows checked.
+        self.rows = 0
+        #: Number of rows that were smaller than their predecessor.
+        self.violations = 0
+        #: Line number, previous row, and row of the first violation.
+        self.first_violation: typing.Optional[typing.Tuple[int, str, str]] = None
+        self._prev_key = None
+        self._prev_fields = None
+
+    def key(self, fields: typing.Sequence[str]):
+        chrom, start, end, vcv = self.columns
+        return (
+            natural_key(fields[chrom]),
+            _numeric(fields[start]),
+            _numeric(fields[end]),
+            fields[vcv],
+        )
+
+    def label(self, fields: typing.Sequence[str]) -> str:
+        chrom, start, end, vcv = self.columns
+        return "%s:%s-%s %s" % (fields[chrom], fields[start], fields[end], fields[vcv])
+
+    def check(self, fields: typing.Sequence[str], lineno: int) -> bool:
+        """Check row ``fields`` found in line ``lineno``, return whether it is in order."""
+        self.rows += 1
+        key = self.key(fields)
+        result = self._prev_key is None or self._prev_key <= key
+        if not result:
+            self.violations += 1
+            if self.first_violation is None:
+                self.first_violation = (lineno, self.label(self._prev_fields), self.label(fields))
+        self._prev_key = key
+        self._prev_fields = fields
+        return result
+
+    @property
+    def is_sorted(self) -> bool:
+        return not self.violations
+
+    def message(self) -> str:
+        """Return message describing the first violation."""
+        if self.first_violation is None:
+            return "%s: %d rows are sorted" % (self.path, self.rows)
+        lineno, prev_label, label = self.first_violation
+        return "%s:%d: row %s comes after %s but should come before (rows out of order: %d)" % (
+            self.path,
+            lineno,
+            label,
+            prev_label,
+            self.violations,
+        )
+
+
+@attr.s(frozen=True, auto_attribs=True)
+class SortedRun:
+    """A sorted run spilled to a temporary file."""
+
+    #: Path to the temporary file.
+    path: str
+    #: Sort key of the first line.
+    first_key: typing.Any
+    #: Sort key of the last line.
+    last_key: typing.Any
+    #: Whether the lines were in order already.
+    presorted: bool
+
+
+def _write_chunk(lines: typing.List[str], tmp_dir: str) -> str:
+    """Write unsorted ``lines`` to a new temporary file and return its path."""
+    fd, path = tempfile.mkstemp(prefix="clinvar_tsv.chunk.", suffix=".tsv", dir=tmp_dir)
+    with os.fdopen(fd, "wt") as outputf:
+        outputf.writelines(lines)
+    return path
+
+
+def _sort_and_spill(chunk_path: str, tmp_dir: str) -> SortedRun:
+    """Sort the lines at ``chunk_path`` (if not sorted already) into a new temporary file.
+
+    The file at ``chunk_path`` is removed.
+    """
+    with open(chunk_path, "rt") as inputf:
+        keys = [sort_key(line) for line in inputf]
+    os.remove(chunk_path)
+    presorted = all(map(operator.le, keys, itertools.islice(keys, 1, None)))
+    if not presorted:
+        keys.sort()
+    fd, path = tempfile.mkstemp(prefix="clinvar_tsv.sort.", suffix=".tsv", dir=tmp_dir)
+    with os.fdopen(fd, "wt") as outputf:
+        outputf.writelines(key[-1] for key in keys)
+    return SortedRun(path, keys[0], keys[-1], presorted)
+
+
+def _chain_runs(runs: typing.List[SortedRun]) -> typing.List[typing.List[SortedRun]]:
+    """Group consecutive ``runs`` where each run continues the previous one."""
+    chains: typing.List[typing.List[SortedRun]] = []
+    for run in runs:
+        if chains and chains[-1][-1].last_key <= run.first_key:
+            chains[-1].append(run)
+        else:
+            chains.append([run])
+    return chains
+
+
+def _write_lines(lines: typing.Iterable[str], outputf, mem_profiler: MemoryProfiler):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= WRITE_BATCH:
+            outputf.write("".join(batch))
+            mem_profiler.tick(len(batch))
+            batch = []
+    outputf.write("".join(batch))
+    mem_profiler.tick(len(batch))
+
+
+def _read_chunks(
+    inputf, chunk_bytes: int, mem_profiler: MemoryProfiler
+) -> typing.Iterator[typing.Tuple[typing.List[str], bool]]:
+    """Yield lists of lines of ``inputf`` of at most ``chunk_bytes`` (estimated, with keys).
+
+    Each list comes with whether more lines follow, a single empty list is yielded for no lines.
+    """
+    chunk, size = [], 0
+    for line in inputf:
+        if line == "\n":
+            continue
+        if not line.endswith("\n"):
+            line += "\n"
+        if chunk and size >= chunk_bytes:
+            yield chunk, True
+            chunk, size = [], 0
+        chunk.append(line)
+        mem_profiler.tick()
+        size += len(line) + LINE_OVERHEAD + KEY_OVERHEAD
+    yield chunk, False
+
+
+@contextlib.contextmanager
+def open_output(path: str, threads: int = 1):
+    """Open ``path`` for writing text, as BGZF if it ends with ``.gz``."""
+    if path.endswith(".gz"):
+        with BgzfWriter.open(path, threads=threads) as writer:
+            yield writer
+    else:
+        with open(path, "wt") as outputf:
+            yield outputf
+
+
+def _open_inputs(stack: contextlib.ExitStack, input_paths: typing.Sequence[str]):
+    """Open ``input_paths``, return common header line and the files after the header."""
+    header, inputfs = None, []
+    for path in input_paths:
+        inputf = stack.enter_context(open_maybe_gzip(path, "rt"))
+        this_header = inputf.readline()
+        if header is not None and this_header != header:
+            raise ClinvarTsvException("Header of %s differs from %s" % (path, input_paths[0]))
+        header = this_header
+        inputfs.append(inputf)
+    return header, inputfs
+
+
+def _checked_lines(inputf, path: str, columns: typing.Sequence[int]) -> typing.Iterator[str]:
+    """Yield lines of sorted ``inputf``, raise ``ClinvarTsvException`` if out of order."""
+    checker = OrderChecker(path, columns)
+    maxsplit = max(columns) + 1
+    for lineno, line in enumerate(inputf, 2):
+        if line == "\n":
+            continue
+        if not line.endswith("\n"):
+            line += "\n"
+        if not checker.check(line.split("\t", maxsplit), lineno):
+            raise ClinvarTsvException(checker.message())
+        yield line
+
+
+def check_sorted(input_path: str) -> OrderChecker:
+    """Check order of TSV file at ``input_path``, return the ``OrderChecker``."""
+    checker = OrderChecker(input_path)
+    with open_maybe_gzip(input_path, "rt") as inputf:
+        inputf.readline()
+        for lineno, line in enumerate(inputf, 2):
+            if line != "\n":
+                checker.check(line.rstrip("\n").split("\t", 11), lineno)
+    return checker
+
+
+def merge_sorted(
+    input_paths: typing.Sequence[str],
+    output_path: str,
+    threads: int = 1,
+    columns: typing.Sequence[int] = SORT_COLUMNS,
+    mem_profiler: typing.Optional[MemoryProfiler] = None,
+):
+    """Merge the sorted TSV files at ``input_paths`` into ``output_path``.
+
+    ``columns`` are the indices of the sort columns, e.g., of the merged TSV files.
+    """
+    with open_output(output_path, threads) as outputf:
+        write_merged(input_paths, outputf, columns, mem_profiler)
+
+
+def write_merged(
+    input_paths: typing.Sequence[str],
+    outputf,
+    columns: typing.Sequence[int] = SORT_COLUMNS,
+    mem_profiler: typing.Optional[MemoryProfiler] = None,
+):
+    """Merge the sorted TSV files at ``input_paths`` into the text file ``outputf``.
+
+    Each written line is registered with ``mem_profiler``, if any.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    with contextlib.ExitStack() as stack:
+        header, inputfs = _open_inputs(stack, input_paths)
+        inputs = [
+            _checked_lines(inputf, path, columns) for inputf, path in zip(inputfs, input_paths)
+        ]
+        logger.info("Merging %d sorted inputs", len(inputs))
+        outputf.write(header)
+        if len(inputs) == 1:
+            _write_lines(inputs[0], outputf, mem_profiler)
+        else:
+            key = functools.partial(sort_key, columns=columns)
+            _write_lines(heapq.merge(*inputs, key=key), outputf, mem_profiler)
+
+
+def sort_tsv(
+    input_paths: typing.Union[str, typing.Sequence[str]],
+    output_path: str,
+    memory_mb: int = DEFAULT_MEMORY_MB,
+    tmp_dir: typing.Optional[str] = None,
+    threads: int = 1,
+    presorted: bool = False,
+    mem_profiler: typing.Optional[MemoryProfiler] = None,
+):
+    """Sort TSV files at ``input_paths`` (header line is kept) and write to ``output_path``.
+
+    The inputs are concatenated and must have the same header.  If ``presorted`` then each
+    input must be sorted already and they are merged with ``merge_sorted()``.  Each line read
+    and each line written is registered with ``mem_profiler``, if any.  Raises a
+    ``ClinvarTsvException`` if ``memory_mb`` is less than 1.
+    """
+    if memory_mb < 1:
+        raise ClinvarTsvException("Invalid memory budget: %s MB" % memory_mb)
+    mem_profiler = mem_profiler or MemoryProfiler()
+    if isinstance(input_paths, str):
+        input_paths = [input_paths]
+    if presorted:
+        merge_sorted(input_paths, output_path, threads, mem_profiler=mem_profiler)
+        return
+
+    chunk_bytes = memory_mb * 1024 * 1024 // (threads + 1)
+    runs: typing.List[SortedRun] = []
+    with contextlib.ExitStack() as stack:
+        header, inputfs = _open_inputs(stack, input_paths)
+        chunks = _read_chunks(itertools.chain.from_iterable(inputfs), chunk_bytes, mem_profiler)
+        first, more = next(chunks)
+        if not more:
+            logger.info("Sorting %d lines in memory", len(first))
+            first.sort(key=sort_key)
+            with open_output(output_path, threads) as outputf:
+                outputf.write(header)
+                _write_lines(first, outputf, mem_profiler)
+            return
+
+        tmp_dir = stack.enter_context(tempfile.TemporaryDirectory(dir=tmp_dir))
+        executor = stack.enter_context(concurrent.futures.ProcessPoolExecutor(threads))
+        pending: typing.List[concurrent.futures.Future] = []
+        for chunk, _ in itertools.chain([(first, more)], chunks):
+            chunk_path = _write_chunk(chunk, tmp_dir)
+            del chunk[:]
+            if len(pending) >= threads:  # bound number of chunk files in flight
+                runs.append(pending.pop(0).result())
+            pending.append(executor.submit(_sort_and_spill, chunk_path, tmp_dir))
+        runs += [future.result() for future in pending]
+
+        chains = _chain_runs(runs)
+        logger.info(
+            "Merging %d sorted runs (%d were in order already) as %d chains",
+            len(runs),
+            sum(run.presorted for run in runs),
+            len(chains),
+        )
+        inputs = [
+            itertools.chain.from_iterable(
+                stack.enter_context(open(run.path, "rt")) for run in chain
+            )
+            for chain in chains
+        ]
+        with open_output(output_path, threads) as outputf:
+            outputf.write(header)
+            if len(inputs) == 1:  # input was sorted, just copy
+                _write_lines(inputs[0], outputf, mem_profiler)
+            else:
+                _write_lines(heapq.merge(*inputs, key=sort_key), outputf, mem_profiler)
@@ -0,0 +1,303 @@
+"""Interval index of the merged structural variant tables for overlap queries.
+
+Tabix only finds records overlapping a region, so "all SVs with at least 50% reciprocal
+overlap" means reading all records overlapping the query, which for large CNVs are many.  The
+SV index groups the records of each chromosome into size classes, class ``k`` holding the
+records of ``2**k`` to ``2**(k + 1) - 1`` bp, and sorts each class by start position.  In a
+size class, the records overlapping a query start at most the largest size of the class before
+the query, so they are found by binary search for the range of start positions.  Size limits
+skip whole classes, and with a reciprocal overlap of ``f`` only classes with sizes from ``f``
+times to ``1 / f`` times the query size are searched, in a start range narrowed further by the
+required overlap.
+
+The index file has a fixed header, a JSON block with the name and columns of the indexed table
+and the record ranges of the size classes, and fixed-width records of ``RECORD_SIZE`` bytes:
+start, end, VCV number, and the BGZF virtual offset of the row in the table.  The fields are
+big-endian, so the byte order of the records is the order by start.  ``SvIndex`` maps the file
+into memory like ``lookup.LookupFile`` and reads the rows of hits from the table on request.
+"""
+
+import math
+import os
+import struct
+import typing
+
+import attr
+from logzero import logger
+
+from clinvar_tsv.bgzf import BgzfReader
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.lookup import vcv_number
+from clinvar_tsv.mapped import open_mapped, write_header
+from clinvar_tsv.memprofile import MemoryProfiler
+
+#: Magic bytes at the start of SV index files.
+MAGIC = b"CVSVIDX\x00"
+
+#: Version of the file format.
+VERSION = 1
+
+#: Record: start, end, VCV number, and virtual offset of the row.
+_RECORD = struct.Struct(">IIIQ")
+
+#: Start position of a record, the prefix of the record bytes.
+_START = struct.Struct(">I")
+
+#: Size of a record in bytes.
+RECORD_SIZE = _RECORD.size
+
+#: A query of ``batch()``: chromosome, 1-based start, and end.
+Query = typing.Tuple[str, int, int]
+
+
+def size_class(size: int) -> int:
+    """Return size class of records with ``size`` bp."""
+    return max(size, 1).bit_length() - 1
+
+
+@attr.s(frozen=True, auto_attribs=True, slots=True)
+class SvHit:
+    """A record of the SV index overlapping a query."""
+
+    #: Chromosome name.
+    chromosome: str
+    #: 1-based start position.
+    start: int
+    #: 1-based end position.
+    end: int
+    #: VCV accession.
+    vcv: str
+    #: Virtual offset of the row in the table.
+    offset: int
+    #: Number of overlapping bp.
+    overlap: int
+    #: Smaller of the overlap fractions of the record and the query.
+    reciprocal_overlap: float
+
+    @property
+    def size(self) -> int:
+        """Size of the record in bp."""
+        return self.end - self.start + 1
+
+
+def build_sv_index(
+    input_path: str, output_path: str, mem_profiler: typing.Optional[MemoryProfiler] = None
+) -> typing.Dict[str, int]:
+    """Write SV index of the bgzip-compressed table at ``input_path`` to ``output_path``.
+
+    The input does not need to be sorted.  Each row is registered with ``mem_profiler``, if
+    any.  Returns the number of records written.
+    """
+    mem_profiler = mem_profiler or MemoryProfiler()
+    classes: typing.Dict[str, typing.Dict[int, typing.List[bytes]]] = {}
+    with BgzfReader.open(input_path) as reader:
+        columns = reader.readline().decode("utf-8").rstrip("\n").split("\t")
+        try:
+            idx_chrom, idx_start, idx_end, idx_vcv = map(
+                columns.index, ("chromosome", "start", "end", "vcv")
+            )
+        except ValueError as e:
+            raise ClinvarTsvException("Not a merged table: %s (%s)" % (input_path, e))
+        while True:
+            offset = reader.tell()
+            line = reader.readline()
+            if not line:
+                break
+            mem_profiler.tick()
+            row = line.decode("utf-8").rstrip("\n").split("\t")
+            start = int(row[idx_start])
+            end = max(start, int(row[idx_end]))
+            records = classes.setdefault(row[idx_chrom], {}).setdefault(
+                size_class(end - start + 1), []
+            )
+            records.append(_RECORD.pack(start, end, vcv_number(row[idx_vcv]), offset))
+
+    chromosomes: typing.Dict[str, typing.List[typing.Tuple[int, int, int]]] = {}
+    count = 0
+    for chrom, by_class in classes.items():
+        chromosomes[chrom] = []
+        for k in sorted(by_class):
+            by_class[k].sort()
+            chromosomes[chrom].append((k, count, count + len(by_class[k])))
+            count += len(by_class[k])
+    meta = {"table": os.path.basename(input_path), "columns": columns, "chromosomes": chromosomes}
+    with open(output_path, "wb") as outputf:
+        write_header(outputf, MAGIC, VERSION, meta)
+        for chrom, by_class in classes.items():
+            for k in sorted(by_class):
+                outputf.write(b"".join(by_class[k]))
+    logger.info("Wrote %d records to %s", count, output_path)
+    return {"records": count}
+
+
+class SvIndex:
+    """Memory-mapped SV index at ``path``.
+
+    The rows are read from ``table_path``, by default the indexed table next to the index.
+    """
+
+    def __init__(self, path: str, table_path: typing.Optional[str] = None):
+        #: Path to the index file.
+        self.path = path
+        self._reader: typing.Optional[BgzfReader] = None
+        self._mm, meta, self._offset = open_mapped(path, MAGIC, VERSION, "an SV index")
+        #: Path to the indexed table.
+        self.table_path = table_path or os.path.join(os.path.dirname(path), meta["table"])
+        #: Columns of the indexed table.
+        self.columns: typing.List[str] = meta["columns"]
+        self._classes: typing.Dict[str, typing.List[typing.Tuple[int, int, int]]] = {
+            chrom: [tuple(entry) for entry in entries]
+            for chrom, entries in meta["chromosomes"].items()
+        }
+        self._size = (len(self._mm) - self._offset) // RECORD_SIZE
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _bisect(self, lo: int, hi: int, start: int) -> int:
+        """Return first record in ``lo`` to ``hi`` starting at ``start`` or after."""
+        key, mm, offset = _START.pack(start), self._mm, self._offset
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = offset + mid * RECORD_SIZE
+            if mm[pos : pos + _START.size] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def overlaps(
+        self,
+        chromosome: str,
+        start: int,
+        end: int,
+        min_overlap: float = 0.0,
+        min_size: typing.Optional[int] = None,
+        max_size: typing.Optional[int] = None,
+    ) -> typing.List[SvHit]:
+        """Return records overlapping the 1-based ``start`` to ``end`` on ``chromosome``.
+
+        Records must have a reciprocal overlap of at least ``min_overlap`` (a fraction, 0 for
+        any overlap) and between ``min_size`` and ``max_size`` bp if given.  The hits are
+        sorted by start, end, and VCV.
+        """
+        if not 0.0 <= min_overlap <= 1.0:
+            raise ClinvarTsvException("Invalid reciprocal overlap: %s" % min_overlap)
+        end = max(start, end)
+        query_size = end - start + 1
+        min_size, max_size = min_size or 1, max_size or (1 << 32)
+        # Bounds of size and start of the records with enough overlap, with 1 bp of slack for
+        # rounding, the overlap is checked for each record.
+        size_lo, size_hi = min_size, max_size
+        if min_overlap > 0:
+            size_lo = max(size_lo, math.ceil(min_overlap * query_size) - 1)
+            size_hi = min(size_hi, math.floor(query_size / min_overlap) + 1)
+        latest_start = end - max(1, math.ceil(min_overlap * query_size) - 1) + 1
+        mm, offset = self._mm, self._offset
+        result = []
+        for k, first, last in self._classes.get(chromosome, ()):
+            class_hi = (1 << (k + 1)) - 1
+            if class_hi < size_lo or (1 << k) > size_hi:
+                continue
+            earliest_start = start - math.floor((1 - min_overlap) * min(class_hi, size_hi)) - 1
+            i = self._bisect(first, last, max(0, earliest_start))
+            pos = offset + i * RECORD_SIZE
+            while i < last:
+                rec_start, rec_end, vcv, virtual_offset = _RECORD.unpack_from(mm, pos)
+                if rec_start > latest_start:
+                    break
+                i, pos = i + 1, pos + RECORD_SIZE
+                size = rec_end - rec_start + 1
+                overlap = min(end, rec_end) - max(start, rec_start) + 1
+                if overlap <= 0 or not min_size <= size <= max_size:
+                    continue
+                reciprocal = min(overlap / size, overlap / query_size)
+                if reciprocal >= min_overlap:
+                    hit = SvHit(
+                        chromosome,
+                        rec_start,
+                        rec_end,
+                        "VCV%09d" % vcv,
+                        virtual_offset,
+                        overlap,
+                        reciprocal,
+                    )
+                    result.append(hit)
+        result.sort(key=lambda hit: (hit.start, hit.end, hit.vcv))
+        return result
+
+    def batch(self, queries: typing.Sequence[Query], **kwargs) -> typing.List[typing.List[SvHit]]:
+        """Return hits of ``overlaps()`` for each of ``queries`` in the order of the queries.
+
+        The queries are answered in order of position, so that the pages of the index are
+        read in one pass, and repeated queries are answered once.
+        """
+        result: typing.List[typing.List[SvHit]] = [[] for _ in queries]
+        answers: typing.Dict[Query, typing.List[SvHit]] = {}
+        for i in sorted(range(len(queries)), key=lambda i: queries[i]):
+            query = tuple(queries[i])
+            if query not in answers:
+                answers[query] = self.overlaps(*query, **kwargs)
+            result[i] = answers[query]
+        return result
+
+    def records(self, hits: typing.Iterable[SvHit]) -> typing.List[typing.Dict[str, str]]:
+        """Return rows of ``hits`` from the table as ``dict`` objects."""
+        if self._reader is None:
+            self._reader = BgzfReader.open(self.table_path)
+        result = []
+        for hit in hits:
+            self._reader.seek(hit.offset)
+            row = self._reader.readline().decode("utf-8").rstrip("\n").split("\t")
+            result.append(dict(zip(self.columns, row)))
+        return result
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def query_sv_index(
+    index_path: str,
+    input_path: str,
+    output_path: str,
+    min_overlap: float = 0.0,
+    min_size: typing.Optional[int] = None,
+    max_size: typing.Optional[int] = None,
+) -> typing.Dict[str, int]:
+    """Write rows overlapping the intervals of the BED file at ``input_path`` to ``output_path``.
+
+    Each output row has the query interval (1-based), the overlap in bp and the reciprocal
+    overlap, and the columns of the table.  Returns the number of queries and hits.
+    """
+    queries = []
+    with open(input_path, "rt") as inputf:
+        for line in inputf:
+            if line.startswith(("#", "track", "browser")) or not line.strip():
+                continue
+            chrom, begin, end = line.split("\t")[:3]
+            queries.append((chrom, int(begin) + 1, int(end)))
+    hits = 0
+    with SvIndex(index_path) as index, open(output_path, "wt") as outputf:
+        header = ["query_chromosome", "query_start", "query_end", "overlap", "reciprocal_overlap"]
+        outputf.write("\t".join(header + index.columns) + "\n")
+        found_all = index.batch(
+            queries, min_overlap=min_overlap, min_size=min_size, max_size=max_size
+        )
+        for query, found in zip(queries, found_all):
+            for hit, record in zip(found, index.records(found)):
+                prefix = [query[0], str(query[1]), str(query[2]), str(hit.overlap)]
+                prefix.append("%.4f" % hit.reciprocal_overlap)
+                outputf.write(
+                    "\t".join(prefix + [record[column] for column in index.columns]) + "\n"
+                )
+            hits += len(found)
+    logger.info("Found %d hits for %d queries", hits, len(queries))
+    return {"queries": len(queries), "hits": hits}
@@ -0,0 +1,93 @@
+"""Column-indexed reading and writing of the TSV files passed between the stages.
+
+The stages only look at a handful of columns of each row while the (large) ``details`` column
+is usually passed through.  ``TsvReader`` thus yields each row as a plain ``list`` of fields
+and the stages access the fields by the column indices that they resolve once from the header
+with ``TsvReader.index()``.  Untouched fields are written out again as they were read.
+"""
+
+import typing
+
+#: Number of bytes to read from the input at a time.
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+#: Number of rows to buffer before writing them out.
+DEFAULT_WRITE_ROWS = 1024
+
+
+class TsvReader:
+    """Read TSV file with header line from the text file ``infile``.
+
+    Iterating yields one ``list`` of fields for each non-empty row, padded with empty strings
+    or truncated to the number of header columns.
+    """
+
+    def __init__(self, infile: typing.TextIO, block_size: int = DEFAULT_BLOCK_SIZE):
+        #: The file to read from.
+        self.infile = infile
+        #: Number of bytes to read at a time.
+        self.block_size = block_size
+        #: The column names from the header.
+        self.header: typing.Tuple[str, ...] = tuple(infile.readline().rstrip("\n").split("\t"))
+
+    def index(self, column: str) -> int:
+        """Return index of ``column``, raise ``ValueError`` if missing."""
+        return self.header.index(column)
+
+    def __iter__(self) -> typing.Iterator[typing.List[str]]:
+        num_columns = len(self.header)
+        while True:
+            lines = self.infile.readlines(self.block_size)
+            if not lines:
+                break
+            for line in lines:
+                if line == "\n":
+                    continue
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != num_columns:
+                    fields = (fields + [""] * num_columns)[:num_columns]
+                yield fields
+
+
+class TsvWriter:
+    """Write TSV rows to the text file ``outfile``, writing out ``header`` first (if any).
+
+    Rows are collected and written out in blocks of ``block_rows``; call ``flush()`` or use the
+    writer as a context manager to write out the remaining rows.
+    """
+
+    def __init__(
+        self,
+        outfile: typing.TextIO,
+        header: typing.Optional[typing.Iterable[str]] = None,
+        block_rows: int = DEFAULT_WRITE_ROWS,
+    ):
+        #: The file to write to.
+        self.outfile = outfile
+        #: Number of rows to buffer.
+        self.block_rows = block_rows
+        self._buffer: typing.List[str] = []
+        if header is not None:
+            self.write(header)
+
+    def write(self, fields: typing.Iterable[str]):
+        """Write one row given as its fields."""
+        self.write_line("\t".join(fields))
+
+    def write_line(self, line: str):
+        """Write one row that has already been joined (without trailing newline)."""
+        self._buffer.append(line)
+        if len(self._buffer) >= self.block_rows:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._buffer.append("")
+            self.outfile.write("\n".join(self._buffer))
+            self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
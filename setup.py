@@ -49,6 +49,7 @@ setup(
     entry_points={"console_scripts": ["clinvar_tsv = clinvar_tsv.__main__:main"]},
     include_package_data=True,
     install_requires=install_requirements,
+    extras_require={"parquet": ["pyarrow"]},
     license="MIT license",
     zip_safe=False,
     keywords="clinvar",
@@ -1,14 +1,27 @@
 import datetime
+import os
 
 import factory
+import pytest
 from pytest_factoryboy import register
 
+from clinvar_tsv.bgzf import BgzfWriter
 from clinvar_tsv.common import (
     GOLD_STAR_MAP,
     ClinVarAssertion,
     ClinVarSet,
     ReferenceClinVarAssertion,
+    open_maybe_gzip,
 )
+from clinvar_tsv.index import BinningIndex
+from clinvar_tsv.merge_tsvs import OUTPUT_SORT_COLUMNS, merge_tsvs
+from clinvar_tsv.sort_tsv import sort_key
+
+#: Parsed test data merged by ``merged_paths``.
+MERGE_PATHS = ("tests/data/parsed-in-context-74722873.37.tsv", "tests/data/parsed-spta1.37.tsv")
+
+#: Configuration of ``tabix -S 1 -s 2 -b 3 -e 4``.
+TABIX_TSV = (0, 2, 3, 4, ord("#"), 1)
 
 
 class RcvaFactory(factory.Factory):
@@ -72,3 +85,88 @@ class CvsFactory(factory.Factory):
 register(CvaFactory)
 register(RcvaFactory)
 register(CvsFactory)
+
+
+def _write_indexed(path, header, lines, index_format="csi"):
+    """Write ``lines`` to bgzip-compressed and indexed file, replacing ``path`` at once."""
+    tmp_path = path + ".tmp.gz"
+    binning = BinningIndex(tabix_conf=TABIX_TSV)
+    with BgzfWriter.open(tmp_path) as writer:
+        writer.write(header)
+        offset = writer.tell()
+        for line in lines:
+            writer.write(line)
+            next_offset = writer.tell()
+            fields = line.split("\t")
+            binning.add(fields[1], int(fields[2]) - 1, int(fields[3]), offset, next_offset)
+            offset = next_offset
+    if index_format == "csi":
+        binning.write_csi(tmp_path + ".csi")
+    else:
+        pysam = pytest.importorskip("pysam")
+        pysam.tabix_index(tmp_path, seq_col=1, start_col=2, end_col=3, line_skip=1)
+    os.replace(tmp_path + "." + index_format, path + "." + index_format)
+    os.replace(tmp_path, path)
+    columns = header.rstrip("\n").split("\t")
+    return [dict(zip(columns, line.rstrip("\n").split("\t"))) for line in lines]
+
+
+@pytest.fixture
+def merged_lines(tmpdir):
+    """Header and sorted lines of the merged test data."""
+    unsorted_path = tmpdir / "merged.unsorted.tsv"
+    with open("tests/data/parsed-in-context-74722873.37.tsv", "rt") as inputf:
+        with unsorted_path.open("wt") as outputf:
+            merge_tsvs("VER", inputf, outputf, on_unsorted="ignore")
+    with unsorted_path.open("rt") as inputf:
+        header = inputf.readline()
+        return header, sorted(inputf, key=lambda line: sort_key(line, OUTPUT_SORT_COLUMNS))
+
+
+@pytest.fixture
+def write_indexed():
+    """Function writing header and lines to a bgzip-compressed and indexed table.
+
+    Called with the path, header, lines, and index format (``"csi"`` or ``"tbi"``), returns
+    the records as ``dict`` objects.
+    """
+    return _write_indexed
+
+
+@pytest.fixture
+def indexed_table(tmpdir, merged_lines):
+    """Function writing the merged test data with the given index format, return path and records."""
+
+    def write(index_format="csi"):
+        path = str(tmpdir / "merged.tsv.gz")
+        return path, _write_indexed(path, *merged_lines, index_format=index_format)
+
+    return write
+
+
+def _read_rows(paths):
+    """Return rows of the (optionally gzip-compressed) table(s) at ``paths`` as ``dict`` objects."""
+    result = []
+    for path in [paths] if isinstance(paths, str) else paths:
+        with open_maybe_gzip(path, "rt") as inputf:
+            header = inputf.readline().rstrip("\n").split("\t")
+            result += [dict(zip(header, line.rstrip("\n").split("\t"))) for line in inputf]
+    return result
+
+
+@pytest.fixture
+def read_rows():
+    """Function reading the rows of one or more merged tables as ``dict`` objects."""
+    return _read_rows
+
+
+@pytest.fixture
+def merged_paths(tmpdir):
+    """Paths to the merged tables of ``MERGE_PATHS``."""
+    result = []
+    for i, path in enumerate(MERGE_PATHS):
+        out_path = tmpdir / ("merged.%d.tsv" % i)
+        with open(path, "rt") as inputf, out_path.open("wt") as outputf:
+            merge_tsvs("VER", inputf, outputf, on_unsorted="ignore")
+        result.append(str(out_path))
+    return result
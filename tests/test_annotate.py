@@ -0,0 +1,75 @@
+import gzip
+
+import pytest  # noqa
+
+from clinvar_tsv.annotate import annotate, clinvar_chromosome
+from clinvar_tsv.common import from_pg_list
+from clinvar_tsv.sort_tsv import natural_key
+
+
+def write_vcf(tmpdir, records):
+    """Write VCF with the first allele of each record, return path and expected VCVs."""
+    variants = {}
+    for record in records:
+        key = (record["chromosome"], int(record["start"]), record["reference"])
+        variants.setdefault(key, []).append(record)
+    lines, expected = [], []
+    for i, ((chrom, pos, ref), matches) in enumerate(
+        sorted(variants.items(), key=lambda x: (natural_key(x[0][0]), x[0][1]))
+    ):
+        alts = list(dict.fromkeys(record["alternative"] for record in matches))
+        if i % 3 == 0:
+            alts.append("N")  # multi-allelic
+        info = "DP=10" if i % 2 else "."
+        lines.append("\t".join(("chr" + chrom, str(pos), ".", ref, ",".join(alts), ".", ".", info)))
+        expected.append([record["vcv"] for record in matches])
+        lines.append("\t".join(("chr" + chrom, str(pos + 1), ".", ref, "T", ".", ".", ".")))
+        expected.append([])
+    path = tmpdir / "input.vcf"
+    path.write(
+        "##fileformat=VCFv4.2\n"
+        + "\t".join(("#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO"))
+        + "\n"
+        + "".join(line + "\n" for line in lines)
+    )
+    return str(path), expected
+
+
+def test_clinvar_chromosome():
+    assert clinvar_chromosome("chr1") == "1"
+    assert clinvar_chromosome("chrM") == "MT"
+    assert clinvar_chromosome("X") == "X"
+
+
+@pytest.mark.parametrize("workers,seek_distance", [(1, 100_000), (1, 0), (2, 100_000)])
+def test_annotate(tmpdir, indexed_table, workers, seek_distance):
+    clinvar_path, records = indexed_table()
+    vcf_path, expected = write_vcf(tmpdir, records)
+    out_path = str(tmpdir / "out.vcf.gz")
+
+    metrics = annotate(
+        clinvar_path,
+        vcf_path,
+        out_path,
+        seek_distance=seek_distance,
+        workers=workers,
+        batch_lines=7,
+    )
+    assert metrics["records"] == len(expected)
+    assert metrics["records_annotated"] == sum(1 for vcvs in expected if vcvs)
+
+    with gzip.open(out_path, "rt") as inputf:
+        lines = inputf.read().splitlines()
+    assert lines[0] == "##fileformat=VCFv4.2"
+    assert any(line.startswith("##INFO=<ID=CLINVAR_CLNSIG,") for line in lines)
+    assert [line for line in lines if line.startswith("#")][-1].startswith("#CHROM")
+    body = [line.split("\t") for line in lines if not line.startswith("#")]
+    by_vcv = {record["vcv"]: record for record in records}
+    for fields, vcvs in zip(body, expected):
+        info = dict(item.split("=", 1) for item in fields[7].split(";") if "=" in item)
+        if vcvs:
+            assert info["CLINVAR_VCV"].split(",") == vcvs
+            genes = [gene for vcv in vcvs for gene in from_pg_list(by_vcv[vcv]["symbols"])]
+            assert info["CLINVAR_GENE"].split(",") == genes
+        else:
+            assert "CLINVAR_VCV" not in info
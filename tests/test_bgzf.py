@@ -0,0 +1,76 @@
+import gzip
+import random
+
+import pytest  # noqa
+
+from clinvar_tsv.bgzf import MAX_BLOCK_DATA, BgzfReader, BgzfWriter
+
+
+@pytest.mark.parametrize("threads,cache_blocks", [(1, 0), (2, 0), (1, 4)])
+def test_bgzf_reader_seek(tmpdir, threads, cache_blocks):
+    rng = random.Random(42)
+    lines = [
+        ("line%d\t%s\n" % (i, "x" * rng.choice([0, 10, 1000, 2 * MAX_BLOCK_DATA]))).encode()
+        for i in range(100)
+    ]
+    path = str(tmpdir / "out.gz")
+    offsets = []
+    with BgzfWriter.open(path, threads=threads) as writer:
+        for line in lines:
+            offsets.append(writer.tell())
+            writer.write(line)
+
+    with gzip.open(path, "rb") as inputf:
+        assert inputf.read() == b"".join(lines)
+
+    with BgzfReader.open(path, cache_blocks=cache_blocks) as reader:
+        assert [reader.readline() for _ in lines] == lines
+        assert reader.readline() == b""
+        order = list(range(len(lines)))
+        rng.shuffle(order)
+        for i in order:
+            reader.seek(offsets[i])
+            assert reader.readline() == lines[i]
+            if i + 1 < len(lines):
+                assert reader.readline() == lines[i + 1]
+        assert len(reader._cache) <= cache_blocks
+        assert bool(reader.cache_hits) == bool(cache_blocks)
+
+
+@pytest.mark.parametrize("threads", [1, 3])
+def test_bgzf_writer_virtual_offset(tmpdir, threads):
+    rng = random.Random(42)
+    lines = [
+        ("line%d\t%s\n" % (i, "x" * rng.choice([0, 10, 1000, 2 * MAX_BLOCK_DATA]))).encode()
+        for i in range(100)
+    ]
+    path = str(tmpdir / "out.gz")
+    data_offsets, tell_offsets = [], []
+    with BgzfWriter.open(path, threads=threads) as writer, BgzfWriter.open(
+        str(tmpdir / "tell.gz")
+    ) as tell_writer:
+        for i, line in enumerate(lines):
+            data_offsets.append(writer.data_offset())
+            tell_offsets.append(tell_writer.tell())
+            writer.write(line)
+            tell_writer.write(line)
+            if i == 50:
+                writer.flush()
+                tell_writer.flush()
+        offsets = [writer.virtual_offset(offset) for offset in data_offsets]
+    assert offsets == tell_offsets
+
+    with BgzfReader.open(path) as reader:
+        for offset, line in zip(offsets, lines):
+            reader.seek(offset)
+            assert reader.readline() == line
+
+
+def test_bgzf_reader_invalid(tmpdir):
+    path = tmpdir / "out.gz"
+    with gzip.open(str(path), "wb") as outputf:
+        outputf.write(b"not bgzf\n")
+
+    with BgzfReader.open(str(path)) as reader:
+        with pytest.raises(ValueError, match="Invalid BGZF block at offset 0"):
+            reader.readline()
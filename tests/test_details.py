@@ -0,0 +1,93 @@
+import contextlib
+
+import pytest  # noqa
+
+from clinvar_tsv.details import (
+    PartialClinVarSet,
+    canonical_details,
+    decode_details,
+    decode_details_partial,
+    encode_details,
+    join_details,
+)
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.merge_tsvs import merge_tsvs, verify_details
+
+PATHS = (
+    "tests/data/parsed-74722873.37.tsv",
+    "tests/data/parsed-in-context-74722873.37.tsv",
+    "tests/data/parsed-spta1.37.tsv",
+)
+
+
+def load_details():
+    result = []
+    for path in PATHS:
+        with open(path, "rt") as inputf:
+            header = inputf.readline().rstrip("\n").split("\t")
+            for line in inputf:
+                if line != "\n":
+                    result.append(line.rstrip("\n").split("\t")[header.index("details")])
+    return result
+
+
+def test_decode_details_partial():
+    for details in load_details():
+        full = decode_details(details)
+        partial = decode_details_partial(details)
+
+        assert isinstance(partial, PartialClinVarSet)
+        assert partial.id_no == full.id_no
+        assert [(a.review_status, a.pathogenicity) for a in partial.cv_assertions] == [
+            (a.review_status, a.pathogenicity) for a in full.cv_assertions
+        ]
+        assert [g.set_type for g in partial.ref_cv_assertion.genotype_sets] == [
+            g.set_type for g in full.ref_cv_assertion.genotype_sets
+        ]
+
+
+def test_decode_details_partial_fallback():
+    details = load_details()[0].replace(
+        '"""pathogenicity""": """benign"""', '"""pathogenicity""": null'
+    )
+
+    result = decode_details_partial(details)
+
+    assert not isinstance(result, PartialClinVarSet)
+    assert result.cv_assertions[-1].pathogenicity == "None"
+
+
+def test_canonical_details():
+    all_details = load_details()
+    for details in all_details:
+        assert "[" + canonical_details(details) + "]" == encode_details([decode_details(details)])
+    assert join_details(all_details[:3]) == encode_details(map(decode_details, all_details[:3]))
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_merge_tsvs_partial(tmpdir, path):
+    for details_decoding in ("full", "partial"):
+        with contextlib.ExitStack() as stack:
+            inputf = stack.enter_context(open(path, "rt"))
+            outputf = stack.enter_context((tmpdir / details_decoding).open("wt"))
+            merge_tsvs(
+                "VER",
+                inputf,
+                outputf,
+                on_unsorted="ignore",
+                details_decoding=details_decoding,
+                verify=True,
+            )
+
+    assert (tmpdir / "partial").read_text("utf-8") == (tmpdir / "full").read_text("utf-8")
+
+
+def test_verify_details():
+    all_details = load_details()
+    verify_details("VCV1", join_details(all_details[:3]), all_details[:3])
+
+    details = all_details[0].replace(
+        '"""submitter_date""": """2017-02-17T00:00:00"""', '"""submitter_date""": """"""'
+    )
+    with pytest.raises(ClinvarTsvException, match=r"^Details of VCV1 differ .* offset 2\d\d\d: "):
+        verify_details("VCV1", join_details([details]), [details])
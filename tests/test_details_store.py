@@ -0,0 +1,52 @@
+import contextlib
+
+import pytest  # noqa
+
+from clinvar_tsv.details_store import INDEX_SUFFIX, DetailsStore
+from clinvar_tsv.merge_tsvs import HEADER_SUMMARY, merge_tsvs, merge_tsvs_partitioned
+
+PATH = "tests/data/parsed-in-context-74722873.37.tsv"
+
+
+def check_store(read_rows, full_path, summary_path, store_path):
+    full, summary = read_rows(full_path), read_rows(summary_path)
+    assert list(summary[0]) == list(HEADER_SUMMARY)
+    assert len(summary) == len(full)
+    with DetailsStore(store_path) as store:
+        for full_row, summary_row in zip(full, summary):
+            details, offset = full_row.pop("details"), int(summary_row.pop("details_offset"))
+            assert summary_row == full_row
+            assert store.read(offset) == (full_row["vcv"], details)
+            assert details in store.get(full_row["vcv"])
+            assert full_row["vcv"] in store
+        assert store.get("VCV-missing") == []
+        assert sum(map(len, store.index.values())) == len(full)
+
+
+@pytest.mark.parametrize("workers,max_group_mb", [(1, 64), (2, 64), (1, 0)])
+def test_merge_tsvs_details_store(tmpdir, read_rows, workers, max_group_mb):
+    kwargs = {"on_unsorted": "ignore", "workers": workers, "max_group_mb": max_group_mb}
+    with contextlib.ExitStack() as stack:
+        inputf = stack.enter_context(open(PATH, "rt"))
+        outputf = stack.enter_context((tmpdir / "full.tsv").open("wt"))
+        merge_tsvs("VER", inputf, outputf, **kwargs)
+    with contextlib.ExitStack() as stack:
+        inputf = stack.enter_context(open(PATH, "rt"))
+        outputf = stack.enter_context((tmpdir / "summary.tsv").open("wt"))
+        merge_tsvs("VER", inputf, outputf, details_store=str(tmpdir / "store.gz"), **kwargs)
+
+    assert (tmpdir / ("store.gz" + INDEX_SUFFIX)).exists()
+    check_store(
+        read_rows, str(tmpdir / "full.tsv"), str(tmpdir / "summary.tsv"), str(tmpdir / "store.gz")
+    )
+
+
+def test_merge_tsvs_partitioned_details_store(tmpdir, read_rows):
+    merge_tsvs_partitioned("VER", PATH, str(tmpdir / "full.tsv"), 3)
+    merge_tsvs_partitioned(
+        "VER", PATH, str(tmpdir / "summary.tsv"), 3, details_store=str(tmpdir / "store.gz")
+    )
+
+    check_store(
+        read_rows, str(tmpdir / "full.tsv"), str(tmpdir / "summary.tsv"), str(tmpdir / "store.gz")
+    )
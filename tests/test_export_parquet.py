@@ -0,0 +1,51 @@
+import pytest  # noqa
+
+from clinvar_tsv.common import as_pg_list, from_pg_list
+
+
+def test_from_pg_list():
+    for values in ([], ["BRCA1"], ["HGNC:1100", 'a, "quoted" value']):
+        assert from_pg_list(as_pg_list(values)) == values
+
+
+@pytest.mark.parametrize("with_details", [True, False])
+def test_export_parquet(tmpdir, merged_paths, read_rows, with_details):
+    pa = pytest.importorskip("pyarrow")
+    ds = pytest.importorskip("pyarrow.dataset")
+    from clinvar_tsv.export_parquet import export_parquet
+
+    paths = merged_paths
+    metrics = export_parquet(paths, str(tmpdir / "out"), with_details=with_details)
+
+    expected = read_rows(paths)
+    assert metrics == {"rows": len(expected)}
+    assert (tmpdir / "out" / "release=GRCh37" / "chromosome=1").exists()
+
+    dataset = ds.dataset(str(tmpdir / "out"), format="parquet", partitioning="hive")
+    assert dataset.schema.field("start").type == pa.int32()
+    assert dataset.schema.field("symbols").type == pa.list_(pa.string())
+    assert pa.types.is_dictionary(dataset.schema.field("summary_clinvar_pathogenicity_label").type)
+    assert ("details" in dataset.schema.names) == with_details
+
+    table = dataset.to_table()
+
+    def key(row):
+        return (
+            row["chromosome"],
+            int(row["start"]),
+            row["vcv"],
+            from_pg_list(row["symbols"]) if isinstance(row["symbols"], str) else row["symbols"],
+            int(row["summary_clinvar_gold_stars"]),
+            row.get("details") if with_details else None,
+        )
+
+    assert sorted(map(key, table.to_pylist())) == sorted(map(key, expected))
+
+    filtered = dataset.to_table(
+        filter=(ds.field("summary_clinvar_gold_stars") >= 2) & (ds.field("chromosome") == "1")
+    )
+    assert sorted(filtered.column("vcv").to_pylist()) == sorted(
+        row["vcv"]
+        for row in expected
+        if int(row["summary_clinvar_gold_stars"]) >= 2 and row["chromosome"] == "1"
+    )
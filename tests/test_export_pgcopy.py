@@ -0,0 +1,60 @@
+import gzip
+import json
+
+import pytest  # noqa
+
+from clinvar_tsv.common import from_pg_list
+from clinvar_tsv.export_pgcopy import (
+    PGCOPY_SIGNATURE,
+    column_type,
+    create_table_sql,
+    export_pgcopy,
+    read_pgcopy,
+)
+from clinvar_tsv.merge_tsvs import merge_tsvs
+
+
+def test_create_table_sql():
+    sql = create_table_sql("clinvar_small", ("chromosome", "end", "symbols", "details"))
+    assert sql == (
+        "CREATE TABLE clinvar_small (\n"
+        '    "chromosome" text,\n'
+        '    "end" integer,\n'
+        '    "symbols" text[],\n'
+        '    "details" jsonb\n'
+        ");\n"
+    )
+
+
+@pytest.mark.parametrize("path", ["parsed-in-context-74722873.37.tsv", "parsed-spta1.37.tsv"])
+def test_export_pgcopy_roundtrip(tmpdir, path):
+    merged_path = tmpdir / "merged.tsv"
+    with open("tests/data/" + path, "rt") as inputf, merged_path.open("wt") as outputf:
+        merge_tsvs("VER", inputf, outputf, on_unsorted="ignore")
+    with merged_path.open("rt") as inputf:
+        header = inputf.readline().rstrip("\n").split("\t")
+        rows = [line.rstrip("\n").split("\t") for line in inputf]
+
+    metrics = export_pgcopy(
+        str(merged_path), str(tmpdir / "out.copy.gz"), sql_path=str(tmpdir / "out.sql")
+    )
+    assert metrics == {"rows": len(rows)}
+    assert (tmpdir / "out.sql").read().startswith("CREATE TABLE clinvar (\n")
+
+    with gzip.open(str(tmpdir / "out.copy.gz"), "rb") as inputf:
+        assert inputf.read(len(PGCOPY_SIGNATURE)) == PGCOPY_SIGNATURE
+        inputf.seek(0)
+        decoded = list(read_pgcopy(inputf, [column_type(column) for column in header]))
+
+    assert len(decoded) == len(rows)
+    for row, values in zip(rows, decoded):
+        record = dict(zip(header, values))
+        expected = dict(zip(header, row))
+        assert record["chromosome"] == expected["chromosome"]
+        assert record["start"] == int(expected["start"])
+        assert record["summary_clinvar_gold_stars"] == int(expected["summary_clinvar_gold_stars"])
+        assert record["symbols"] == from_pg_list(expected["symbols"])
+        assert record["summary_paranoid_pathogenicity"] == from_pg_list(
+            expected["summary_paranoid_pathogenicity"]
+        )
+        assert record["details"] == json.loads(expected["details"].replace('"""', '"'))
@@ -0,0 +1,58 @@
+import json
+import sqlite3
+
+import pytest  # noqa
+
+from clinvar_tsv.common import from_pg_list
+from clinvar_tsv.export_sqlite import export_sqlite
+
+
+@pytest.mark.parametrize("batch_rows", [1, 1000])
+def test_export_sqlite(tmpdir, merged_paths, read_rows, batch_rows):
+    paths = merged_paths
+    db_path = str(tmpdir / "clinvar.db")
+    metrics = export_sqlite(paths, db_path, batch_rows=batch_rows)
+
+    expected = read_rows(paths)
+    assert metrics == {"rows": len(expected)}
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    indexes = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master")}
+    assert {
+        "clinvar_position",
+        "clinvar_vcv",
+        "clinvar_symbols_symbol",
+        "clinvar_hgnc_ids_hgnc_id",
+    } <= indexes
+
+    records = list(conn.execute("SELECT * FROM clinvar ORDER BY id"))
+    assert len(records) == len(expected)
+    for record, row in zip(records, expected):
+        assert record["vcv"] == row["vcv"]
+        assert record["start"] == int(row["start"])
+        assert record["summary_clinvar_gold_stars"] == int(row["summary_clinvar_gold_stars"])
+        assert json.loads(record["symbols"]) == from_pg_list(row["symbols"])
+        assert json.loads(record["details"]) == json.loads(row["details"].replace('"""', '"'))
+
+    symbol = from_pg_list(expected[0]["symbols"])[0]
+    by_symbol = conn.execute(
+        "SELECT clinvar.vcv FROM clinvar JOIN clinvar_symbols USING (id) WHERE symbol = ?",
+        (symbol,),
+    ).fetchall()
+    assert sorted(vcv for (vcv,) in by_symbol) == sorted(
+        row["vcv"] for row in expected if symbol in from_pg_list(row["symbols"])
+    )
+    plan = " ".join(
+        str(tuple(row))
+        for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM clinvar WHERE release = ? AND chromosome = ? "
+            "AND bin = ? AND start = ?",
+            ("GRCh37", "1", 0, 1),
+        )
+    )
+    assert "clinvar_position" in plan
+    conn.close()
+
+    # Existing databases are replaced.
+    assert export_sqlite(paths[:1], db_path) == {"rows": len(read_rows(paths[:1]))}
@@ -0,0 +1,107 @@
+import gzip
+
+import pytest  # noqa
+
+from clinvar_tsv.bgzf import BgzfReader
+from clinvar_tsv.common import from_pg_list
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.export_vcf import encode_info, export_vcf
+from clinvar_tsv.index import BinningIndex
+from clinvar_tsv.merge_tsvs import OUTPUT_SORT_COLUMNS, merge_tsvs
+from clinvar_tsv.sort_tsv import sort_key
+
+
+def merge_sorted(tmpdir):
+    """Return path of merged and sorted test data."""
+    unsorted_path, path = tmpdir / "merged.unsorted.tsv", tmpdir / "merged.tsv"
+    with open("tests/data/parsed-in-context-74722873.37.tsv", "rt") as inputf:
+        with unsorted_path.open("wt") as outputf:
+            merge_tsvs("VER", inputf, outputf, on_unsorted="ignore")
+    with unsorted_path.open("rt") as inputf, path.open("wt") as outputf:
+        outputf.write(inputf.readline())
+        lines = sorted(inputf, key=lambda line: sort_key(line, OUTPUT_SORT_COLUMNS))
+        outputf.writelines(lines)
+    return str(path)
+
+
+def test_encode_info():
+    assert encode_info("criteria provided, single submitter") == (
+        "criteria_provided%2C_single_submitter"
+    )
+    assert encode_info("a;b=c%") == "a%3Bb%3Dc%25"
+
+
+def test_export_vcf(tmpdir):
+    path = merge_sorted(tmpdir)
+    with open(path, "rt") as inputf:
+        header = inputf.readline().rstrip("\n").split("\t")
+        rows = [dict(zip(header, line.rstrip("\n").split("\t"))) for line in inputf]
+
+    vcf_path = str(tmpdir / "out.vcf.gz")
+    assert export_vcf(path, vcf_path) == {"records": len(rows), "skipped": 0}
+
+    with gzip.open(vcf_path, "rt") as inputf:
+        lines = inputf.read().splitlines()
+    meta = [line for line in lines if line.startswith("##")]
+    assert "##reference=GRCh37" in meta
+    assert "##clinvar_version=VER" in meta
+    assert any(line.startswith("##INFO=<ID=CLNSIG,") for line in meta)
+    records = [line.split("\t") for line in lines if not line.startswith("#")]
+    assert len(records) == len(rows)
+    for record, row in zip(records, rows):
+        assert record[:5] == [
+            row["chromosome"],
+            row["start"],
+            row["vcv"],
+            row["reference"],
+            row["alternative"],
+        ]
+        info = dict(item.split("=", 1) for item in record[7].split(";"))
+        assert info["VCV"] == row["vcv"]
+        assert info["GENE"].split(",") == from_pg_list(row["symbols"])
+        assert info["GOLD_STARS"] == row["summary_clinvar_gold_stars"]
+        assert info["CLNSIG"] == ",".join(
+            value.replace(" ", "_") for value in from_pg_list(row["summary_clinvar_pathogenicity"])
+        )
+
+    index = BinningIndex.load_csi(vcf_path + ".csi")
+    assert index.names == list(dict.fromkeys(row["chromosome"] for row in rows))
+    with BgzfReader.open(vcf_path) as reader:
+        for row in rows:
+            start = int(row["start"])
+            chunks = index.chunks(row["chromosome"], start - 1, start)
+            assert chunks
+            found = []
+            for chunk_beg, chunk_end in chunks:
+                reader.seek(chunk_beg)
+                while reader.tell() < chunk_end:
+                    found.append(reader.readline().decode().split("\t")[2])
+            assert row["vcv"] in found
+
+
+def test_export_vcf_not_contiguous(tmpdir):
+    path = tmpdir / "merged.tsv"
+    with open(merge_sorted(tmpdir), "rt") as inputf:
+        lines = inputf.readlines()
+    path.write("".join(lines[:1] + lines[-1:] + lines[1:]))
+    with pytest.raises(ClinvarTsvException, match="not contiguous"):
+        export_vcf(str(path), str(tmpdir / "out.vcf.gz"))
+
+
+def test_export_vcf_htslib(tmpdir):
+    pysam = pytest.importorskip("pysam")
+    path = merge_sorted(tmpdir)
+    with open(path, "rt") as inputf:
+        header = inputf.readline().rstrip("\n").split("\t")
+        rows = [dict(zip(header, line.rstrip("\n").split("\t"))) for line in inputf]
+    vcf_path = str(tmpdir / "out.vcf.gz")
+    export_vcf(path, vcf_path)
+
+    with pysam.VariantFile(vcf_path, index_filename=vcf_path + ".csi") as vcf:
+        assert vcf.header.contigs.keys() == list(dict.fromkeys(row["chromosome"] for row in rows))
+        for row in rows:
+            start = int(row["start"])
+            records = list(vcf.fetch(row["chromosome"], start - 1, start))
+            record = [record for record in records if record.id == row["vcv"]][0]
+            assert record.info["GOLD_STARS"] == int(row["summary_clinvar_gold_stars"])
+            assert list(record.info["GENE"]) == from_pg_list(row["symbols"])
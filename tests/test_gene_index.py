@@ -0,0 +1,160 @@
+import contextlib
+import gzip
+import io
+
+import pytest  # noqa
+
+from clinvar_tsv.bgzf import BgzfReader, BgzfWriter
+from clinvar_tsv.common import from_pg_list
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.gene_index import GENE_INDEX_SUFFIX, GeneIndex, GeneIndexWriter
+from clinvar_tsv.index import BinningIndex
+from clinvar_tsv.merge_tsvs import merge_tsvs, merge_tsvs_partitioned
+from clinvar_tsv.query import ClinVarReader
+from clinvar_tsv.sort_tsv import sort_tsv
+
+INPUT_PATH = "tests/data/parsed-in-context-74722873.37.tsv"
+
+
+def expected_records(path):
+    """Return rows of the BGZF table at ``path`` by gene symbol and HGNC ID."""
+    with gzip.open(path, "rt") as inputf:
+        header = inputf.readline().rstrip("\n").split("\t")
+        result = {}
+        for line in inputf:
+            record = dict(zip(header, line.rstrip("\n").split("\t")))
+            genes = from_pg_list(record["symbols"] or "{}")
+            genes += from_pg_list(record["hgnc_ids"] or "{}")
+            for gene in dict.fromkeys(genes):
+                result.setdefault(gene, []).append(record)
+    return result
+
+
+def check_gene_index(table_path):
+    expected = expected_records(table_path)
+    assert expected
+    with GeneIndex(table_path + GENE_INDEX_SUFFIX) as index:
+        assert index.genes == sorted(expected)
+        for gene, records in expected.items():
+            assert gene in index
+            assert index.records([gene]) == records
+        assert "NOGENE" not in index
+        assert index.records(["NOGENE"]) == []
+        genes = sorted(expected)[:3]
+        panel = index.records(genes + genes)
+        assert len(panel) == len({record["vcv"] for gene in genes for record in expected[gene]})
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_merge_tsvs_gene_index(tmpdir, workers):
+    sort_tsv(INPUT_PATH, str(tmpdir / "sorted.tsv"))
+    table_path = str(tmpdir / "merged.tsv.gz")
+    with contextlib.ExitStack() as stack:
+        inputf = stack.enter_context((tmpdir / "sorted.tsv").open("rt"))
+        outputf = stack.enter_context(BgzfWriter.open(table_path))
+        metrics = merge_tsvs(
+            "VER", inputf, outputf, workers=workers, gene_index=table_path + GENE_INDEX_SUFFIX
+        )
+    assert metrics["genes"] > 0
+    check_gene_index(table_path)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_merge_tsvs_streamed_groups_gene_index(tmpdir, workers):
+    sort_tsv(INPUT_PATH, str(tmpdir / "sorted.tsv"))
+    table_path = str(tmpdir / "merged.tsv.gz")
+    with contextlib.ExitStack() as stack:
+        inputf = stack.enter_context((tmpdir / "sorted.tsv").open("rt"))
+        outputf = stack.enter_context(BgzfWriter.open(table_path))
+        metrics = merge_tsvs(
+            "VER",
+            inputf,
+            outputf,
+            workers=workers,
+            max_group_mb=0,
+            tmp_dir=str(tmpdir),
+            gene_index=table_path + GENE_INDEX_SUFFIX,
+        )
+    assert metrics["streamed_groups"] == metrics["records_written"]
+    check_gene_index(table_path)
+
+
+@pytest.mark.parametrize("details_store", [False, True])
+def test_merge_tsvs_partitioned_gene_index(tmpdir, details_store):
+    table_path = str(tmpdir / "merged.tsv.gz")
+    merge_tsvs_partitioned(
+        "VER",
+        INPUT_PATH,
+        table_path,
+        3,
+        tmp_dir=str(tmpdir),
+        details_store=str(tmpdir / "details.bgz") if details_store else None,
+        gene_index=table_path + GENE_INDEX_SUFFIX,
+    )
+    check_gene_index(table_path)
+
+
+def test_gene_index_requires_bgzf(tmpdir):
+    sort_tsv(INPUT_PATH, str(tmpdir / "sorted.tsv"))
+    with (tmpdir / "sorted.tsv").open("rt") as inputf:
+        with pytest.raises(ClinvarTsvException):
+            merge_tsvs("VER", inputf, io.StringIO(), gene_index=str(tmpdir / "genes"))
+
+
+def test_gene_index_writer_parts(tmpdir):
+    with BgzfWriter.open(str(tmpdir / "table.tsv.gz")) as outputf:
+        writer = GeneIndexWriter(outputf)
+        writer.write("vcv\tsymbols\thgnc_ids\nVCV1\t")
+        writer.write('{"A","B"}\t{"HGNC:1"}\nVCV2\t{"B"}')
+        writer.write("\t\nVCV3\t\t\n")
+    offsets = writer.offsets
+    assert sorted(offsets) == ["A", "B", "HGNC:1"]
+    assert offsets["A"] == offsets["HGNC:1"] == offsets["B"][:1]
+    assert len(offsets["B"]) == 2
+
+    with BgzfWriter.open(str(tmpdir / "long.tsv.gz")) as outputf:
+        writer = GeneIndexWriter(outputf)
+        writer.write("vcv\tsymbols\thgnc_ids\tdetails\n")
+        writer.write('VCV1\t{"A"}\t{"HGNC:1"}\t')
+        for _ in range(1000):
+            writer.write("x" * 1000)
+            assert sum(map(len, writer._parts)) < 100  # rest of the row is not kept
+        writer.write('\nVCV2\t{"A"}\t\tdetails\n')
+    assert len(writer.offsets["A"]) == 2
+    assert len(writer.offsets["HGNC:1"]) == 1
+
+    with pytest.raises(ClinvarTsvException):
+        GeneIndexWriter(io.StringIO())
+    with BgzfWriter.open(str(tmpdir / "other.tsv.gz")) as outputf:
+        with pytest.raises(ClinvarTsvException):
+            GeneIndexWriter(outputf).write("vcv\tgenes\n")
+
+
+def test_clinvar_reader_by_gene(tmpdir):
+    sort_tsv(INPUT_PATH, str(tmpdir / "sorted.tsv"))
+    table_path = str(tmpdir / "merged.tsv.gz")
+    with contextlib.ExitStack() as stack:
+        inputf = stack.enter_context((tmpdir / "sorted.tsv").open("rt"))
+        outputf = stack.enter_context(BgzfWriter.open(table_path))
+        merge_tsvs("VER", inputf, outputf, gene_index=table_path + GENE_INDEX_SUFFIX)
+    binning = BinningIndex(tabix_conf=(0, 2, 3, 4, ord("#"), 1))
+    with BgzfReader.open(table_path) as reader:
+        reader.readline()
+        while True:
+            offset = reader.tell()
+            line = reader.readline()
+            if not line:
+                break
+            fields = line.decode("utf-8").split("\t")
+            binning.add(fields[1], int(fields[2]) - 1, int(fields[3]), offset, reader.tell())
+    binning.write_csi(table_path + ".csi")
+
+    expected = expected_records(table_path)
+    with ClinVarReader(table_path) as reader:
+        assert reader.gene_index is not None
+        for gene, records in expected.items():
+            assert reader.by_gene(gene) == records
+        assert reader._offsets is None  # no scan of the table
+        for record in expected[sorted(expected)[0]]:
+            assert record in reader.by_vcv(record["vcv"])
+        assert reader.offsets["gene"] == {}  # not built with the gene index
@@ -0,0 +1,67 @@
+import random
+
+import pytest  # noqa
+
+from clinvar_tsv.bgzf import BgzfReader, BgzfWriter
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.index import BinningIndex, reg2bin, reg2bins
+
+
+def test_reg2bin():
+    assert reg2bin(0, 1) == 4681
+    assert reg2bin(16384, 16385) == 4682
+    assert reg2bin(16383, 16385) == 585
+    assert reg2bin(0, 1 << 29) == 0
+    assert reg2bin(0, 1 << 30) == 0
+    assert reg2bins(0, 1) == [0, 1, 9, 73, 585, 4681]
+
+
+def test_binning_index_query(tmpdir):
+    rng = random.Random(42)
+    records = []
+    for chrom in ("1", "2", "X"):
+        starts = sorted(rng.randrange(0, 5_000_000) for _ in range(2000))
+        for start in starts:
+            length = rng.choice((1, 1, 1, 50, 20_000, 300_000))
+            records.append((chrom, start, start + length))
+
+    path = str(tmpdir / "records.txt.gz")
+    binning = BinningIndex(tabix_conf=(0, 1, 2, 3, ord("#"), 0))
+    with BgzfWriter.open(path) as writer:
+        writer.write("#header\n")
+        offset = writer.tell()
+        for chrom, start, end in records:
+            writer.write("%s\t%d\t%d\n" % (chrom, start + 1, end))
+            next_offset = writer.tell()
+            binning.add(chrom, start, end, offset, next_offset)
+            offset = next_offset
+    binning.write_csi(str(tmpdir / "records.txt.gz.csi"))
+
+    loaded = BinningIndex.load_csi(str(tmpdir / "records.txt.gz.csi"))
+    assert loaded.names == ["1", "2", "X"]
+    assert loaded.tabix_conf == (0, 1, 2, 3, ord("#"), 0)
+    assert [loaded.refs[name].n_records for name in loaded.names] == [2000, 2000, 2000]
+
+    with BgzfReader.open(path) as reader:
+        for _ in range(200):
+            chrom = rng.choice(("1", "2", "X", "Y"))
+            beg = rng.randrange(0, 5_500_000)
+            end = beg + rng.choice((1, 100, 100_000))
+            expected = [r for r in records if r[0] == chrom and r[1] < end and r[2] > beg]
+            found = []
+            for chunk_beg, chunk_end in loaded.chunks(chrom, beg, end):
+                reader.seek(chunk_beg)
+                while reader.tell() < chunk_end:
+                    name, start, stop = reader.readline().decode().split("\t")
+                    record = (name, int(start) - 1, int(stop))
+                    if record[0] == chrom and record[1] < end and record[2] > beg:
+                        found.append(record)
+            assert found == expected
+
+
+def test_binning_index_not_contiguous():
+    binning = BinningIndex()
+    binning.add("1", 0, 1, 0, 10)
+    binning.add("2", 0, 1, 10, 20)
+    with pytest.raises(ClinvarTsvException):
+        binning.add("1", 5, 6, 20, 30)
@@ -0,0 +1,52 @@
+import pytest  # noqa
+
+from clinvar_tsv.common import from_pg_list
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.lookup import RECORD_SIZE, LookupFile, build_lookup
+from clinvar_tsv.merge_tsvs import merge_tsvs
+
+
+def test_lookup(tmpdir):
+    merged_path = tmpdir / "merged.tsv"
+    with open("tests/data/parsed-in-context-74722873.37.tsv", "rt") as inputf:
+        with merged_path.open("wt") as outputf:
+            merge_tsvs("VER", inputf, outputf, on_unsorted="ignore")
+    with merged_path.open("rt") as inputf:
+        header = inputf.readline().rstrip("\n").split("\t")
+        rows = [dict(zip(header, line.rstrip("\n").split("\t"))) for line in inputf]
+
+    path = str(tmpdir / "clinvar.lookup")
+    assert build_lookup(str(merged_path), path) == {"records": len(rows)}
+    assert RECORD_SIZE == 20
+
+    with LookupFile(path) as lookup:
+        assert len(lookup) == len(rows)
+        assert lookup.release == "GRCh37"
+        assert lookup.clinvar_version == "VER"
+        for row in rows:
+            args = (row["chromosome"], int(row["start"]), row["reference"], row["alternative"])
+            records = lookup.lookup(*args)
+            assert row["vcv"] in [record.vcv for record in records]
+            record = [record for record in records if record.vcv == row["vcv"]][0]
+            assert record.chromosome == row["chromosome"]
+            assert record.position == int(row["start"])
+            assert record.gold_stars == int(row["summary_clinvar_gold_stars"])
+            assert sorted(p.label() for p in record.pathogenicities) == sorted(
+                from_pg_list(row["summary_clinvar_pathogenicity"])
+            )
+            assert record.conflicting == (
+                "conflicting" in row["summary_clinvar_review_status_label"]
+            )
+            assert lookup.lookup(args[0], args[1], args[2], args[3] + "A") == []
+            assert lookup.lookup(args[0], args[1] + 1, args[2], args[3]) == []
+        assert lookup.lookup("unknown", 1, "A", "C") == []
+
+
+def test_lookup_invalid(tmpdir):
+    path = tmpdir / "invalid.lookup"
+    path.write("not a lookup file")
+    with pytest.raises(ClinvarTsvException):
+        LookupFile(str(path))
+    path.write("")
+    with pytest.raises(ClinvarTsvException, match="Not a lookup file"):
+        LookupFile(str(path))
@@ -0,0 +1,74 @@
+import tracemalloc
+
+import pytest  # noqa
+
+from clinvar_tsv.memprofile import TIMELINE_HEADER, MemoryProfiler
+
+
+def test_memory_profiler_disabled():
+    with MemoryProfiler() as mem_profiler:
+        for _ in range(10):
+            mem_profiler.tick()
+    assert mem_profiler.records == 10
+
+
+def test_memory_profiler_timeline(tmpdir):
+    path = str(tmpdir / "timeline.tsv")
+    with MemoryProfiler(path, interval=4) as mem_profiler:
+        for _ in range(10):
+            mem_profiler.tick()
+
+    with open(path, "rt") as inputf:
+        rows = [line.rstrip("\n").split("\t") for line in inputf]
+    assert rows[0] == list(TIMELINE_HEADER)
+    assert [row[0] for row in rows[1:]] == ["0", "4", "8", "10"]
+    assert all(int(row[2]) > 0 for row in rows[1:])
+    assert all(row[-1] == "." for row in rows[1:])
+
+
+def test_memory_profiler_top_allocations(tmpdir):
+    path = str(tmpdir / "timeline.tsv")
+    data = []
+    with MemoryProfiler(path, interval=2, top_allocations=3) as mem_profiler:
+        for i in range(4):
+            data.append(bytearray(100_000))
+            mem_profiler.tick()
+
+    with open(path, "rt") as inputf:
+        rows = [line.rstrip("\n").split("\t") for line in inputf]
+    assert int(rows[-1][4]) >= 400_000
+    assert "test_memprofile.py" in rows[-1][-1]
+    assert len(rows[-1][-1].split(";")) <= 3
+
+
+def test_memory_profiler_caller_tracing(tmpdir):
+    tracemalloc.start()
+    try:
+        with MemoryProfiler(str(tmpdir / "timeline.tsv"), top_allocations=3) as mem_profiler:
+            mem_profiler.tick()
+        assert tracemalloc.is_tracing()  # not stopped by the profiler
+    finally:
+        tracemalloc.stop()
+    with MemoryProfiler(str(tmpdir / "timeline.tsv"), top_allocations=3):
+        assert tracemalloc.is_tracing()
+    assert not tracemalloc.is_tracing()
+
+
+def test_memory_profiler_nested(tmpdir):
+    path = str(tmpdir / "timeline.tsv")
+    with MemoryProfiler(path, interval=100) as mem_profiler:
+        with mem_profiler:
+            mem_profiler.tick()
+        mem_profiler.tick()
+
+    with open(path, "rt") as inputf:
+        rows = [line.rstrip("\n").split("\t") for line in inputf]
+    assert [row[0] for row in rows[1:]] == ["0", "2"]
+
+
+def test_memory_profiler_for_worker(tmpdir):
+    path = str(tmpdir / "timeline.tsv")
+    worker_profiler = MemoryProfiler(path, interval=4, top_allocations=2).for_worker("w0")
+    assert worker_profiler.path == path + ".w0"
+    assert (worker_profiler.interval, worker_profiler.top_allocations) == (4, 2)
+    assert MemoryProfiler().for_worker("w0").path is None
@@ -1,14 +1,23 @@
 import contextlib
+import os
 
 import pytest  # noqa
 
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.memprofile import MemoryProfiler
 from clinvar_tsv.merge_tsvs import (
+    CompactReviewedPathogenicity,
     Pathogenicity,
     ReviewedPathogenicity,
     ReviewStatus,
+    SummaryCache,
     merge_tsvs,
+    merge_tsvs_partitioned,
+    partition_tsv,
     summarize,
+    summary_fields,
 )
+from clinvar_tsv.sort_tsv import sort_tsv
 
 
 def test_summarize_stratified_single(cvs_factory, rcva_factory, cva_factory):
@@ -492,6 +501,49 @@ def test_summarize_practice_guideline(cvs_factory, rcva_factory, cva_factory):
     assert result.gold_stars() == 4
 
 
+def test_compact_reviewed_pathogenicity():
+    labels = [
+        ("criteria provided, single submitter", "pathogenic/likely pathogenic"),
+        ("no assertion criteria provided", "benign, benign"),
+        ("reviewed by expert panel", "likely pathogenic - low penetrance"),
+    ]
+    rps = [ReviewedPathogenicity.from_labels(*pair, "VCV1") for pair in labels]
+    compact = [CompactReviewedPathogenicity.from_labels(*pair, "VCV1") for pair in labels]
+
+    assert [rp.compact() for rp in rps] == compact
+    assert compact[1] == CompactReviewedPathogenicity(
+        mask=1 << ReviewStatus.NO_ASSERTION_CRITERIA_PROVIDED.value,
+        num_statuses=1,
+        counts=(2, 0, 0, 0, 0),
+    )
+    assert [rp.gold_stars() for rp in rps] == [rp.gold_stars() for rp in compact] == [1, 0, 3]
+
+    combined = CompactReviewedPathogenicity.combine(compact)
+    assert combined.expand() == ReviewedPathogenicity.combine(rps)
+    assert combined.expand() == ReviewedPathogenicity(
+        review_statuses=(
+            ReviewStatus.MULTIPLE_SUBMITTERS,
+            ReviewStatus.CRITERIA_PROVIDED,
+            ReviewStatus.CONFLICTING_INTERPRETATIONS,
+        ),
+        pathogenicities=(
+            Pathogenicity.BENIGN,
+            Pathogenicity.BENIGN,
+            Pathogenicity.LIKELY_PATHOGENIC,
+            Pathogenicity.LIKELY_PATHOGENIC,
+            Pathogenicity.PATHOGENIC,
+        ),
+    )
+    assert combined.review_status_label() == (
+        "multiple submitters, criteria provided, conflicting interpretations"
+    )
+    assert combined.pathogenicity_label() == (
+        "conflicting interpretations of pathogenicity - "
+        "benign (2); likely pathogenic (2); pathogenic (1)"
+    )
+    assert combined.pathogenicity_list(all_on_conflicts=False) == ["uncertain significance"]
+
+
 def test_merge_tsvs_spta1(tmpdir):
     with contextlib.ExitStack() as stack:
         inputf = stack.push(open("tests/data/parsed-74722873.37.tsv", "rt"))
@@ -554,3 +606,153 @@ def test_merge_tsvs_spta1(tmpdir):
             '{"benign","uncertain significance"}',
             "1",
         ]
+
+
+def test_merge_tsvs_unsorted(tmpdir):
+    with open("tests/data/parsed-in-context-74722873.37.tsv", "rt") as inputf:
+        with pytest.raises(ClinvarTsvException, match=r":5: row 8:30567424-30567424 VCV000377268 "):
+            merge_tsvs("VER", inputf, (tmpdir / "merged.tsv").open("wt"))
+
+    with open("tests/data/parsed-in-context-74722873.37.tsv", "rt") as inputf:
+        with (tmpdir / "merged.tsv").open("wt") as outputf:
+            merge_tsvs("VER", inputf, outputf, on_unsorted="warn")
+    assert len((tmpdir / "merged.tsv").read_text("utf-8").splitlines()) == 71
+
+
+@pytest.mark.parametrize("max_inflight_mb", [0, 16])
+def test_merge_tsvs_workers(tmpdir, max_inflight_mb):
+    for workers in (1, 2):
+        with contextlib.ExitStack() as stack:
+            inputf = stack.enter_context(open("tests/data/parsed-in-context-74722873.37.tsv"))
+            outputf = stack.enter_context((tmpdir / ("out-%d.tsv" % workers)).open("wt"))
+            merge_tsvs(
+                "VER",
+                inputf,
+                outputf,
+                on_unsorted="ignore",
+                workers=workers,
+                batch_rows=7,
+                max_inflight_mb=max_inflight_mb,
+            )
+
+    assert (tmpdir / "out-2.tsv").read_text("utf-8") == (tmpdir / "out-1.tsv").read_text("utf-8")
+
+
+def test_summary_cache(cvs_factory, cva_factory):
+    def make_chunk(*profile):
+        return [
+            cvs_factory(
+                cv_assertions=tuple(
+                    cva_factory(review_status=review_status, pathogenicity=pathogenicity)
+                    for review_status, pathogenicity in profile
+                )
+            )
+        ]
+
+    single = ("criteria provided, single submitter", "benign")
+    none = ("no assertion criteria provided", "pathogenic")
+    cache = SummaryCache()
+    chunks = [make_chunk(single, none), make_chunk(none, single), make_chunk(single)]
+
+    results = [cache.summary_fields(chunk) for chunk in chunks]
+
+    assert results == [summary_fields(chunk) for chunk in chunks]
+    assert results[0][:4] == (
+        "single submitter, criteria provided",
+        "benign",
+        '{"benign"}',
+        "1",
+    )
+    assert cache.metrics() == {"hits": 1, "misses": 2, "size": 2, "hit_rate": 0.3333}
+
+
+def test_merge_tsvs_metrics(tmpdir):
+    with open("tests/data/parsed-spta1.37.tsv", "rt") as inputf:
+        with (tmpdir / "out.tsv").open("wt") as outputf:
+            metrics = merge_tsvs("VER", inputf, outputf)
+
+    assert metrics == {
+        "records_read": 2,
+        "records_written": 1,
+        "streamed_groups": 0,
+        "summary_cache": {"hits": 0, "misses": 1, "size": 1, "hit_rate": 0.0},
+    }
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("details_decoding", ["full", "partial"])
+def test_merge_tsvs_streamed_groups(tmpdir, workers, details_decoding):
+    for path in ("tests/data/parsed-in-context-74722873.37.tsv", "tests/data/parsed-spta1.37.tsv"):
+        kwargs = {"on_unsorted": "ignore", "details_decoding": details_decoding}
+        with contextlib.ExitStack() as stack:
+            inputf = stack.enter_context(open(path, "rt"))
+            outputf = stack.enter_context((tmpdir / "expected.tsv").open("wt"))
+            merge_tsvs("VER", inputf, outputf, **kwargs)
+        with contextlib.ExitStack() as stack:
+            inputf = stack.enter_context(open(path, "rt"))
+            outputf = stack.enter_context((tmpdir / "streamed.tsv").open("wt"))
+            metrics = merge_tsvs(
+                "VER",
+                inputf,
+                outputf,
+                workers=workers,
+                max_group_mb=0,
+                tmp_dir=str(tmpdir),
+                verify=True,
+                **kwargs,
+            )
+
+        assert metrics["streamed_groups"] == metrics["records_written"]
+        assert (tmpdir / "streamed.tsv").read_text("utf-8") == (tmpdir / "expected.tsv").read_text(
+            "utf-8"
+        )
+
+
+def test_partition_tsv(tmpdir):
+    path = "tests/data/parsed-in-context-74722873.37.tsv"
+    paths = partition_tsv(path, 3, str(tmpdir))
+
+    with open(path, "rt") as inputf:
+        header = inputf.readline()
+        expected = sorted(line for line in inputf if line != "\n")
+    rows, vcvs = [], []
+    for part_path in paths:
+        with open(part_path, "rt") as inputf:
+            assert inputf.readline() == header
+            lines = list(inputf)
+        rows += lines
+        vcvs.append({line.split("\t")[10] for line in lines})
+    assert sorted(rows) == expected
+    assert all(len(vcvs[i] & vcvs[j]) == 0 for i in range(3) for j in range(i + 1, 3))
+
+
+@pytest.mark.parametrize("partitions,workers", [(1, 1), (3, 1), (7, 2)])
+def test_merge_tsvs_partitioned(tmpdir, partitions, workers):
+    for path in ("tests/data/parsed-in-context-74722873.37.tsv", "tests/data/parsed-spta1.37.tsv"):
+        sort_tsv(path, str(tmpdir / "sorted.tsv"))
+        with contextlib.ExitStack() as stack:
+            inputf = stack.enter_context((tmpdir / "sorted.tsv").open("rt"))
+            outputf = stack.enter_context((tmpdir / "expected.tsv").open("wt"))
+            expected_metrics = merge_tsvs("VER", inputf, outputf)
+
+        timeline = str(tmpdir / "timeline.tsv")
+        with MemoryProfiler(timeline, interval=10) as mem_profiler:
+            metrics = merge_tsvs_partitioned(
+                "VER",
+                path,
+                str(tmpdir / "partitioned.tsv"),
+                partitions,
+                mem_profiler=mem_profiler,
+                details_decoding="partial",
+                workers=workers,
+                tmp_dir=str(tmpdir),
+            )
+        worker_timelines = [timeline + ".partition.%d" % i for i in range(partitions)]
+        assert all(os.path.exists(name) == (workers > 1) for name in worker_timelines)
+
+        assert metrics["partitions"] == partitions
+        assert metrics["records_read"] == expected_metrics["records_read"]
+        assert metrics["records_written"] == expected_metrics["records_written"]
+        assert (tmpdir / "partitioned.tsv").read_text("utf-8") == (
+            tmpdir / "expected.tsv"
+        ).read_text("utf-8")
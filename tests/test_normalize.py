@@ -0,0 +1,95 @@
+import io
+
+import pysam
+import pytest  # noqa
+
+from clinvar_tsv.normalize import normalize_sv_tab_delimited_file, normalize_tab_delimited_file
+
+HEADER = "release\tchromosome\tstart\tend\tbin\treference\talternative\tvcv\n"
+
+
+@pytest.fixture
+def reference(tmpdir):
+    path = tmpdir / "ref.fa"
+    with path.open("wt") as outputf:
+        print(">1\nACGTACGTTTGACCAGTACGTACGT", file=outputf)
+    pysam.faidx(str(path))
+    return str(path)
+
+
+def test_normalize_tab_delimited_file(reference):
+    infile = io.StringIO(
+        HEADER
+        + "GRCh37\t1\t3\t3\t585\tG\tA\tVCV1\n"
+        + "GRCh37\t1\t10\t10\t585\tT\t-\tVCV2\n"
+        + "GRCh37\t1\t3\t3\t585\tC\tA\tVCV3\n"
+        + "GRCh37\t1\t3\t3\t585\tG\tG\tVCV4\n"
+        + "GRCh37\t1\t3\t3\t585\tG\tX\tVCV5\n"
+        + "GRCh37\t2\t3\t3\t585\tG\tA\tVCV6\n"
+    )
+    outfile = io.StringIO()
+    rejected = io.StringIO()
+
+    metrics = normalize_tab_delimited_file(
+        infile, outfile, reference, verbose=False, rejected=rejected
+    )
+
+    assert metrics == {
+        "records_written": 2,
+        "records_rejected": {
+            "unknown_contig": 1,
+            "ref_equals_alt": 1,
+            "wrong_ref": 1,
+            "invalid_nucleotide": 1,
+        },
+    }
+    assert outfile.getvalue() == (
+        HEADER
+        + "GRCh37\t1\t3\t3\t585\tG\tA\tVCV1\n"
+        + "GRCh37\t1\t7\t8\t585\tGT\tG\tVCV2\n"
+        + "\n\n"
+    )
+    lines = rejected.getvalue().splitlines()
+    assert lines[0] == "reason\tmessage\t" + HEADER.rstrip("\n")
+    assert [line.split("\t")[0] for line in lines[1:]] == [
+        "wrong_ref",
+        "ref_equals_alt",
+        "invalid_nucleotide",
+        "unknown_contig",
+    ]
+    assert [line.split("\t")[-1] for line in lines[1:]] == ["VCV3", "VCV4", "VCV5", "VCV6"]
+    assert lines[1].split("\t")[1].startswith("Incorrect REF value: 1 3 C A")
+
+
+def test_normalize_sv_tab_delimited_file(reference):
+    infile = io.StringIO(
+        HEADER
+        + "GRCh37\tchr1\t3\t10\t0\t.\t.\tVCV1\n"
+        + "GRCh37\t1\t10\t3\t0\t.\t.\tVCV2\n"
+        + "GRCh37\t1\t0\t100\t0\t.\t.\tVCV3\n"
+        + "GRCh37\t1\t30\t100\t0\t.\t.\tVCV4\n"
+        + "GRCh37\t1\tNone\t100\t0\t.\t.\tVCV5\n"
+        + "GRCh37\t2\t3\t10\t0\t.\t.\tVCV6\n"
+    )
+    outfile = io.StringIO()
+    rejected = io.StringIO()
+
+    metrics = normalize_sv_tab_delimited_file(
+        infile, outfile, reference, verbose=False, rejected=rejected
+    )
+
+    assert metrics == {
+        "records_written": 3,
+        "records_rejected": {"unknown_contig": 1, "invalid_coordinates": 2},
+    }
+    assert outfile.getvalue() == (
+        HEADER
+        + "GRCh37\t1\t3\t10\t585\t.\t.\tVCV1\n"
+        + "GRCh37\t1\t3\t10\t585\t.\t.\tVCV2\n"
+        + "GRCh37\t1\t1\t25\t585\t.\t.\tVCV3\n"
+    )
+    assert [line.split("\t")[0] for line in rejected.getvalue().splitlines()[1:]] == [
+        "invalid_coordinates",
+        "invalid_coordinates",
+        "unknown_contig",
+    ]
@@ -0,0 +1,79 @@
+import random
+
+import pytest  # noqa
+
+from clinvar_tsv.common import from_pg_list
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.query import BATCH_SEEK_DISTANCE, ClinVarReader
+
+
+@pytest.mark.parametrize("index_format", ["csi", "tbi"])
+def test_clinvar_reader(indexed_table, index_format):
+    path, records = indexed_table(index_format)
+    rng = random.Random(42)
+
+    with ClinVarReader(path, cache_blocks=2) as reader:
+        assert reader.header[:3] == ("release", "chromosome", "start")
+        for record in records:
+            chrom, start = record["chromosome"], int(record["start"])
+            found = reader.point(chrom, start, record["reference"], record["alternative"])
+            assert record in found
+            assert record in reader.point(chrom, start)
+            assert reader.point(chrom, start, record["reference"], "N") == []
+            assert record in reader.by_vcv(record["vcv"])
+            for gene in from_pg_list(record["symbols"]) + from_pg_list(record["hgnc_ids"]):
+                assert record in reader.by_gene(gene)
+        assert reader.by_vcv("VCV999999999") == []
+        assert reader.by_gene("NO-SUCH-GENE") == []
+
+        for _ in range(50):
+            chrom = rng.choice([record["chromosome"] for record in records] + ["Y"])
+            start = rng.randrange(1, 250_000_000)
+            end = start + rng.choice((0, 1000, 10_000_000))
+            expected = [
+                record
+                for record in records
+                if record["chromosome"] == chrom
+                and int(record["start"]) <= end
+                and int(record["end"]) >= start
+            ]
+            assert list(reader.region(chrom, start, end)) == expected
+
+        queries = [
+            (record["chromosome"], int(record["start"]), record["reference"], record["alternative"])
+            for record in records
+        ]
+        queries += [(chrom, pos + 1, ref, alt) for chrom, pos, ref, alt in queries[:10]]
+        queries += [("Y", 1, "A", "C")]
+        rng.shuffle(queries)
+        assert reader.batch(queries) == [reader.point(*query) for query in queries]
+
+
+def test_clinvar_reader_batch_seeks(indexed_table, monkeypatch):
+    path, records = indexed_table()
+    streams = []
+    stream = ClinVarReader.stream
+
+    def counting_stream(self, chromosome, position):
+        streams.append((chromosome, position))
+        return stream(self, chromosome, position)
+
+    monkeypatch.setattr(ClinVarReader, "stream", counting_stream)
+    starts = {}
+    for record in records:
+        starts.setdefault(record["chromosome"], []).append(int(record["start"]))
+    chrom, positions = max(starts.items(), key=lambda item: item[1][-1] - item[1][0])
+    first, last = positions[0], positions[-1]
+    assert last - first > BATCH_SEEK_DISTANCE
+
+    with ClinVarReader(path) as reader:
+        queries = [(chrom, position, "A", "C") for position in (last, first, first + 1, last + 1)]
+        reader.batch(queries)
+        assert streams == [(chrom, first), (chrom, last)]  # sparse queries seek
+
+
+def test_clinvar_reader_no_index(tmpdir):
+    path = tmpdir / "merged.tsv.gz"
+    path.write("")
+    with pytest.raises(ClinvarTsvException, match="No index"):
+        ClinVarReader(str(path))
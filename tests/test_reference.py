@@ -0,0 +1,110 @@
+import re
+import struct
+
+import pysam
+import pytest  # noqa
+
+from clinvar_tsv.normalize import normalize
+from clinvar_tsv.reference import (
+    MmapReference,
+    TwoBitReference,
+    build_mmap_reference,
+    open_reference,
+)
+
+SEQS = {
+    "1": "NNNNACGTACGTTTGACCAGTacgtacgtNNNNNNGGATCCAAGGCTTAGAATTCCATGGnn",
+    "chrM": "GATCACAGGTCTATCACCCTATTAACCACTCACGGGAGCTCTCCATGCATTTGGTAT",
+}
+
+
+def write_fasta(path):
+    with open(path, "wt") as outputf:
+        for name, seq in SEQS.items():
+            print(">%s description" % name, file=outputf)
+            for i in range(0, len(seq), 10):
+                print(seq[i : i + 10], file=outputf)
+    pysam.faidx(str(path))
+
+
+def write_twobit(path):
+    """Write ``SEQS`` in 2bit format."""
+    names = list(SEQS)
+    records = []
+    for name in names:
+        seq = SEQS[name]
+        n_blocks = [m.span() for m in re.finditer("[Nn]+", seq)]
+        mask_blocks = [m.span() for m in re.finditer("[a-z]+", seq)]
+        bases = seq.upper().replace("N", "T")
+        bases += "T" * (-len(bases) % 4)
+        packed = bytes(
+            sum("TCAG".index(base) << shift for base, shift in zip(bases[i : i + 4], (6, 4, 2, 0)))
+            for i in range(0, len(bases), 4)
+        )
+        record = struct.pack("<2I", len(seq), len(n_blocks))
+        record += struct.pack("<%dI" % len(n_blocks), *(s for s, _ in n_blocks))
+        record += struct.pack("<%dI" % len(n_blocks), *(e - s for s, e in n_blocks))
+        record += struct.pack("<I", len(mask_blocks))
+        record += struct.pack("<%dI" % len(mask_blocks), *(s for s, _ in mask_blocks))
+        record += struct.pack("<%dI" % len(mask_blocks), *(e - s for s, e in mask_blocks))
+        records.append(record + struct.pack("<I", 0) + packed)
+    header = struct.pack("<4I", 0x1A412743, 0, len(names), 0)
+    offset = len(header) + sum(1 + len(name) + 4 for name in names)
+    index = b""
+    for name, record in zip(names, records):
+        index += struct.pack("<B", len(name)) + name.encode() + struct.pack("<I", offset)
+        offset += len(record)
+    with open(path, "wb") as outputf:
+        outputf.write(header + index + b"".join(records))
+
+
+@pytest.fixture
+def references(tmpdir):
+    write_fasta(tmpdir / "ref.fa")
+    build_mmap_reference(str(tmpdir / "ref.fa"), str(tmpdir / "ref.mmseq"))
+    write_twobit(tmpdir / "ref.2bit")
+    return {
+        "fasta": open_reference(str(tmpdir / "ref.fa")),
+        "mmap": open_reference(str(tmpdir / "ref.mmseq")),
+        "2bit": open_reference(str(tmpdir / "ref.2bit")),
+    }
+
+
+def test_open_reference(references):
+    assert isinstance(references["mmap"], MmapReference)
+    assert isinstance(references["2bit"], TwoBitReference)
+    for backend in ("mmap", "2bit"):
+        assert references[backend].references == tuple(references["fasta"].references)
+        assert references[backend].lengths == tuple(references["fasta"].lengths)
+        assert references[backend].get_reference_length("chrM") == len(SEQS["chrM"])
+
+
+@pytest.mark.parametrize("backend", ["mmap", "2bit"])
+def test_fetch_same_as_fasta(references, backend):
+    fasta = references["fasta"]
+    for name, seq in SEQS.items():
+        for start in range(len(seq) + 1):
+            for end in range(start, len(seq) + 3):
+                assert references[backend].fetch(name, start, end) == fasta.fetch(
+                    name, start, end
+                ), (name, start, end)
+        assert references[backend].fetch(name) == seq
+
+
+@pytest.mark.parametrize("backend", ["mmap", "2bit"])
+def test_fetch_errors(references, backend):
+    with pytest.raises(KeyError):
+        references[backend].fetch("2", 0, 1)
+    with pytest.raises(ValueError):
+        references[backend].fetch("1", -1, 1)
+
+
+@pytest.mark.parametrize("backend", ["mmap", "2bit"])
+def test_normalize_same_as_fasta(references, backend):
+    for variant in (
+        ("1", 21, "T", "C"),
+        ("1", 14, "T", "-"),
+        ("1", 13, "-", "T"),
+        ("chrM", 12, "TATCA", "TA"),
+    ):
+        assert normalize(references[backend], *variant) == normalize(references["fasta"], *variant)
@@ -0,0 +1,181 @@
+import asyncio
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import pytest  # noqa
+
+from clinvar_tsv.gene_index import GENE_INDEX_SUFFIX
+from clinvar_tsv.serve import LookupServer, file_signature, json_record
+
+
+class Client:
+    """Client of a ``LookupServer`` running in a thread."""
+
+    def __init__(self, paths, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.server = LookupServer(paths, **kwargs)
+        self.port = self._run(self.server.start("127.0.0.1", 0))
+        self.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout=10)
+
+    def request(self, method, path, body=None):
+        data = None if body is None else json.dumps(body)
+        self.connection.request(method, path, data)
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def close(self):
+        self.connection.close()
+        self._run(self.server.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+@pytest.fixture
+def merged(tmpdir, merged_lines, write_indexed):
+    header, lines = merged_lines
+    path = str(tmpdir / "merged.tsv.gz")
+    return path, header, lines, write_indexed(path, header, lines)
+
+
+def test_serve_query(merged):
+    path, _, _, records = merged
+    client = Client([path], reload_interval=0)
+    try:
+        record = records[0]
+        variant = {
+            "chromosome": record["chromosome"],
+            "position": int(record["start"]),
+            "reference": record["reference"],
+            "alternative": record["alternative"],
+        }
+        gene = json_record(record)["symbols"][0]
+        body = {
+            "variants": [variant, dict(variant, position=1), dict(variant, release="GRCh38")],
+            "vcvs": [record["vcv"], "VCV999999999"],
+            "genes": [gene],
+        }
+        status, answer = client.request("POST", "/query", body)
+        assert status == 200
+        assert answer["generation"] == 1
+        assert json_record(record) in answer["variants"][0]
+        assert answer["variants"][1:] == [[], []]
+        assert answer["vcvs"][0] == [json_record(r) for r in records if r["vcv"] == record["vcv"]]
+        assert answer["vcvs"][1] == []
+        assert all(gene in found["symbols"] for found in answer["genes"][0])
+        assert isinstance(answer["vcvs"][0][0]["start"], int)
+        assert isinstance(answer["vcvs"][0][0]["details"], list)
+
+        # Second request on the same connection is answered from the cache.
+        assert client.request("POST", "/query", body) == (status, answer)
+        status, info = client.request("GET", "/status")
+        assert status == 200
+        assert info["records"] == {path: len(records)}
+        assert info["cache"] == {"size": 6, "hits": 6, "misses": 6}
+    finally:
+        client.close()
+
+
+@pytest.mark.parametrize(
+    "method,path,body,status",
+    [
+        ("POST", "/query", [], 400),
+        ("POST", "/query", {"variants": [{"chromosome": "1"}]}, 400),
+        ("POST", "/query", {"variants": [{"chromosome": "1", "position": "1"}]}, 400),
+        ("POST", "/query", {"vcvs": "VCV000000001"}, 400),
+        ("POST", "/query", {"regions": []}, 400),
+        ("GET", "/query", None, 405),
+        ("GET", "/missing", None, 404),
+    ],
+)
+def test_serve_invalid(merged, method, path, body, status):
+    client = Client([merged[0]], reload_interval=0)
+    try:
+        assert client.request(method, path, body)[0] == status
+        assert client.request("GET", "/status")[0] == 200
+    finally:
+        client.close()
+
+
+def test_serve_reload(merged, write_indexed):
+    path, header, lines, records = merged
+    client = Client([path], reload_interval=0)
+    try:
+        body = {"vcvs": [records[0]["vcv"], records[-1]["vcv"]]}
+        _, answer = client.request("POST", "/query", body)
+        assert all(answer["vcvs"])
+
+        write_indexed(path, header, lines[1:-1])
+        status, info = client.request("POST", "/reload")
+        assert status == 200
+        assert info["generation"] == 2
+        assert info["records"] == {path: len(lines) - 2}
+        assert info["cache"]["size"] == 0
+        _, answer = client.request("POST", "/query", body)
+        assert answer == {"generation": 2, "vcvs": [[], []], "variants": [], "genes": []}
+
+        # A failed reload keeps the current snapshot.
+        os.rename(path + ".csi", path + ".csi.bak")
+        status, _ = client.request("POST", "/reload")
+        assert status == 503
+        assert client.request("GET", "/status")[1]["generation"] == 2
+    finally:
+        client.close()
+
+
+def test_serve_poll(merged, write_indexed):
+    path, header, lines, _ = merged
+    client = Client([path], reload_interval=0.05)
+    try:
+        time.sleep(0.2)
+        assert client.request("GET", "/status")[1]["generation"] == 1
+        write_indexed(path, header, lines[:10])
+        for _ in range(100):
+            _, info = client.request("GET", "/status")
+            if info["generation"] == 2:
+                break
+            time.sleep(0.05)
+        assert info["generation"] == 2
+        assert info["records"] == {path: 10}
+    finally:
+        client.close()
+
+
+def test_file_signature(merged):
+    path = merged[0]
+    assert [name for name, _, _ in file_signature([path])] == [path, path + ".csi"]
+    with open(path + GENE_INDEX_SUFFIX, "wb"):
+        pass
+    stat = os.stat(path + GENE_INDEX_SUFFIX)
+    assert file_signature([path])[-1] == (path + GENE_INDEX_SUFFIX, stat.st_mtime_ns, 0)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="requires POSIX signals")
+@pytest.mark.parametrize("signum", [signal.SIGTERM, signal.SIGINT])
+def test_serve_signal(merged, signum):
+    path = merged[0]
+    code = "from clinvar_tsv.serve import serve; serve([%r], port=0, reload_interval=0)" % path
+    process = subprocess.Popen(
+        [sys.executable, "-c", code], stderr=subprocess.PIPE, universal_newlines=True
+    )
+    try:
+        for line in process.stderr:
+            if "Listening on" in line:
+                break
+        process.send_signal(signum)
+        assert process.wait(timeout=10) == 0
+        assert "Stopped" in process.stderr.read()
+    finally:
+        process.kill()
+        process.stderr.close()
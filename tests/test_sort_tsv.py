@@ -0,0 +1,147 @@
+import gzip
+import random
+
+import pysam
+import pytest  # noqa
+
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.sort_tsv import check_sorted, natural_key, sort_tsv
+
+HEADER = "release\tchromosome\tstart\tend\tbin\treference\talternative\tvariation_type\tsymbols\thgnc_ids\tvcv\tdetails\n"
+
+
+def make_lines(count):
+    rng = random.Random(42)
+    chroms = ["1", "2", "10", "X", "Y", "MT"]
+    lines = []
+    for i in range(count):
+        start = rng.randint(1, 1000)
+        lines.append(
+            "GRCh37\t%s\t%d\t%d\t0\tA\tC\tsnv\t{}\t{}\tVCV%06d\t{}\n"
+            % (rng.choice(chroms), start, start + rng.randint(0, 3), rng.randint(1, 50))
+        )
+    return lines
+
+
+def expected_order(lines):
+    return sorted(
+        lines,
+        key=lambda line: (
+            ["1", "2", "10", "MT", "X", "Y"].index(line.split("\t")[1]),
+            int(line.split("\t")[2]),
+            int(line.split("\t")[3]),
+            line.split("\t")[10],
+            line,
+        ),
+    )
+
+
+def test_natural_key():
+    values = ["X", "10", "MT", "2", "1", "GL000192.1", "Y", "GL000191.1"]
+    assert sorted(values, key=natural_key) == [
+        "1",
+        "2",
+        "10",
+        "GL000191.1",
+        "GL000192.1",
+        "MT",
+        "X",
+        "Y",
+    ]
+
+
+def test_sort_tsv_in_memory(tmpdir):
+    lines = make_lines(100)
+    (tmpdir / "in.tsv").write_text(HEADER + "".join(lines), "utf-8")
+
+    sort_tsv(str(tmpdir / "in.tsv"), str(tmpdir / "out.tsv"))
+
+    assert (tmpdir / "out.tsv").read_text("utf-8") == HEADER + "".join(expected_order(lines))
+
+
+@pytest.mark.parametrize("threads", [1, 2])
+def test_sort_tsv_spill_bgzf(tmpdir, threads):
+    lines = make_lines(5000)
+    with gzip.open(str(tmpdir / "in.tsv.gz"), "wt") as outputf:
+        outputf.write(HEADER + "".join(lines))
+
+    sort_tsv(
+        str(tmpdir / "in.tsv.gz"),
+        str(tmpdir / "out.tsv.gz"),
+        memory_mb=1,  # 5000 lines are more than 1MB with the per-line overhead
+        tmp_dir=str(tmpdir),
+        threads=threads,
+    )
+
+    with gzip.open(str(tmpdir / "out.tsv.gz"), "rt") as inputf:
+        assert inputf.read() == HEADER + "".join(expected_order(lines))
+    pysam.tabix_index(
+        str(tmpdir / "out.tsv.gz"), seq_col=1, start_col=2, end_col=3, line_skip=1, force=True
+    )
+    with pysam.TabixFile(str(tmpdir / "out.tsv.gz")) as tabix_file:
+        assert len(list(tabix_file.fetch("X", 0, 1000))) == sum(
+            1 for line in lines if line.split("\t")[1] == "X"
+        )
+
+
+def test_sort_tsv_small_memory(tmpdir):
+    lines = make_lines(50)
+    (tmpdir / "in.tsv").write_text(HEADER + "".join(lines), "utf-8")
+    with pytest.raises(ClinvarTsvException, match="Invalid memory budget"):
+        sort_tsv(str(tmpdir / "in.tsv"), str(tmpdir / "out.tsv"), memory_mb=0)
+
+    # lines larger than a chunk
+    lines = [line[:-1] + "x" * 600_000 + "\n" for line in lines[:5]]
+    (tmpdir / "in.tsv").write_text(HEADER + "".join(lines), "utf-8")
+    sort_tsv(str(tmpdir / "in.tsv"), str(tmpdir / "out.tsv"), memory_mb=1, tmp_dir=str(tmpdir))
+    assert (tmpdir / "out.tsv").read_text("utf-8") == HEADER + "".join(expected_order(lines))
+
+
+def test_check_sorted(tmpdir):
+    lines = expected_order(make_lines(100))
+    (tmpdir / "sorted.tsv").write_text(HEADER + "".join(lines), "utf-8")
+    (tmpdir / "unsorted.tsv").write_text(HEADER + "".join(lines[50:] + lines[:50]), "utf-8")
+
+    checker = check_sorted(str(tmpdir / "sorted.tsv"))
+    assert checker.is_sorted
+    assert checker.rows == 100
+
+    checker = check_sorted(str(tmpdir / "unsorted.tsv"))
+    assert not checker.is_sorted
+    assert checker.violations == 1
+    assert checker.first_violation[0] == 52
+    assert checker.message().startswith(str(tmpdir / "unsorted.tsv") + ":52: row ")
+
+
+def test_sort_tsv_sorted_runs(tmpdir):
+    lines = expected_order(make_lines(5000))
+    with (tmpdir / "in.tsv").open("wt") as outputf:
+        outputf.write(HEADER + "".join(lines))
+
+    sort_tsv(str(tmpdir / "in.tsv"), str(tmpdir / "out.tsv"), memory_mb=1, tmp_dir=str(tmpdir))
+
+    assert (tmpdir / "out.tsv").read_text("utf-8") == HEADER + "".join(lines)
+
+
+@pytest.mark.parametrize("presorted", [False, True])
+def test_sort_tsv_multiple_inputs(tmpdir, presorted):
+    shards = [expected_order(make_lines(500)[i::3]) for i in range(3)]
+    paths = []
+    for i, shard in enumerate(shards):
+        paths.append(str(tmpdir / ("shard-%d.tsv" % i)))
+        with open(paths[-1], "wt") as outputf:
+            outputf.write(HEADER + "".join(shard))
+
+    sort_tsv(paths, str(tmpdir / "out.tsv"), presorted=presorted)
+
+    assert (tmpdir / "out.tsv").read_text("utf-8") == HEADER + "".join(
+        expected_order(make_lines(500))
+    )
+
+
+def test_sort_tsv_presorted_violation(tmpdir):
+    lines = expected_order(make_lines(100))
+    (tmpdir / "in.tsv").write_text(HEADER + "".join(reversed(lines)), "utf-8")
+
+    with pytest.raises(ClinvarTsvException, match=r"in.tsv:3: row "):
+        sort_tsv([str(tmpdir / "in.tsv")], str(tmpdir / "out.tsv"), presorted=True)
@@ -0,0 +1,122 @@
+import random
+
+import pytest  # noqa
+
+from clinvar_tsv.bgzf import BgzfWriter
+from clinvar_tsv.exceptions import ClinvarTsvException
+from clinvar_tsv.merge_tsvs import HEADER_OUT
+from clinvar_tsv.sv_index import SvIndex, build_sv_index, query_sv_index, size_class
+
+
+def write_table(path, num_records, seed=42):
+    """Write unsorted table of random SVs to ``path``, return the records as ``dict``."""
+    rng = random.Random(seed)
+    records = []
+    with BgzfWriter.open(str(path)) as writer:
+        writer.write("\t".join(HEADER_OUT) + "\n")
+        for i in range(num_records):
+            start = rng.randrange(1, 1_000_000)
+            end = start + int(10 ** rng.uniform(0, 5.5)) - 1
+            record = dict.fromkeys(HEADER_OUT, "")
+            record.update(
+                release="GRCh37",
+                chromosome=rng.choice(("1", "2", "X")),
+                start=str(start),
+                end=str(end),
+                variation_type="copy number loss",
+                vcv="VCV%09d" % (i + 1),
+                details="[]",
+            )
+            writer.write("\t".join(record[column] for column in HEADER_OUT) + "\n")
+            records.append(record)
+    return records
+
+
+def brute_force(records, chrom, start, end, min_overlap=0.0, min_size=None, max_size=None):
+    result = []
+    for record in records:
+        rec_start, rec_end = int(record["start"]), int(record["end"])
+        size, overlap = rec_end - rec_start + 1, min(end, rec_end) - max(start, rec_start) + 1
+        if record["chromosome"] != chrom or overlap <= 0:
+            continue
+        if not (min_size or 1) <= size <= (max_size or size):
+            continue
+        if min(overlap / size, overlap / (end - start + 1)) >= min_overlap:
+            result.append((rec_start, rec_end, record["vcv"]))
+    return sorted(result)
+
+
+def test_size_class():
+    assert [size_class(size) for size in (0, 1, 2, 3, 4, 1023, 1024)] == [0, 0, 1, 1, 2, 9, 10]
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {},
+        {"min_overlap": 0.5},
+        {"min_overlap": 0.3},
+        {"min_overlap": 1.0},
+        {"min_size": 1000, "max_size": 50_000},
+        {"min_overlap": 0.7, "max_size": 20_000},
+    ],
+)
+def test_sv_index_overlaps(tmpdir, filters):
+    records = write_table(tmpdir / "sv.tsv.gz", 2000)
+    assert build_sv_index(str(tmpdir / "sv.tsv.gz"), str(tmpdir / "sv.svidx")) == {"records": 2000}
+
+    rng = random.Random(1)
+    queries = []
+    for _ in range(200):
+        start = rng.randrange(1, 1_000_000)
+        queries.append((rng.choice(("1", "2", "X", "Y")), start, start + rng.randrange(100_000)))
+    # Queries equal to records have a reciprocal overlap of 1.
+    for record in records[:20]:
+        queries.append((record["chromosome"], int(record["start"]), int(record["end"])))
+
+    with SvIndex(str(tmpdir / "sv.svidx")) as index:
+        assert len(index) == 2000
+        for query, hits in zip(queries, index.batch(queries, **filters)):
+            expected = brute_force(records, *query, **filters)
+            assert [(hit.start, hit.end, hit.vcv) for hit in hits] == expected
+            assert all(hit.reciprocal_overlap >= filters.get("min_overlap", 0) for hit in hits)
+        for record in records[:20]:
+            hits = index.overlaps(record["chromosome"], int(record["start"]), int(record["end"]))
+            hit = next(hit for hit in hits if hit.vcv == record["vcv"])
+            assert hit.reciprocal_overlap == 1.0
+            assert hit.overlap == hit.size
+            assert index.records([hit]) == [record]
+        with pytest.raises(ClinvarTsvException):
+            index.overlaps("1", 1, 2, min_overlap=1.5)
+
+
+def test_query_sv_index(tmpdir):
+    records = write_table(tmpdir / "sv.tsv.gz", 500)
+    build_sv_index(str(tmpdir / "sv.tsv.gz"), str(tmpdir / "sv.svidx"))
+    record = records[0]
+    bed_path = tmpdir / "query.bed"
+    bed_path.write(
+        "track name=cnvs\n%s\t%d\t%s\tcnv1\n1\t0\t1\n"
+        % (record["chromosome"], int(record["start"]) - 1, record["end"])
+    )
+    metrics = query_sv_index(
+        str(tmpdir / "sv.svidx"), str(bed_path), str(tmpdir / "out.tsv"), min_overlap=0.5
+    )
+    lines = (tmpdir / "out.tsv").read().splitlines()
+    assert metrics == {"queries": 2, "hits": len(lines) - 1}
+    assert lines[0].split("\t")[:6] == [
+        "query_chromosome",
+        "query_start",
+        "query_end",
+        "overlap",
+        "reciprocal_overlap",
+        "release",
+    ]
+    rows = [line.split("\t") for line in lines[1:]]
+    assert [record["vcv"], "1.0000"] in [[row[5 + HEADER_OUT.index("vcv")], row[4]] for row in rows]
+
+
+def test_sv_index_invalid(tmpdir):
+    (tmpdir / "not.svidx").write_binary(b"\x00" * 64)
+    with pytest.raises(ClinvarTsvException):
+        SvIndex(str(tmpdir / "not.svidx"))
@@ -0,0 +1,24 @@
+import io
+
+import pytest  # noqa
+
+from clinvar_tsv.tsv import TsvReader, TsvWriter
+
+
+def test_tsv_reader():
+    reader = TsvReader(io.StringIO("a\tb\tc\n1\t2\t3\n\n4\t5\n6\t7\t8\t9\n"), block_size=4)
+    assert reader.header == ("a", "b", "c")
+    assert reader.index("c") == 2
+    with pytest.raises(ValueError):
+        reader.index("d")
+    assert list(reader) == [["1", "2", "3"], ["4", "5", ""], ["6", "7", "8"]]
+
+
+def test_tsv_writer():
+    outfile = io.StringIO()
+    with TsvWriter(outfile, ("a", "b"), block_rows=2) as writer:
+        writer.write(["1", "2"])
+        assert outfile.getvalue() == "a\tb\n1\t2\n"
+        writer.write_line("3\t4")
+        assert outfile.getvalue() == "a\tb\n1\t2\n"
+    assert outfile.getvalue() == "a\tb\n1\t2\n3\t4\n"